@@ -60,10 +60,64 @@ export async function fetchAllPosts() {
     }
 }
 
-// Get a single post by ID
-export async function fetchPost(id) {
+// Get one page of the post list (newest first) without full post bodies.
+// Pass the returned next_cursor back in to load the following page.
+export async function fetchPostPage({ limit = 20, cursor = null, fields = null } = {}) {
     try {
-        const response = await fetch(`${API_BASE_URL}/posts/${id}`, {
+        const params = new URLSearchParams({ limit: String(limit) });
+        if (cursor) params.set('cursor', cursor);
+        if (fields) params.set('fields', fields.join(','));
+
+        const response = await fetch(`${API_BASE_URL}/posts?${params}`, {
+            method: 'GET',
+            mode: 'cors',
+            credentials: 'include',
+            headers: {
+                'Accept': 'application/json'
+            }
+        });
+
+        if (!response.ok) {
+            throw new Error(`API error: ${response.status}`);
+        }
+
+        return await response.json();
+    } catch (error) {
+        handleApiError(error, 'fetchPostPage');
+    }
+}
+
+// Full-text search over titles and bodies, best matches first.
+// Returns { query, total, results, next_offset }; pass next_offset back for the next page.
+export async function searchPosts(query, { limit = 20, offset = 0 } = {}) {
+    try {
+        const params = new URLSearchParams({ q: query, limit: String(limit), offset: String(offset) });
+
+        const response = await fetch(`${API_BASE_URL}/search?${params}`, {
+            method: 'GET',
+            mode: 'cors',
+            credentials: 'include',
+            headers: {
+                'Accept': 'application/json'
+            }
+        });
+
+        if (!response.ok) {
+            throw new Error(`API error: ${response.status}`);
+        }
+
+        return await response.json();
+    } catch (error) {
+        handleApiError(error, 'searchPosts');
+    }
+}
+
+// Get a single post by ID. With { format: 'html' } the body comes back
+// pre-rendered as content_html instead of the Markdown content.
+export async function fetchPost(id, { format = null } = {}) {
+    try {
+        const query = format ? `?format=${encodeURIComponent(format)}` : '';
+        const response = await fetch(`${API_BASE_URL}/posts/${id}${query}`, {
             method: 'GET',
             mode: 'cors',
             credentials: 'include', // Re-enable credentials
@@ -82,6 +136,46 @@ export async function fetchPost(id) {
     }
 }
 
+// Get several posts in one request (at most 100 ids). Resolves to
+// { posts, missing }: the posts found and the ids that were not, both in
+// the order asked for. Views are not counted, so this suits prefetching.
+export async function fetchPosts(ids, { format = null } = {}) {
+    try {
+        const params = new URLSearchParams({ ids: ids.join(',') });
+        if (format) params.set('format', format);
+        const url = `${API_BASE_URL}/posts/batch?${params}`;
+
+        // Long id lists go in a POST body instead of the URL
+        const response = url.length <= 2000
+            ? await fetch(url, {
+                method: 'GET',
+                mode: 'cors',
+                credentials: 'include',
+                headers: {
+                    'Accept': 'application/json'
+                }
+            })
+            : await fetch(`${API_BASE_URL}/posts/batch`, {
+                method: 'POST',
+                mode: 'cors',
+                credentials: 'include',
+                headers: {
+                    'Accept': 'application/json',
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(format ? { ids, format } : { ids })
+            });
+
+        if (!response.ok) {
+            throw new Error(`API error: ${response.status}`);
+        }
+
+        return await response.json();
+    } catch (error) {
+        handleApiError(error, 'fetchPosts');
+    }
+}
+
 // Create a new post
 export async function createPost(post) {
     try {
@@ -3,7 +3,7 @@ import { renderMarkdown } from './markdown.js';
 // Import for localStorage - comment out when using the database
 // import { getAllPosts, getPost } from './storage.js';
 // MariaDB API client for database operations
-import { fetchAllPosts, fetchPost } from './api.js';
+import { fetchPostPage, fetchPost } from './api.js';
 
 // DOM elements
 const mainContent = document.getElementById('main-content');
@@ -27,6 +27,9 @@ function handleRoute() {
     }
 }
 
+// Number of posts loaded per page on the list view
+const POSTS_PER_PAGE = 20;
+
 // Show list of blog posts
 async function showBlogList() {
     // Create blog list container
@@ -35,50 +38,73 @@ async function showBlogList() {
     mainContent.appendChild(blogListElement);
 
     try {
-        // Get all posts from the database
-        const posts = await fetchAllPosts();
+        // Get the first page of posts (excerpts only) from the database
+        const page = await fetchPostPage({ limit: POSTS_PER_PAGE });
 
-        if (!posts || posts.length === 0) {
+        if (!page || page.posts.length === 0) {
             blogListElement.innerHTML = '<p>아직 작성된 글이 없습니다.</p>';
             return;
         }
 
-        // Sort posts by date (newest first)
-        posts.sort((a, b) => new Date(b.date) - new Date(a.date));
-
-        posts.forEach(post => {
-            const postElement = document.createElement('div');
-            postElement.className = 'blog-card';
-
-            // Create excerpt from content (first 150 characters)
-            let excerpt = post.content.slice(0, 150);
-            if (post.content.length > 150) excerpt += '...';
-
-            postElement.innerHTML = `
-                <div class="blog-card-content">
-                    <h2 class="blog-title">${post.title}</h2>
-                    <div class="blog-card-meta">
-                        <span class="blog-date">${new Date(post.date).toLocaleDateString()}</span>
-                        <span class="blog-views">${post.view_count || 0}회 조회</span>
-                    </div>
-                    <div class="blog-excerpt">${excerpt}</div>
-                    <a href="#/post/${post.id}" class="read-more">더 읽기</a>
-                </div>
-            `;
-
-            blogListElement.appendChild(postElement);
-        });
+        appendPostCards(blogListElement, page.posts);
+        addLoadMoreButton(blogListElement, page.next_cursor);
     } catch (error) {
         console.error('Error loading posts:', error);
         blogListElement.innerHTML = '<p>포스트를 불러오는 중 오류가 발생했습니다.</p>';
     }
 }
 
+// Render post cards; posts arrive already sorted newest first
+function appendPostCards(blogListElement, posts) {
+    posts.forEach(post => {
+        const postElement = document.createElement('div');
+        postElement.className = 'blog-card';
+
+        // Excerpt is precomputed by the server (first 150 characters)
+        postElement.innerHTML = `
+            <div class="blog-card-content">
+                <h2 class="blog-title">${post.title}</h2>
+                <div class="blog-card-meta">
+                    <span class="blog-date">${new Date(post.date).toLocaleDateString()}</span>
+                    <span class="blog-views">${post.view_count || 0}회 조회</span>
+                </div>
+                <div class="blog-excerpt">${post.excerpt}</div>
+                <a href="#/post/${post.id}" class="read-more">더 읽기</a>
+            </div>
+        `;
+
+        blogListElement.appendChild(postElement);
+    });
+}
+
+// Add a button that fetches the next page, if there is one
+function addLoadMoreButton(blogListElement, nextCursor) {
+    if (!nextCursor) return;
+
+    const button = document.createElement('button');
+    button.className = 'load-more';
+    button.textContent = '더 보기';
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        try {
+            const page = await fetchPostPage({ limit: POSTS_PER_PAGE, cursor: nextCursor });
+            button.remove();
+            appendPostCards(blogListElement, page.posts);
+            addLoadMoreButton(blogListElement, page.next_cursor);
+        } catch (error) {
+            console.error('Error loading more posts:', error);
+            button.disabled = false;
+        }
+    });
+    blogListElement.appendChild(button);
+}
+
 // Show individual blog post
 async function showPost(postId) {
     try {
         // Get post from the database
-        const post = await fetchPost(postId);
+        // Rendered on the server, so the browser skips the Markdown pass
+        const post = await fetchPost(postId, { format: 'html' });
 
         if (!post) {
             mainContent.innerHTML = '<p>글을 찾을 수 없습니다.</p>';
@@ -121,7 +147,7 @@ async function showPost(postId) {
 
     const contentElement = document.createElement('div');
     contentElement.className = 'post-content';
-    contentElement.innerHTML = renderMarkdown(post.content);
+    contentElement.innerHTML = post.content_html ?? renderMarkdown(post.content);
 
     postElement.appendChild(headerElement);
     postElement.appendChild(contentElement);
@@ -1,60 +1,122 @@
 #!/usr/bin/env python3
 # Blog Backend API for MariaDB
 
-from flask import Flask, request, jsonify, abort
-from flask_cors import CORS
+from flask import Flask, request, jsonify, g, has_request_context
 import mysql.connector
-import json
 import os
 import datetime
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+from db_pool import ConnectionPool, PoolTimeout
+from db_router import Replica, ReplicaRouter
+from blog_store import create_store
+from post_listing import (
+    InvalidListQuery, decode_cursor, paginate,
+    parse_fields, parse_limit
+)
+from view_counter import ViewCounter
+from post_cache import PostCache, make_etag, row_revision
+from change_stamp import ChangeStamp
+from compression import Compressor, DEFAULT_MIN_SIZE, compress
+from markdown_render import RENDERER_VERSION, HtmlCache
+from json_encoder import ResponseEncoder
+from log_config import LogSampler, configure_logging
+from cors import CorsMiddleware, CorsPolicy
+from sitemap_builder import DEFAULT_SHARD_SIZE, SitemapCache
+from feed_builder import DEFAULT_FEED_SIZE, FEED_FORMATS, FeedSite, feed_updated
+from search_index import SearchIndex
+from single_flight import FlightTimeout, SingleFlight
+from session_store import DEFAULT_SESSION_TTL, create_session_store
+from schema_migrations import MigrationError
+from build_static import DEFAULT_OUTPUT_DIR as STATIC_DEFAULT_OUTPUT_DIR, BuildScheduler, StaticSiteBuilder
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, DB_BUCKETS, MetricsRegistry, TimedConnection
+
+log = logging.getLogger('blog.app')
+access_log = logging.getLogger('blog.access')
 
 app = Flask(__name__)
-# Disable Flask-CORS to avoid conflicts with our custom middleware
-# CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
-
-# Custom CORS middleware with explicit header setting
-@app.after_request
-def add_cors_headers(response):
-    # Enhanced CORS debugging
-    print(f"\n==== CORS DEBUG ====")
-    print(f"Request Method: {request.method}")
-    print(f"Request Path: {request.path}")
-    print(f"Request Headers: {dict(request.headers)}")
-
-    origin = request.headers.get('Origin')
-    print(f"Origin Header: {origin}")
-
-    if origin:
-        response.headers['Access-Control-Allow-Origin'] = origin
-        response.headers['Vary'] = 'Origin'
-        print(f"Setting Access-Control-Allow-Origin to: {origin}")
-    else:
-        print("WARNING: No Origin header found in request!")
-
-    # Allow credentials
-    response.headers['Access-Control-Allow-Credentials'] = 'true'
-
-    # Allow specific headers
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization, X-Requested-With'
-
-    # Allow specific methods
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+# Load environment variables
+from dotenv import load_dotenv
 
-    # Max age for preflight requests
-    response.headers['Access-Control-Max-Age'] = '3600'
+# Load environment variables from .env file
+load_dotenv()
 
-    # Add response headers debugging
-    print(f"Response Status: {response.status_code}")
-    print(f"Response Headers: {dict(response.headers)}")
-    print(f"==== END CORS DEBUG ====\n")
+# Structured logging (LOG_LEVEL, LOG_FORMAT, LOG_CORS_DEBUG); records are
+# formatted and written by a background thread, not the request thread
+configure_logging()
+
+# One access log line per request; LOG_SAMPLE_RATE=0.1 keeps 10% of them
+sample_access_log = LogSampler(access_log, float(os.getenv('LOG_SAMPLE_RATE', '1')))
+
+# Files shared by all worker processes (sitemap, cache invalidation stamps, metrics)
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache'))
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# Prometheus metrics, served at /metrics. Each worker counts in memory and
+# writes its values to METRICS_DIR every METRICS_FLUSH_INTERVAL seconds; a
+# scrape of any worker adds up every worker's file.
+metrics = MetricsRegistry(
+    os.getenv('METRICS_DIR', os.path.join(CACHE_DIR, 'metrics')),
+    flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+)
+request_seconds = metrics.histogram(
+    'blog_http_request_duration_seconds', "Time to handle a request, by route and status",
+    ('method', 'route', 'status')
+)
+db_query_seconds = metrics.histogram(
+    'blog_db_query_duration_seconds', "Time in the database per statement, execute through fetch",
+    ('operation',), buckets=DB_BUCKETS
+)
+db_acquire_seconds = metrics.histogram(
+    'blog_db_connection_acquire_seconds', "Time to check a connection out of the pool",
+    buckets=DB_BUCKETS
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# CORS is handled in front of Flask: preflights are answered with 204 from
+# precomputed headers before routing, other responses get the cached block
+# for their origin. CORS_ALLOWED_ORIGINS is a comma-separated allow-list;
+# '*' (the default) echoes any origin back.
+cors_policy = CorsPolicy(
+    [origin.strip() for origin in os.getenv('CORS_ALLOWED_ORIGINS', '*').split(',') if origin.strip()],
+    max_age=int(os.getenv('CORS_MAX_AGE', '3600'))
+)
+app.wsgi_app = CorsMiddleware(app.wsgi_app, cors_policy)
 
+@app.after_request
+def log_request(response):
+    duration = time.perf_counter() - g.get('request_start', time.perf_counter())
+    # The route pattern, not the path, so every post shares one series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_seconds.observe(duration, request.method, route, str(response.status_code))
+    if sample_access_log():
+        access_log.info("request", extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'bytes': response.content_length
+        })
     return response
 
-# Load environment variables
-from dotenv import load_dotenv
+# gzip/brotli for responses of at least COMPRESS_MIN_SIZE bytes, negotiated
+# from Accept-Encoding. Cached posts, lists and sitemaps carry their own
+# pre-compressed variants; everything else is compressed here per request.
+# Registered after log_request so it runs first and the log shows sent bytes.
+compressor = Compressor(
+    min_size=int(os.getenv('COMPRESS_MIN_SIZE', str(DEFAULT_MIN_SIZE))),
+    enabled=os.getenv('COMPRESSION', '1') == '1'
+)
 
-# Load environment variables from .env file
-load_dotenv()
+@app.after_request
+def compress_response(response):
+    return compressor.apply(request, response)
 
 # Database configuration from environment variables
 DB_CONFIG = {
@@ -64,20 +126,358 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'blog_db')
 }
 
-# Helper function to get database connection
-def get_db_connection():
+# Storage engine (see blog_store.py): the MariaDB server above, or with
+# DB_BACKEND=sqlite an embedded SQLite file at DB_SQLITE_PATH
+DB_BACKEND = os.getenv('DB_BACKEND', 'mariadb')
+
+# Connection pool settings, tunable per deployment (see README)
+DB_POOL_CONFIG = {
+    'size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+    'recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    'pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1'
+}
+
+db_pool = ConnectionPool(lambda: mysql.connector.connect(**DB_CONFIG), **DB_POOL_CONFIG)
+
+class DatabaseUnavailable(Exception):
+    """Raised when no database connection could be opened"""
+
+# Check a pooled connection out for the duration of a with-block.
+# The connection goes back to the pool (not closed) when the block exits.
+# Statements run on it are timed into blog_db_query_duration_seconds.
+@contextmanager
+def db_connection():
+    start = time.perf_counter()
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
+        conn = db_pool.acquire()
     except mysql.connector.Error as err:
-        print(f"Database connection error: {err}")
-        return None
+        log.error("Database connection error: %s", err)
+        raise DatabaseUnavailable(str(err)) from err
+    db_acquire_seconds.observe(time.perf_counter() - start)
+    timed = TimedConnection(conn, db_query_seconds)
+    try:
+        yield timed
+    finally:
+        timed.finish()
+        db_pool.release(conn)
+
+# Views are buffered in memory and added to posts.view_count in batches, so
+# reading a post no longer needs its own write transaction
+def flush_view_counts(counts):
+    """Add buffered view increments to posts.view_count"""
+    store.add_views(counts)
+
+view_counter = ViewCounter(
+    flush_view_counts,
+    interval=float(os.getenv('VIEW_COUNT_FLUSH_INTERVAL', '5')),
+    threshold=int(os.getenv('VIEW_COUNT_FLUSH_THRESHOLD', '1000'))
+)
+
+# Replaced on every post write so other worker processes can drop stale state
+posts_changed = ChangeStamp(os.path.join(CACHE_DIR, 'posts.stamp'))
+
+# Read replicas (DB_REPLICAS=host[:port],...). Reads that tolerate a few
+# seconds of lag (post lists and pages, feeds, the sitemap, the export,
+# search results and /api/auth/verify) use read_connection(); writes, logins,
+# view counts and the search index sync stay on the primary. A replica more
+# than DB_REPLICA_MAX_LAG seconds behind or failing its check is skipped, and
+# reads fall back to the primary.
+def _replica_config(address):
+    host, _, port = address.strip().partition(':')
+    return {
+        **DB_CONFIG,
+        'host': host,
+        'port': int(port or 3306),
+        'user': os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+        'password': os.getenv('DB_REPLICA_PASSWORD', DB_CONFIG['password']),
+        # A replica that is down must not stall the request that finds out
+        'connection_timeout': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '2'))
+    }
+
+def _make_replica(address):
+    config = _replica_config(address)
+    return Replica(address.strip(), ConnectionPool(lambda: mysql.connector.connect(**config), **DB_POOL_CONFIG))
+
+replica_router = ReplicaRouter(
+    [_make_replica(address) for address in os.getenv('DB_REPLICAS', '').split(',') if address.strip()],
+    max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+    check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),
+    stamp=posts_changed
+)
+
+# Set on the responses to an admin's post writes: that browser's reads go to
+# the primary for DB_REPLICA_STICKY_SECONDS, so the admin sees their edit
+# even if a replica is behind
+READ_PRIMARY_COOKIE = 'read_primary'
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', '30'))
+
+def stick_to_primary():
+    g.read_primary = True
+
+@app.after_request
+def set_read_primary_cookie(response):
+    if replica_router.enabled and g.get('read_primary'):
+        response.set_cookie(READ_PRIMARY_COOKIE, '1', max_age=REPLICA_STICKY_SECONDS, httponly=True,
+                            secure=request.is_secure, samesite='Lax')
+    return response
+
+# Like db_connection(), but on a replica when replica_router picks one
+@contextmanager
+def read_connection():
+    sticky = has_request_context() and READ_PRIMARY_COOKIE in request.cookies
+    replica = replica_router.choose(sticky=sticky)
+    if replica is None:
+        with db_connection() as conn:
+            yield conn
+        return
+
+    start = time.perf_counter()
+    try:
+        conn = replica.pool.acquire()
+    except (mysql.connector.Error, PoolTimeout) as err:
+        log.warning("Replica %s unavailable, reading from the primary: %s", replica.name, err)
+        if isinstance(err, mysql.connector.Error):
+            replica_router.mark_failed(replica, err)
+        with db_connection() as conn:
+            yield conn
+        return
+    db_acquire_seconds.observe(time.perf_counter() - start)
+    timed = TimedConnection(conn, db_query_seconds)
+    try:
+        yield timed
+    finally:
+        timed.finish()
+        replica.pool.release(conn)
+
+# Lag is per replica, not a sum over workers: see /api/stats/pool for it
+metrics.collected('counter', 'blog_db_reads_total', "Lag-tolerant reads: run on a replica, or on the primary and why",
+                  ('target',), lambda: {(target,): count for target, count in replica_router.stats()['reads'].items()})
+
+# Post and admin user queries go through the store, which holds the SQL of
+# the configured engine
+store = create_store(
+    DB_BACKEND, db_connection, read_connection,
+    sqlite_path=os.getenv('DB_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blog.db'))
+)
+
+# Serialized GET /api/posts and /api/posts/<id> payloads. Entries are dropped
+# by the write handlers (in every worker, via posts_changed). view_count is
+# not part of the ETag; a post's views counted by this worker show up at once
+# (post_body()), those of other workers when an entry is older than
+# POST_CACHE_TTL seconds.
+post_cache = PostCache(
+    max_bytes=int(os.getenv('POST_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    ttl=float(os.getenv('POST_CACHE_TTL', '60')),
+    stamp=posts_changed
+)
+
+# Public URL of this API, as clients and crawlers reach it through the
+# proxy. Links inside cached sitemaps and feeds are built from it, never
+# from the host of whichever request happened to fill the cache.
+API_BASE_URL = os.getenv('API_BASE_URL', 'https://api.orange-man.xyz/api').rstrip('/')
+
+# sitemap.xml (and its shards) are written to SITEMAP_CACHE_DIR by the first
+# request after a post write and then served from memory/disk
+sitemap_cache = SitemapCache(
+    os.getenv('SITEMAP_CACHE_DIR', os.path.join(CACHE_DIR, 'sitemap')),
+    base_url=os.getenv('BASE_URL', 'https://orange-man.xyz'),
+    shard_size=int(os.getenv('SITEMAP_SHARD_SIZE', str(DEFAULT_SHARD_SIZE)))
+)
+
+# Post bodies rendered to HTML for GET /api/posts/<id>?format=html, keyed by
+# a hash of the Markdown so each revision is rendered once for all workers
+html_cache = HtmlCache(
+    os.getenv('HTML_CACHE_DIR', os.path.join(CACHE_DIR, 'html')),
+    max_bytes=int(os.getenv('HTML_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+)
+
+# Concurrent cache misses for the same post, list page, feed or sitemap
+# wait for one database fetch and share its result, so a cold cache under a
+# burst of traffic runs one query instead of one per request. A request
+# waits at most COALESCE_TIMEOUT seconds (SITEMAP_COALESCE_TIMEOUT for a
+# sitemap build) before giving up with a 503.
+read_flight = SingleFlight(timeout=float(os.getenv('COALESCE_TIMEOUT', '15')))
+SITEMAP_COALESCE_TIMEOUT = float(os.getenv('SITEMAP_COALESCE_TIMEOUT', '60'))
+# asgi.py adds the flight of its async handlers
+read_flights = [read_flight]
+
+def coalescing_stats():
+    totals = {}
+    for flight in read_flights:
+        for name, value in flight.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+metrics.collected('counter', 'blog_coalesced_requests_total',
+                  "Cache misses by outcome: ran the fetch, shared another's, or timed out waiting",
+                  ('result',), lambda: {(name,): value for name, value in coalescing_stats().items()
+                                        if name != 'in_flight'})
+
+# Static copy of the site (see build_static.py). With STATIC_BUILD_ON_WRITE=1
+# every post write schedules an incremental build in a background thread,
+# STATIC_BUILD_DELAY seconds later so a burst of writes shares one build.
+static_build_scheduler = None
+if os.getenv('STATIC_BUILD_ON_WRITE', '0') == '1':
+    static_builder = StaticSiteBuilder(
+        os.getenv('STATIC_OUTPUT_DIR', STATIC_DEFAULT_OUTPUT_DIR),
+        base_url=os.getenv('STATIC_BASE_URL', 'https://orange-man.xyz/static'),
+        page_size=int(os.getenv('STATIC_PAGE_SIZE', '20')),
+        render=lambda text: html_cache.get(text)[1]
+    )
+
+    def build_static_site():
+        static_builder.build(store)
+
+    static_build_scheduler = BuildScheduler(build_static_site, delay=float(os.getenv('STATIC_BUILD_DELAY', '2')))
+
+def schedule_static_build():
+    if static_build_scheduler is not None:
+        static_build_scheduler.request()
+
+# Pool and cache counters are read from their stats() at scrape time
+def _pool_connections():
+    stats = db_pool.stats()
+    return {('in_use',): stats['in_use'], ('idle',): stats['idle']}
+
+def _cache_lookups():
+    posts, html = post_cache.stats(), html_cache.stats()
+    return {
+        ('post', 'hit'): posts['hits'], ('post', 'miss'): posts['misses'],
+        ('html', 'hit'): html['hits'], ('html', 'disk_hit'): html['disk_hits'],
+        ('html', 'miss'): html['renders'],
+    }
+
+metrics.collected('gauge', 'blog_db_pool_connections', "Pooled database connections by state",
+                  ('state',), _pool_connections)
+metrics.collected('counter', 'blog_db_pool_timeouts_total', "Checkouts that gave up waiting (503)",
+                  (), lambda: {(): db_pool.stats()['timeouts']})
+metrics.collected('counter', 'blog_cache_lookups_total', "Post and rendered-HTML cache lookups by result",
+                  ('cache', 'result'), _cache_lookups)
+metrics.collected('counter', 'blog_cache_evictions_total', "Post cache entries evicted to stay under POST_CACHE_MAX_BYTES",
+                  (), lambda: {(): post_cache.stats()['evictions']})
+
+def warm_html_cache(content):
+    try:
+        html_cache.warm(content)
+    except Exception as e:
+        # The first reader renders it instead
+        log.warning("Pre-rendering post failed: %s", e)
+
+# Full-text index for /api/search, built from the database on the first
+# search in each worker and kept current by the write handlers. Writes made
+# by other workers are picked up through posts_changed. A store with its own
+# full-text index (SQLite) is searched directly instead.
+search_index = SearchIndex()
+search_state = {'loaded': False, 'seen': None}
+search_sync_lock = threading.Lock()
+SEARCH_SYNC_BATCH = 500
+SEARCH_COLUMNS = ('id', 'title', 'content', 'updated_at')
+MAX_SEARCH_QUERY_LENGTH = 200
+
+def index_post(post_id, title, content, updated_at, stamps):
+    with search_sync_lock:
+        if search_state['loaded']:
+            # DATETIME columns drop microseconds; match what a later sync reads back
+            search_index.add(post_id, title, content, updated_at.replace(microsecond=0))
+            mark_search_synced(stamps)
+
+def unindex_post(post_id, stamps):
+    with search_sync_lock:
+        if search_state['loaded']:
+            search_index.remove(post_id)
+            mark_search_synced(stamps)
+
+def mark_search_synced(stamps):
+    # stamps is what post_cache.invalidate_post() returned for this worker's
+    # own write, which the index now holds. If the index was in sync just
+    # before that bump it still is, and the next search need not rescan.
+    # Called with search_sync_lock held.
+    before, after = stamps
+    if search_state['seen'] == before:
+        search_state['seen'] = after
+
+def sync_search_index():
+    """Load the search index on first use and apply other workers' writes"""
+    if search_state['loaded'] and posts_changed.version() == search_state['seen']:
+        return
+    with search_sync_lock:
+        # Read the stamp before the posts: a write after this bumps it again
+        version = posts_changed.version()
+        if search_state['loaded'] and version == search_state['seen']:
+            return
+        if not search_state['loaded']:
+            rows = itertools.chain.from_iterable(store.scan_posts(SEARCH_COLUMNS, fresh=True))
+            search_index.rebuild((row['id'], row['title'], row['content'], row['updated_at']) for row in rows)
+            log.info("Search index built", extra={'posts': len(search_index)})
+        else:
+            current = {row['id']: row['updated_at']
+                       for rows in store.scan_posts(('id', 'updated_at'), fresh=True) for row in rows}
+            indexed = search_index.versions()
+            for post_id in indexed.keys() - current.keys():
+                search_index.remove(post_id)
+            changed = [post_id for post_id, updated_at in current.items()
+                       if indexed.get(post_id) != updated_at]
+            for start in range(0, len(changed), SEARCH_SYNC_BATCH):
+                batch = changed[start:start + SEARCH_SYNC_BATCH]
+                for row in store.get_posts(batch, SEARCH_COLUMNS, fresh=True):
+                    search_index.add(row['id'], row['title'], row['content'], row['updated_at'])
+        search_state['loaded'] = True
+        search_state['seen'] = version
+
+def cached_response(key, entry, mimetype='application/json', body=None):
+    """Serve a cached body, or 304 if the client already has this revision.
+
+    Compressed bodies are made once per cached revision and kept with it.
+    ``body`` replaces ``entry.body`` for bodies that change between requests
+    of the same revision (the view count of a post); those are compressed
+    per request.
+    """
+    if body is None:
+        body = entry.body
+    encoding = compressor.choose(request.accept_encodings, len(body))
+    etag = f'{entry.etag}-{encoding}' if encoding else entry.etag
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        # If-Modified-Since only counts when there is no If-None-Match
+        since = request.if_modified_since
+        not_modified = entry.last_modified is not None and since is not None and entry.last_modified <= since
+    if not_modified:
+        response = app.response_class(status=304)
+    elif encoding:
+        if body is entry.body:
+            data = post_cache.variant(key, entry, encoding, compress)
+        else:
+            data = compress(body, encoding, static=False)
+        response = app.response_class(data, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = app.response_class(body, mimetype=mimetype)
+    if compressor.enabled:
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if entry.last_modified is not None:
+        response.last_modified = entry.last_modified
+    # Clients and CDNs may store the body but must revalidate before reuse
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# JSON_ENSURE_ASCII=0 sends non-ASCII text as UTF-8 instead of \uXXXX escapes
+# (smaller Korean payloads) and lets the encoder use orjson when installed
+app.json.ensure_ascii = os.getenv('JSON_ENSURE_ASCII', '1') == '1'
+
+response_encoder = ResponseEncoder(
+    backend=os.getenv('JSON_BACKEND', 'auto'),
+    ensure_ascii=app.json.ensure_ascii,
+    sort_keys=app.json.sort_keys
+)
 
-# Helper to convert datetime objects to string for JSON serialization
-def json_serial(obj):
-    if isinstance(obj, datetime.datetime) or isinstance(obj, datetime.date):
-        return obj.isoformat()
-    raise TypeError(f"Type {type(obj)} not serializable")
+def encode_json(obj):
+    """Serialize a payload to the same bytes as jsonify(), in a single pass"""
+    compact = app.json.compact if app.json.compact is not None else not app.debug
+    return response_encoder.encode(obj, compact=compact)
 
 # Import modules for authentication
 import hashlib
@@ -85,8 +485,17 @@ import secrets
 import time
 import uuid
 
-# Store active sessions (in production, use Redis or a database)
-active_sessions = {}
+# Admin sessions. The database backend is shared by all worker processes;
+# SESSION_BACKEND=memory keeps them in this process only (single worker).
+session_store = create_session_store(
+    # The database backend keeps sessions in MariaDB; with DB_BACKEND=sqlite
+    # they default to this process (run one worker)
+    os.getenv('SESSION_BACKEND', 'memory' if DB_BACKEND == 'sqlite' else 'database'),
+    db_connection,
+    ttl=int(os.getenv('SESSION_TTL', str(DEFAULT_SESSION_TTL))),
+    sweep_interval=float(os.getenv('SESSION_SWEEP_INTERVAL', '60')),
+    read_connection=read_connection
+)
 
 def generate_session_token():
     """Generate a secure random token for sessions"""
@@ -96,175 +505,182 @@ def hash_password(password):
     """Hash a password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def verify_session(token):
-    """Verify if a session is valid and not expired"""
-    if token in active_sessions:
-        session = active_sessions[token]
-        # Check if session is expired (30 minutes)
-        if time.time() - session['created_at'] < 1800:
-            return True
-        else:
-            # Remove expired session
-            del active_sessions[token]
-    return False
+def verify_session(token, stale_ok=False):
+    """The session for ``token``, or None if it is unknown or expired"""
+    return session_store.get(token, stale_ok=stale_ok)
 
 # Create database tables if they don't exist
 def init_db():
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
+    try:
+        # Create or upgrade the tables (see schema_migrations.py, or
+        # blog_store.SQLITE_MIGRATIONS)
         try:
-            # Create posts table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS posts (
-                    id VARCHAR(50) PRIMARY KEY,
-                    title VARCHAR(255) NOT NULL,
-                    content TEXT NOT NULL,
-                    date DATETIME NOT NULL,
-                    updated_at DATETIME NOT NULL,
-                    view_count INT NOT NULL DEFAULT 0
-                )
-            ''')
-
-            # Create admin_users table for secure authentication
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS admin_users (
-                    id VARCHAR(36) PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    password_hash VARCHAR(255) NOT NULL,
-                    last_login DATETIME NULL,
-                    created_at DATETIME NOT NULL
-                )
-            ''')
+            applied = store.ensure_schema()
+        except (store.Error, MigrationError) as err:
+            log.error("Error migrating database schema: %s", err)
+            return
+        if applied:
+            log.info("Database schema migrated", extra={'versions': applied})
 
+        try:
             # Check if admin user exists, otherwise create default admin
-            cursor.execute("SELECT COUNT(*) FROM admin_users")
-            user_count = cursor.fetchone()[0]
-
-            if user_count == 0:
+            if store.count_admin_users() == 0:
                 admin_id = str(uuid.uuid4())
                 # Default hash for 'admin' password - change this immediately in production!
                 admin_hash = os.getenv('ADMIN_PASSWORD_HASH', '')
-                now = datetime.datetime.now()
-
-                cursor.execute(
-                    "INSERT INTO admin_users (id, username, password_hash, created_at) VALUES (%s, %s, %s, %s)",
-                    (admin_id, 'admin', admin_hash, now)
-                )
-
-            conn.commit()
-            print("Database initialized successfully")
-        except mysql.connector.Error as err:
-            print(f"Error initializing database: {err}")
-        finally:
-            cursor.close()
-            conn.close()
-    else:
-        print("Failed to initialize database: Could not connect")
+                store.create_admin_user(admin_id, 'admin', admin_hash, datetime.datetime.now())
+
+            log.info("Database initialized successfully")
+        except store.Error as err:
+            log.error("Error initializing database: %s", err)
+    except DatabaseUnavailable:
+        log.error("Failed to initialize database: Could not connect")
 
 # API Routes
 
-# Handle OPTIONS requests for CORS preflight - explicit headers for OPTIONS
-@app.route('/api/posts', methods=['OPTIONS'])
-@app.route('/api/posts/<post_id>', methods=['OPTIONS'])
-@app.route('/api/sitemap', methods=['OPTIONS'])
-@app.route('/api/auth/login', methods=['OPTIONS'])
-@app.route('/api/auth/verify', methods=['OPTIONS'])
-@app.route('/api/auth/logout', methods=['OPTIONS'])
-def handle_options(post_id=None):
-    print(f"\n==== OPTIONS REQUEST DEBUG ====")
-    print(f"OPTIONS Request Headers: {dict(request.headers)}")
-    print(f"Access-Control-Request-Method: {request.headers.get('Access-Control-Request-Method')}")
-    print(f"Access-Control-Request-Headers: {request.headers.get('Access-Control-Request-Headers')}")
-
-    # Create response with 200 OK status
-    response = jsonify({'success': True})
-    response.status_code = 200
-
-    # Get the origin and set appropriate headers
-    origin = request.headers.get('Origin')
-    print(f"Origin: {origin}")
-
-    if origin:
-        response.headers['Access-Control-Allow-Origin'] = origin
-        response.headers['Vary'] = 'Origin'
-
-    # Handle requested method
-    requested_method = request.headers.get('Access-Control-Request-Method')
-    if requested_method:
-        response.headers['Access-Control-Allow-Methods'] = requested_method
+# Get posts. Without query parameters this returns every post as a plain array
+# (legacy clients); with limit, cursor or fields it returns one keyset page:
+# {"posts": [...], "next_cursor": "..."} ordered by (date, id) descending.
+@app.route('/api/posts', methods=['GET'])
+def get_posts():
+    paginated = any(arg in request.args for arg in ('limit', 'cursor', 'fields'))
+    if paginated:
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            limit = parse_limit(request.args.get('limit'))
+            cursor_arg = request.args.get('cursor')
+            after = decode_cursor(cursor_arg) if cursor_arg else None
+        except InvalidListQuery as e:
+            return jsonify({"error": str(e)}), 400
+        cache_key = ('list', fields, limit, cursor_arg)
     else:
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        cache_key = ('list', None)
+
+    entry = post_cache.get(cache_key)
+    if entry is None:
+        def load():
+            if paginated:
+                rows = store.list_page(fields, limit, after)
+                payload = paginate(rows, fields, limit)
+                rows = rows[:limit]
+            else:
+                rows = payload = store.list_all()
 
-    # Handle requested headers
-    requested_headers = request.headers.get('Access-Control-Request-Headers')
-    if requested_headers:
-        response.headers['Access-Control-Allow-Headers'] = requested_headers
-    else:
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization, X-Requested-With'
+            # The list revision changes whenever any post on it is written
+            etag = make_etag(*cache_key, *(part for row in rows for part in row_revision(row)))
+            return post_cache.put(cache_key, encode_json(payload), etag)
 
-    # Enable credentials
-    response.headers['Access-Control-Allow-Credentials'] = 'true'
+        try:
+            entry, _ = read_flight.do(cache_key, load)
+        except store.Error as err:
+            log.error("Error fetching posts: %s", err)
+            return jsonify({"error": "Failed to fetch posts"}), 500
 
-    # Set preflight cache duration
-    response.headers['Access-Control-Max-Age'] = '3600'
+    return cached_response(cache_key, entry)
 
-    print(f"OPTIONS Response Headers: {dict(response.headers)}")
-    print(f"==== END OPTIONS REQUEST DEBUG ====\n")
+# Get a specific post by ID. ?format=html returns the body rendered to HTML
+# as content_html instead of the Markdown content.
+@app.route('/api/posts/<post_id>', methods=['GET'])
+def get_post(post_id):
+    fmt = request.args.get('format', 'markdown')
+    if fmt not in ('markdown', 'html'):
+        return jsonify({"error": "format must be 'markdown' or 'html'"}), 400
+    cache_key = ('post', post_id, fmt)
+    entry = post_cache.get(cache_key)
+    if entry is None:
+        def load():
+            post = store.get_post(post_id)
+            return cache_post(post, fmt) if post else None
 
-    return response
+        try:
+            entry, _ = read_flight.do(cache_key, load)
+        except store.Error as err:
+            log.error("Error fetching post %s: %s", post_id, err)
+            return jsonify({"error": "Failed to fetch post"}), 500
 
-# Get all posts
-@app.route('/api/posts', methods=['GET'])
-def get_posts():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
+        if entry is None:
+            return jsonify({"error": "Post not found"}), 404
 
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM posts ORDER BY date DESC")
-        posts = cursor.fetchall()
-        return jsonify(json.loads(json.dumps(posts, default=json_serial)))
-    except mysql.connector.Error as err:
-        print(f"Error fetching posts: {err}")
-        return jsonify({"error": "Failed to fetch posts"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    # Count the view in the write-behind buffer; the body reports it at once
+    view_counter.increment(post_id)
+    return cached_response(cache_key, entry, body=post_body(post_id, entry))
+
+def cache_post(post, fmt):
+    """Encode a posts row the way GET /api/posts/<id> returns it and cache it.
+
+    view_count is left out of the cached body: the entry keeps the stored
+    count less the views this process had already written, and post_body()
+    adds every view this process has counted since.
+    """
+    revision = row_revision(post)
+    views = post.pop('view_count') - view_counter.flushed(post['id'])
+    if fmt == 'html':
+        _, post['content_html'] = html_cache.get(post.pop('content'))
+        etag = make_etag(*revision, fmt, RENDERER_VERSION)
+    else:
+        etag = make_etag(*revision)
+    return post_cache.put(('post', post['id'], fmt), encode_json(post), etag, views=views)
+
+def post_body(post_id, entry):
+    """A cached post body with its current view_count spliced in"""
+    # Both halves are encoded by encode_json(), so this gives the same bytes
+    # as encoding the whole post with sort_keys (view_count sorts last)
+    head = entry.body.rstrip()[:-1].rstrip()
+    tail = encode_json({'view_count': entry.views + view_counter.counted(post_id)}).lstrip()[1:]
+    return head + b',' + tail
+
+# Most posts one batch request may ask for
+BATCH_MAX_IDS = 100
+
+# Several posts in one round trip: GET /api/posts/batch?ids=a,b,c or POST
+# {"ids": [...]}, each with an optional format like GET /api/posts/<id>.
+# Returns {"posts": [...], "missing": [...]}, both in request order. Cached
+# posts are served from memory and the rest are read with one query. Views
+# are not counted: batches are prefetches, not reads.
+@app.route('/api/posts/batch', methods=['GET', 'POST'])
+def get_posts_batch():
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        ids = data.get('ids')
+        fmt = data.get('format', 'markdown')
+        if not isinstance(ids, list) or not all(isinstance(post_id, str) for post_id in ids):
+            return jsonify({"error": "ids must be a list of post ids"}), 400
+    else:
+        ids = [post_id for post_id in request.args.get('ids', '').split(',') if post_id]
+        fmt = request.args.get('format', 'markdown')
+    if fmt not in ('markdown', 'html'):
+        return jsonify({"error": "format must be 'markdown' or 'html'"}), 400
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return jsonify({"error": "ids is required"}), 400
+    if len(ids) > BATCH_MAX_IDS:
+        return jsonify({"error": f"At most {BATCH_MAX_IDS} ids per request"}), 400
+
+    entries = {}
+    for post_id in ids:
+        entry = post_cache.get(('post', post_id, fmt))
+        if entry is not None:
+            entries[post_id] = entry
+
+    uncached = [post_id for post_id in ids if post_id not in entries]
+    if uncached:
+        try:
+            rows = store.get_posts(uncached)
+        except store.Error as err:
+            log.error("Error fetching posts %s: %s", uncached, err)
+            return jsonify({"error": "Failed to fetch posts"}), 500
 
-# Get a specific post by ID
-@app.route('/api/posts/<post_id>', methods=['GET'])
-def get_post(post_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
+        for post in rows:
+            entries[post['id']] = cache_post(post, fmt)
 
-    cursor = conn.cursor(dictionary=True)
-    try:
-        # First, get the post
-        cursor.execute("SELECT * FROM posts WHERE id = %s", (post_id,))
-        post = cursor.fetchone()
-
-        if post:
-            # Increment view count
-            cursor.execute(
-                "UPDATE posts SET view_count = view_count + 1 WHERE id = %s",
-                (post_id,)
-            )
-            conn.commit()
-
-            # Return the post with updated view count
-            post['view_count'] += 1  # Update in-memory as well
-            return jsonify(json.loads(json.dumps(post, default=json_serial)))
-        else:
-            return jsonify({"error": "Post not found"}), 404
-    except mysql.connector.Error as err:
-        print(f"Error fetching post: {err}")
-        return jsonify({"error": "Failed to fetch post"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    # Splice the cached bodies in rather than decoding them
+    found = [post_body(post_id, entries[post_id]).rstrip(b'\n') for post_id in ids if post_id in entries]
+    missing = [post_id for post_id in ids if post_id not in entries]
+    body = (b'{"missing":' + encode_json(missing).rstrip(b'\n')
+            + b',"posts":[' + b','.join(found) + b']}\n')
+    return app.response_class(body, mimetype='application/json')
 
 # Protected route middleware
 def require_auth(f):
@@ -278,52 +694,92 @@ def require_auth(f):
         token = auth_header.split(' ')[1]
 
         # Verify session
-        if not verify_session(token):
+        session = verify_session(token)
+        if session is None:
             return jsonify({"error": "Invalid or expired session"}), 401
 
         # Add user info to request
-        request.user = active_sessions[token]
+        request.user = session
 
         return f(*args, **kwargs)
 
     decorated.__name__ = f.__name__
     return decorated
 
+# Rows read from the database per chunk of the export stream
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+
+EXPORT_COLUMNS = ('id', 'title', 'content', 'excerpt', 'date', 'updated_at', 'view_count')
+
+def export_chunks(since):
+    """NDJSON lines of every post (or those updated at/after ``since``), in chunks.
+
+    The first ``next()`` opens the connection and runs the query, so
+    database errors surface before the response starts. Rows are pulled
+    from the database ``EXPORT_BATCH_SIZE`` at a time (store.scan_posts()),
+    so memory does not grow with the table. The connection is held until
+    the stream ends or the client goes away.
+    """
+    batches = store.scan_posts(EXPORT_COLUMNS, since=since, batch_size=EXPORT_BATCH_SIZE)
+    try:
+        first = next(batches, [])
+        yield b''
+        for rows in itertools.chain([first], batches):
+            # compact=True keeps each post on one line even in debug mode
+            yield b''.join(response_encoder.encode(row, compact=True) for row in rows)
+    finally:
+        batches.close()
+
+# Stream posts as NDJSON (one JSON object per line), the format migrate.py
+# imports. ?since=<updated_at> limits it to posts written at or after then.
+@app.route('/api/posts/export', methods=['GET'])
+@require_auth
+def export_posts():
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = datetime.datetime.fromisoformat(since.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            return jsonify({"error": "since must be an ISO 8601 date and time"}), 400
+
+    chunks = export_chunks(since)
+    try:
+        next(chunks)
+    except store.Error as err:
+        log.error("Error exporting posts: %s", err)
+        return jsonify({"error": "Failed to export posts"}), 500
+
+    filename = f"posts-{datetime.datetime.now():%Y%m%d-%H%M%S}.ndjson"
+    return app.response_class(chunks, mimetype='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store'
+    })
+
 # Create a new post
 @app.route('/api/posts', methods=['POST'])
 @require_auth
 def create_post():
-    # Enhanced debugging for request data
-    print("\n==== CREATE POST REQUEST ====")
-    print(f"Headers: {dict(request.headers)}")
-    print(f"Content-Type: {request.content_type}")
-    print(f"Request Data: {request.data}")
+    log.debug("create_post request", extra={
+        'content_type': request.content_type, 'content_length': request.content_length
+    })
 
     # Parse request data with detailed error handling
     try:
         data = request.get_json(force=True, silent=True)
         if data is None:
-            print("ERROR: Failed to parse JSON data")
+            log.warning("Failed to parse JSON data")
             return jsonify({"error": "Invalid JSON data"}), 400
-        print(f"Parsed JSON data: {data}")
     except Exception as e:
-        print(f"ERROR parsing JSON: {str(e)}")
+        log.warning("Error parsing JSON: %s", e)
         return jsonify({"error": f"Failed to parse JSON: {str(e)}"}), 400
 
-    conn = get_db_connection()
-    if not conn:
-        print("ERROR: Database connection failed")
-        return jsonify({"error": "Database connection failed"}), 500
-
     # Validate required fields
     required_fields = ['id', 'title', 'content', 'date']
     for field in required_fields:
         if field not in data:
-            print(f"ERROR: Missing required field: {field}")
+            log.warning("Missing required field: %s", field)
             return jsonify({"error": f"Missing required field: {field}"}), 400
 
-    print("All required fields present, creating post...")
-    cursor = conn.cursor()
     try:
         now = datetime.datetime.now()
         # Handle date parsing with error handling
@@ -334,137 +790,107 @@ def create_post():
                 parsed_date = datetime.datetime.fromisoformat(input_date.replace('Z', '+00:00'))
             else:
                 parsed_date = input_date
-
-            # Debug the date values
-            print(f"Input date: {input_date}, Parsed date: {parsed_date}")
         except Exception as e:
-            print(f"ERROR parsing date: {str(e)}")
+            log.warning("Error parsing date %r: %s", data['date'], e)
             return jsonify({"error": f"Invalid date format: {str(e)}"}), 400
 
         # Execute the insert query
         try:
-            print(f"Executing SQL with values: id={data['id']}, title={data['title']}, content_len={len(data['content'])}, date={parsed_date}, now={now}")
-            cursor.execute(
-                "INSERT INTO posts (id, title, content, date, updated_at, view_count) VALUES (%s, %s, %s, %s, %s, %s)",
-                (data['id'], data['title'], data['content'], parsed_date, now, data.get('view_count', 0))
-            )
-            conn.commit()
-            print("Post created successfully")
+            store.insert_post(data['id'], data['title'], data['content'], parsed_date, now,
+                              view_count=data.get('view_count', 0))
+            stick_to_primary()
+            stamps = post_cache.invalidate_post(data['id'])
+            sitemap_cache.invalidate()
+            schedule_static_build()
+            index_post(data['id'], data['title'], data['content'], now, stamps)
+            warm_html_cache(data['content'])
+            log.info("Post created", extra={'post_id': data['id'], 'content_len': len(data['content'])})
             return jsonify({"success": True, "id": data['id']}), 201
-        except mysql.connector.Error as err:
-            print(f"Database error: {err}")
+        except store.Error as err:
+            log.error("Database error creating post %s: %s", data['id'], err)
             return jsonify({"error": f"Database error: {str(err)}"}), 500
+    except (DatabaseUnavailable, PoolTimeout):
+        raise  # answered by their error handlers
     except Exception as e:
-        print(f"Unexpected error creating post: {str(e)}")
+        log.exception("Unexpected error creating post: %s", e)
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
-        print("Database connection closed")
 
 # Update an existing post
 @app.route('/api/posts/<post_id>', methods=['PUT'])
 @require_auth
 def update_post(post_id):
-    # Enhanced request debugging
-    print("\n==== UPDATE POST REQUEST ====")
-    print(f"Headers: {dict(request.headers)}")
-    print(f"Content-Type: {request.content_type}")
-    print(f"Request Data: {request.data}")
-    print(f"Post ID: {post_id}")
-
-    conn = get_db_connection()
-    if not conn:
-        print("ERROR: Database connection failed")
-        return jsonify({"error": "Database connection failed"}), 500
+    log.debug("update_post request", extra={
+        'post_id': post_id, 'content_type': request.content_type,
+        'content_length': request.content_length
+    })
 
     # Parse request data with detailed error handling
+    # Check if the request is JSON
+    if not request.is_json:
+        log.warning("Request is not JSON. Content-Type: %s", request.content_type)
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    # Try to parse JSON with detailed error handling
     try:
-        # Check if the request is JSON
-        if not request.is_json:
-            print(f"ERROR: Request is not JSON. Content-Type: {request.content_type}")
-            return jsonify({"error": "Request must be JSON"}), 400
+        data = request.get_json(force=False, silent=True)
+        if data is None:
+            log.warning("Failed to parse JSON data")
+            return jsonify({"error": "Invalid JSON data"}), 400
+    except Exception as e:
+        log.warning("Error parsing JSON: %s", e)
+        return jsonify({"error": f"Failed to parse JSON: {str(e)}"}), 400
 
-        # Try to parse JSON with detailed error handling
-        try:
-            data = request.get_json(force=False, silent=True)
-            if data is None:
-                print("ERROR: Failed to parse JSON data")
-                return jsonify({"error": "Invalid JSON data"}), 400
-            print(f"Parsed JSON data: {data}")
-        except Exception as e:
-            print(f"ERROR parsing JSON: {str(e)}")
-            return jsonify({"error": f"Failed to parse JSON: {str(e)}"}), 400
-
-        # Validate required fields
-        required_fields = ['title', 'content']
-        for field in required_fields:
-            if field not in data:
-                print(f"ERROR: Missing required field: {field}")
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-
-        print("All required fields present, updating post...")
-        cursor = conn.cursor()
-        try:
-            now = datetime.datetime.now()
-            print(f"Executing SQL with values: title={data['title']}, content_len={len(data['content'])}, updated_at={now}, id={post_id}")
-
-            # If view_count was provided, use it; otherwise, keep the existing value
-            if 'view_count' in data:
-                cursor.execute(
-                    "UPDATE posts SET title = %s, content = %s, updated_at = %s, view_count = %s WHERE id = %s",
-                    (data['title'], data['content'], now, data['view_count'], post_id)
-                )
-            else:
-                cursor.execute(
-                    "UPDATE posts SET title = %s, content = %s, updated_at = %s WHERE id = %s",
-                    (data['title'], data['content'], now, post_id)
-                )
-            conn.commit()
-
-            if cursor.rowcount == 0:
-                print(f"ERROR: Post not found with ID: {post_id}")
-                return jsonify({"error": "Post not found"}), 404
-
-            print("Post updated successfully")
-            return jsonify({"success": True, "id": post_id})
-        except mysql.connector.Error as err:
-            print(f"Database error: {err}")
-            return jsonify({"error": f"Database error: {str(err)}"}), 500
+    # Validate required fields
+    required_fields = ['title', 'content']
+    for field in required_fields:
+        if field not in data:
+            log.warning("Missing required field: %s", field)
+            return jsonify({"error": f"Missing required field: {field}"}), 400
+
+    try:
+        now = datetime.datetime.now()
+        # If view_count was provided, use it; otherwise, keep the existing value
+        found = store.update_post(post_id, data['title'], data['content'], now,
+                                  view_count=data.get('view_count'))
+        if not found:
+            log.warning("Post not found with ID: %s", post_id)
+            return jsonify({"error": "Post not found"}), 404
+
+        stick_to_primary()
+        stamps = post_cache.invalidate_post(post_id)
+        sitemap_cache.invalidate()
+        schedule_static_build()
+        index_post(post_id, data['title'], data['content'], now, stamps)
+        warm_html_cache(data['content'])
+        log.info("Post updated", extra={'post_id': post_id, 'content_len': len(data['content'])})
+        return jsonify({"success": True, "id": post_id})
+    except store.Error as err:
+        log.error("Database error updating post %s: %s", post_id, err)
+        return jsonify({"error": f"Database error: {str(err)}"}), 500
+    except (DatabaseUnavailable, PoolTimeout):
+        raise  # answered by their error handlers
     except Exception as e:
-        print(f"Unexpected error updating post: {str(e)}")
+        log.exception("Unexpected error updating post: %s", e)
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-        print("Database connection closed")
-        print("==== END UPDATE POST REQUEST ====\n")
 
 # Delete a post
 @app.route('/api/posts/<post_id>', methods=['DELETE'])
 @require_auth
 def delete_post(post_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
-
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM posts WHERE id = %s", (post_id,))
-        conn.commit()
-
-        if cursor.rowcount == 0:
+        if not store.delete_post(post_id):
             return jsonify({"error": "Post not found"}), 404
-
-        return jsonify({"success": True})
-    except mysql.connector.Error as err:
-        print(f"Error deleting post: {err}")
+    except store.Error as err:
+        log.error("Error deleting post %s: %s", post_id, err)
         return jsonify({"error": "Failed to delete post"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+    stick_to_primary()
+    stamps = post_cache.invalidate_post(post_id)
+    sitemap_cache.invalidate()
+    schedule_static_build()
+    unindex_post(post_id, stamps)
+    log.info("Post deleted", extra={'post_id': post_id})
+    return jsonify({"success": True})
 
 # Authentication endpoints
 
@@ -483,16 +909,9 @@ def login():
     username = data['username']
     password = data['password']
 
-    # Get database connection
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
-
-    cursor = conn.cursor(dictionary=True)
     try:
         # Find user by username
-        cursor.execute("SELECT id, username, password_hash FROM admin_users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+        user = store.get_admin_user(username)
 
         if not user:
             return jsonify({"error": "Invalid credentials"}), 401
@@ -502,38 +921,29 @@ def login():
         if password_hash != user['password_hash']:
             return jsonify({"error": "Invalid credentials"}), 401
 
-        # Create session
-        session_token = generate_session_token()
-        now = time.time()
-
-        # Store session
-        active_sessions[session_token] = {
-            'user_id': user['id'],
-            'username': user['username'],
-            'created_at': now
-        }
-
         # Update last login time
-        cursor.execute(
-            "UPDATE admin_users SET last_login = %s WHERE id = %s",
-            (datetime.datetime.now(), user['id'])
-        )
-        conn.commit()
+        store.record_login(user['id'], datetime.datetime.now())
+    except store.Error as err:
+        log.error("Error during login: %s", err)
+        return jsonify({"error": "Authentication failed"}), 500
 
-        # Return token (will be stored as HTTP-only cookie in frontend)
-        return jsonify({
-            "success": True,
-            "token": session_token,
-            "user": {
-                "username": user['username']
-            }
-        })
-    except mysql.connector.Error as err:
-        print(f"Error during login: {err}")
+    # Create session
+    session_token = generate_session_token()
+    try:
+        session_store.create(session_token, user['id'], user['username'])
+    except (store.Error, mysql.connector.Error) as err:
+        # SESSION_BACKEND=database keeps sessions in MariaDB whatever DB_BACKEND is
+        log.error("Error storing session: %s", err)
         return jsonify({"error": "Authentication failed"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+    # Return token (will be stored as HTTP-only cookie in frontend)
+    return jsonify({
+        "success": True,
+        "token": session_token,
+        "user": {
+            "username": user['username']
+        }
+    })
 
 # Verify session
 @app.route('/api/auth/verify', methods=['POST'])
@@ -549,13 +959,14 @@ def verify():
 
     token = data['token']
 
-    # Verify if session is valid
-    if verify_session(token):
-        session = active_sessions[token]
+    # Verify if session is valid. Only the admin UI's check; require_auth
+    # asks the primary, so a logout is honored at once for writes.
+    session = verify_session(token, stale_ok=True)
+    if session is not None:
         return jsonify({
             "success": True,
             "user": {
-                "username": session['username']
+                "username": session.username
             }
         })
     else:
@@ -576,75 +987,216 @@ def logout():
     token = data['token']
 
     # Remove session if exists
-    if token in active_sessions:
-        del active_sessions[token]
+    session_store.delete(token)
 
     return jsonify({"success": True})
 
 
+SEARCH_RESULT_COLUMNS = ('id', 'title', 'excerpt', 'date', 'updated_at', 'view_count')
+
+# Full-text search over titles and bodies. Every query term must match;
+# results are ranked by BM25 and paginated with limit/offset.
+@app.route('/api/search', methods=['GET'])
+def search_posts():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter q is required"}), 400
+    if len(query) > MAX_SEARCH_QUERY_LENGTH:
+        return jsonify({"error": f"Query is longer than {MAX_SEARCH_QUERY_LENGTH} characters"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        offset = int(request.args.get('offset') or 0)
+    except (InvalidListQuery, ValueError) as e:
+        message = str(e) if isinstance(e, InvalidListQuery) else "offset must be an integer"
+        return jsonify({"error": message}), 400
+    if offset < 0:
+        return jsonify({"error": "offset must not be negative"}), 400
+
+    try:
+        if store.full_text:
+            total, hits = store.search(query, limit=limit, offset=offset)
+        else:
+            sync_search_index()
+            total, hits = search_index.search(query, limit=limit, offset=offset)
+        rows = {}
+        if hits:
+            rows = {row['id']: row
+                    for row in store.get_posts([post_id for post_id, _ in hits], SEARCH_RESULT_COLUMNS)}
+    except store.Error as err:
+        log.error("Error searching posts for %r: %s", query, err)
+        return jsonify({"error": "Failed to search posts"}), 500
+
+    results = []
+    for post_id, score in hits:
+        row = rows.get(post_id)
+        # A post deleted by another worker since the last sync
+        if row is not None:
+            row['score'] = round(score, 4)
+            results.append(row)
+
+    next_offset = offset + limit if offset + limit < total else None
+    payload = {"query": query, "total": total, "results": results, "next_offset": next_offset}
+    return app.response_class(encode_json(payload), mimetype='application/json')
+
 # Generate sitemap.xml
+def build_sitemap():
+    """Stream every post from the database into the on-disk sitemap files"""
+    # Rows are written out a batch at a time as they arrive
+    rows = itertools.chain.from_iterable(store.scan_posts(('id', 'date', 'updated_at'), newest_first=True))
+    # Workers that queued on the build lock behind a fresh build return at once
+    sitemap_cache.build(rows, index_url=f'{API_BASE_URL}/sitemap', if_stale=True)
+
+def sitemap_response(name):
+    entry = sitemap_cache.get(name)
+    if entry is None and not sitemap_cache.is_fresh():
+        try:
+            # Every request that finds the sitemap stale waits for one build
+            read_flight.do(('sitemap',), build_sitemap, timeout=SITEMAP_COALESCE_TIMEOUT)
+        except store.Error as err:
+            log.error("Error generating sitemap: %s", err)
+            return jsonify({"error": "Failed to generate sitemap"}), 500
+        entry = sitemap_cache.get(name)
+    if entry is None:
+        return jsonify({"error": "Sitemap not found"}), 404
+
+    # The gzip copy is written with the sitemap; brotli is made on first request
+    encoding = compressor.choose(request.accept_encodings, len(entry.body))
+    if encoding:
+        response = app.response_class(compressor.variant(entry.variants, entry.body, encoding),
+                                      mimetype='application/xml')
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = app.response_class(entry.body, mimetype='application/xml')
+    response.vary.add('Accept-Encoding')
+    response.last_modified = entry.last_modified
+    response.set_etag(f'{entry.etag}-{encoding}' if encoding else entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Atom and RSS feeds of the newest FEED_SIZE posts. Both are cached like
+# the post list until the next post write.
+feed_site = FeedSite(
+    title=os.getenv('FEED_TITLE', '신규리의 블로그'),
+    base_url=os.getenv('BASE_URL', 'https://orange-man.xyz'),
+    author=os.getenv('FEED_AUTHOR', '신규리')
+)
+FEED_SIZE = int(os.getenv('FEED_SIZE', str(DEFAULT_FEED_SIZE)))
+
+def feed_response(kind, path):
+    build, mimetype = FEED_FORMATS[kind]
+    cache_key = ('list', 'feed', kind)
+    entry = post_cache.get(cache_key)
+    if entry is None:
+        def load():
+            # Read the stamp before the posts: a write after this bumps it again
+            stamp = posts_changed.version()
+            posts = store.recent_posts(('id', 'title', 'excerpt', 'date', 'updated_at'), FEED_SIZE)
+
+            last_write = datetime.datetime.fromtimestamp(stamp[1] / 1e9) if stamp else None
+            updated = feed_updated(posts, last_write)
+            # The cached body is shared by every client, so its <id> and
+            # rel="self" link come from configuration, not this request
+            self_url = f'{API_BASE_URL}/{path}'
+            body = build(feed_site, posts, self_url, updated)
+            etag = make_etag(*cache_key, self_url, *(part for post in posts for part in row_revision(post)))
+            return post_cache.put(cache_key, body, etag, last_modified=updated)
+
+        try:
+            entry, _ = read_flight.do(cache_key, load)
+        except store.Error as err:
+            log.error("Error generating %s feed: %s", kind, err)
+            return jsonify({"error": "Failed to generate feed"}), 500
+
+    return cached_response(cache_key, entry, mimetype)
+
+@app.route('/api/feed.xml', methods=['GET'])
+def atom_feed():
+    return feed_response('atom', 'feed.xml')
+
+@app.route('/api/rss.xml', methods=['GET'])
+def rss_feed():
+    return feed_response('rss', 'rss.xml')
+
 @app.route('/api/sitemap', methods=['GET'])
 def generate_sitemap():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"error": "Database connection failed"}), 500
-
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT id, date FROM posts ORDER BY date DESC")
-        posts = cursor.fetchall()
-
-        # Get base URL from environment variable
-        base_url = os.getenv('BASE_URL', 'https://orange-man.xyz')
-
-        xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-
-        # Add homepage
-        xml += '  <url>\n'
-        xml += f'    <loc>{base_url}/resume.html</loc>\n'
-        xml += '    <changefreq>monthly</changefreq>\n'
-        xml += '    <priority>1.0</priority>\n'
-        xml += '  </url>\n'
-
-        # Add blog homepage
-        xml += '  <url>\n'
-        xml += f'    <loc>{base_url}/blog/index.html</loc>\n'
-        xml += '    <changefreq>weekly</changefreq>\n'
-        xml += '    <priority>0.9</priority>\n'
-        xml += '  </url>\n'
-
-        # Add blog posts
-        for post in posts:
-            post_url = f"{base_url}/blog/index.html#/post/{post['id']}"
-            lastmod = post['date'].strftime('%Y-%m-%d')
-
-            xml += '  <url>\n'
-            xml += f'    <loc>{post_url}</loc>\n'
-            xml += f'    <lastmod>{lastmod}</lastmod>\n'
-            xml += '    <changefreq>monthly</changefreq>\n'
-            xml += '    <priority>0.8</priority>\n'
-            xml += '  </url>\n'
-
-        # Close XML
-        xml += '</urlset>'
-
-        return xml, 200, {'Content-Type': 'application/xml'}
-    except mysql.connector.Error as err:
-        print(f"Error generating sitemap: {err}")
-        return jsonify({"error": "Failed to generate sitemap"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    return sitemap_response('sitemap.xml')
+
+# Child sitemaps, only present once the post count exceeds SITEMAP_SHARD_SIZE
+@app.route('/api/sitemap/<name>', methods=['GET'])
+def sitemap_shard(name):
+    return sitemap_response(name)
+
+# Connection pool usage, for sizing DB_POOL_SIZE / DB_POOL_MAX_OVERFLOW
+@app.route('/api/stats/pool', methods=['GET'])
+def pool_stats():
+    if not replica_router.enabled:
+        return jsonify(db_pool.stats())
+    return jsonify({**db_pool.stats(), 'replication': replica_router.stats()})
+
+# Post cache usage, for sizing POST_CACHE_MAX_BYTES
+@app.route('/api/stats/cache', methods=['GET'])
+def cache_stats():
+    return jsonify({**post_cache.stats(), 'html': html_cache.stats(), 'coalescing': coalescing_stats()})
+
+# Prometheus scrape target; covers every worker process (see METRICS_DIR)
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return app.response_class(metrics.exposition(), content_type=METRICS_CONTENT_TYPE)
+
+# Database connection errors raised by db_connection()
+@app.errorhandler(DatabaseUnavailable)
+def handle_db_unavailable(e):
+    return jsonify({"error": "Database connection failed"}), 500
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    log.warning("Connection pool exhausted: %s", e)
+    return jsonify({"error": "Database busy, please retry"}), 503, {'Retry-After': '1'}
+
+@app.errorhandler(FlightTimeout)
+def handle_flight_timeout(e):
+    log.warning("Gave up waiting for a shared fetch: %s", e)
+    return jsonify({"error": "Database busy, please retry"}), 503, {'Retry-After': '1'}
 
 # Add detailed error logging
 @app.errorhandler(Exception)
 def handle_error(e):
-    app.logger.error(f"Unhandled exception: {str(e)}")
+    log.exception("Unhandled exception: %s", e)
     return jsonify({"error": str(e)}), 500
 
+def warm_search_index():
+    """Build the search index now rather than on the first search.
+
+    Called in the gunicorn master before forking, so every worker starts
+    with the index and only has to apply later changes.
+    """
+    if store.full_text:
+        return
+    try:
+        sync_search_index()
+    except (DatabaseUnavailable, store.Error) as err:
+        log.warning("Search index not preloaded, building on first search: %s", err)
+
+def init_worker():
+    """Give a freshly forked worker process its own in-memory state.
+
+    Called from the gunicorn post_fork hook. The connection pool, view
+    counter, metrics and log listener already reset themselves after fork;
+    caches copied from the master are dropped so each worker fills its own,
+    and the worker starts writing its metrics file.
+    """
+    post_cache.clear()
+    sitemap_cache.clear_memory()
+    metrics.start()
+
 # Initialize database on startup
 if __name__ == '__main__':
+    import signal
+    import sys
+
+    # Exit normally on SIGTERM so atexit hooks flush buffered view counts
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     init_db()
     # Use 0.0.0.0 to allow connections from any IP
     # Enable debug for development but disable in production
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# ASGI entry point: async MariaDB reads, with the Flask app behind it
+#
+# Usage: uvicorn asgi:app --host 0.0.0.0 --port 5501 [--workers N]
+#
+# GET /api/posts and GET /api/posts/<id> are served here on an aiomysql
+# connection pool, so a request waiting for MariaDB holds no thread (with
+# DB_BACKEND=mariadb and no read replicas; see NATIVE_READS). Every
+# other route (writes, auth, search, sitemap, stats) is handed to the Flask
+# app on a small thread pool. Both halves share one process, so they share
+# the post cache, view counter, HTML cache and search index, and the JSON
+# they return is produced by the same code.
+
+import asyncio
+import logging
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+import pymysql
+from a2wsgi import WSGIMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from werkzeug.http import parse_accept_header, parse_etags
+
+import app as blog_app
+from app import (
+    DB_CONFIG, DB_POOL_CONFIG, DatabaseUnavailable, cache_post, compressor, db_acquire_seconds,
+    db_query_seconds, encode_json, metrics, post_body, post_cache, request_seconds, sample_access_log,
+    view_counter
+)
+from compression import compress
+from cors import AsgiCorsMiddleware
+from db_pool import PoolTimeout
+from post_cache import make_etag, row_revision
+from post_listing import InvalidListQuery, build_page_query, decode_cursor, paginate, parse_fields, parse_limit
+from single_flight import AsyncSingleFlight, FlightTimeout
+
+log = logging.getLogger('blog.asgi')
+access_log = logging.getLogger('blog.access')
+
+# Threads running the Flask routes
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '10'))
+
+# The async handlers below read the MariaDB primary directly. With
+# DB_BACKEND=sqlite or read replicas (DB_REPLICAS) they are not mounted, and
+# the Flask routes serve these GETs through blog_app.store instead
+NATIVE_READS = blog_app.DB_BACKEND == 'mariadb' and not blog_app.replica_router.enabled
+
+_POST_RE = re.compile(r'/api/posts/([^/]+)')
+# Routes under /api/posts/ that are not a post id
+_FLASK_POST_ROUTES = frozenset(('/api/posts/export', '/api/posts/batch'))
+
+
+class AsyncDatabase:
+    """aiomysql pool sized and tuned like the synchronous one (DB_POOL_*).
+
+    ``size + max_overflow`` connections at most; waiting longer than
+    ``timeout`` for one raises ``PoolTimeout``. Connections run in
+    autocommit mode so a pooled connection never reads an old snapshot.
+    """
+
+    def __init__(self, config, size, max_overflow, recycle, timeout, pre_ping):
+        self.config = config
+        self.maxsize = size + max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self._pool = None
+
+    async def open(self):
+        if self._pool is None:
+            try:
+                self._pool = await aiomysql.create_pool(
+                    host=self.config['host'], user=self.config['user'],
+                    password=self.config['password'], db=self.config['database'],
+                    minsize=0, maxsize=self.maxsize, pool_recycle=self.recycle,
+                    autocommit=True, charset='utf8mb4'
+                )
+            except pymysql.err.MySQLError as err:
+                log.error("Database connection error: %s", err)
+                raise DatabaseUnavailable(str(err)) from err
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        await self.open()
+        start = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(self._pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No database connection free within {self.timeout}s") from None
+        except pymysql.err.MySQLError as err:
+            log.error("Database connection error: %s", err)
+            raise DatabaseUnavailable(str(err)) from err
+        try:
+            if self.pre_ping:
+                await conn.ping(reconnect=True)
+            db_acquire_seconds.observe(time.perf_counter() - start)
+            yield conn
+        finally:
+            self._pool.release(conn)
+
+
+db = AsyncDatabase(DB_CONFIG, **DB_POOL_CONFIG)
+
+# Coalesces cache misses like app.read_flight, for the handlers below
+read_flight = AsyncSingleFlight(timeout=blog_app.read_flight.timeout)
+blog_app.read_flights.append(read_flight)
+
+
+def json_response(payload, status=200, headers=None):
+    return Response(encode_json(payload), status_code=status, headers=headers, media_type='application/json')
+
+
+def first_arg(request, name):
+    # Flask's request.args.get() returns the first value of a repeated parameter
+    values = request.query_params.getlist(name)
+    return values[0] if values else None
+
+
+def cached_json_response(request, key, entry, body=None):
+    """Async twin of app.cached_response() for JSON: 304, compressed variant or body"""
+    if body is None:
+        body = entry.body
+    encoding = compressor.choose(parse_accept_header(request.headers.get('accept-encoding')), len(body))
+    etag = f'{entry.etag}-{encoding}' if encoding else entry.etag
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if compressor.enabled:
+        headers['Vary'] = 'Accept-Encoding'
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        if body is entry.body:
+            body = post_cache.variant(key, entry, encoding, compress)
+        else:
+            body = compress(body, encoding, static=False)
+    return Response(body, headers=headers, media_type='application/json')
+
+
+async def get_posts(request):
+    paginated = any(arg in request.query_params for arg in ('limit', 'cursor', 'fields'))
+    if paginated:
+        try:
+            fields = parse_fields(first_arg(request, 'fields'))
+            limit = parse_limit(first_arg(request, 'limit'))
+            cursor_arg = first_arg(request, 'cursor')
+            after = decode_cursor(cursor_arg) if cursor_arg else None
+        except InvalidListQuery as e:
+            return json_response({"error": str(e)}, 400)
+        cache_key = ('list', fields, limit, cursor_arg)
+    else:
+        cache_key = ('list', None)
+
+    entry = post_cache.get(cache_key)
+    if entry is None:
+        async def load():
+            async with db.connection() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    start = time.perf_counter()
+                    if paginated:
+                        sql, params = build_page_query(fields, limit, after)
+                        await cursor.execute(sql, params)
+                        rows = list(await cursor.fetchall())
+                    else:
+                        await cursor.execute("SELECT * FROM posts ORDER BY date DESC, id DESC")
+                        rows = list(await cursor.fetchall())
+                    db_query_seconds.observe(time.perf_counter() - start, 'select')
+
+            if paginated:
+                payload = paginate(rows, fields, limit)
+                rows = rows[:limit]
+            else:
+                payload = rows
+            etag = make_etag(*cache_key, *(part for row in rows for part in row_revision(row)))
+            return post_cache.put(cache_key, encode_json(payload), etag)
+
+        try:
+            entry, _ = await read_flight.do(cache_key, load)
+        except pymysql.err.MySQLError as err:
+            log.error("Error fetching posts: %s", err)
+            return json_response({"error": "Failed to fetch posts"}, 500)
+
+    return cached_json_response(request, cache_key, entry)
+
+
+async def get_post(request, post_id):
+    fmt = first_arg(request, 'format')
+    if fmt is None:
+        fmt = 'markdown'
+    if fmt not in ('markdown', 'html'):
+        return json_response({"error": "format must be 'markdown' or 'html'"}, 400)
+    cache_key = ('post', post_id, fmt)
+    entry = post_cache.get(cache_key)
+    if entry is None:
+        async def load():
+            async with db.connection() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    start = time.perf_counter()
+                    await cursor.execute("SELECT * FROM posts WHERE id = %s", (post_id,))
+                    post = await cursor.fetchone()
+                    db_query_seconds.observe(time.perf_counter() - start, 'select')
+
+            if not post:
+                return None
+            # Rendering is CPU work; keep it off the event loop
+            return await run_in_threadpool(cache_post, post, fmt)
+
+        try:
+            entry, _ = await read_flight.do(cache_key, load)
+        except pymysql.err.MySQLError as err:
+            log.error("Error fetching post %s: %s", post_id, err)
+            return json_response({"error": "Failed to fetch post"}, 500)
+
+        if entry is None:
+            return json_response({"error": "Post not found"}, 404)
+
+    view_counter.increment(post_id)
+    return cached_json_response(request, cache_key, entry, post_body(post_id, entry))
+
+
+class BlogAsgi:
+    """Routes the read-heavy GETs to async handlers and the rest to Flask"""
+
+    def __init__(self, flask_wsgi, threads=WSGI_THREADS):
+        self.fallback = WSGIMiddleware(flask_wsgi, workers=threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if NATIVE_READS and scope['type'] == 'http' and scope['method'] == 'GET':
+            path = scope['path']
+            if path == '/api/posts':
+                return await self.serve(get_posts, '/api/posts', scope, receive, send)
+            match = _POST_RE.fullmatch(path)
+            if match and path not in _FLASK_POST_ROUTES:
+                return await self.serve(get_post, '/api/posts/<post_id>', scope, receive, send, match.group(1))
+        await self.fallback(scope, receive, send)
+
+    async def serve(self, handler, route, scope, receive, send, *args):
+        start = time.perf_counter()
+        request = Request(scope, receive)
+        try:
+            response = await handler(request, *args)
+        except DatabaseUnavailable:
+            response = json_response({"error": "Database connection failed"}, 500)
+        except PoolTimeout as e:
+            log.warning("Connection pool exhausted: %s", e)
+            response = json_response({"error": "Database busy, please retry"}, 503, {'Retry-After': '1'})
+        except FlightTimeout as e:
+            log.warning("Gave up waiting for a shared fetch: %s", e)
+            response = json_response({"error": "Database busy, please retry"}, 503, {'Retry-After': '1'})
+        except Exception as e:
+            log.exception("Unhandled exception: %s", e)
+            response = json_response({"error": str(e)}, 500)
+        await response(scope, receive, send)
+        # Same series as the Flask routes (route is the Flask rule)
+        duration = time.perf_counter() - start
+        request_seconds.observe(duration, scope['method'], route, str(response.status_code))
+        if sample_access_log():
+            access_log.info("request", extra={
+                'method': scope['method'],
+                'path': scope['path'],
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'bytes': len(response.body)
+            })
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await run_in_threadpool(blog_app.init_db)
+                metrics.start()
+                if NATIVE_READS:
+                    try:
+                        await db.open()
+                    except DatabaseUnavailable:
+                        pass  # retried by the first request
+                else:
+                    log.warning("Async post reads are off (DB_BACKEND=%s, %d replicas); "
+                                "GET /api/posts is served by the Flask routes",
+                                blog_app.DB_BACKEND, len(blog_app.replica_router.replicas))
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await db.close()
+                view_counter.stop()
+                metrics.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# Flask's own wsgi_app, without the WSGI CORS layer: CORS is applied once,
+# in front of both halves
+app = AsgiCorsMiddleware(BlogAsgi(blog_app.app.wsgi_app.app), blog_app.cors_policy)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# Micro-benchmarks for hot paths of the blog API (no database needed)
+#
+# Usage: python bench_micro.py [case ...]    (default: all cases)
+
+import datetime
+import io
+import json
+import os
+import random
+import sys
+import resource
+import tempfile
+import timeit
+
+from flask import jsonify
+
+import app as blog_app
+from compression import brotli, compress
+from feed_builder import FeedSite, build_atom, build_rss, feed_updated
+from json_encoder import ResponseEncoder, json_serial, orjson
+from log_config import configure_logging
+from markdown_render import HtmlCache, render_markdown
+from metrics import MetricsRegistry
+from post_cache import PostCache
+import search_index
+from search_index import SearchIndex
+
+
+def make_posts(count=1000, paragraphs=40):
+    """Synthetic rows shaped like SELECT * FROM posts, with Korean bodies"""
+    now = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    body = '## 마크다운 사용법\n\n마크다운은 텍스트 형식의 문서를 HTML로 변환해주는 가벼운 마크업 언어입니다. Plain ASCII too.\n\n'
+    return [{
+        'id': f'post-{i}',
+        'title': f'마크다운 블로그 시작하기 {i}',
+        'content': body * paragraphs,
+        'excerpt': (body * 2)[:150] + '...',
+        'date': now - datetime.timedelta(hours=i),
+        'updated_at': now,
+        'view_count': i,
+    } for i in range(count)]
+
+
+def report(name, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {name:<34} {best * 1000:9.3f} ms")
+    return best
+
+
+def bench_json():
+    """GET /api/posts serialization of a 1,000-post list"""
+    posts = make_posts()
+    flask_app = blog_app.app
+
+    with flask_app.app_context():
+        def double_pass():
+            return jsonify(json.loads(json.dumps(posts, default=json_serial))).get_data()
+
+        stdlib = ResponseEncoder(backend='stdlib', ensure_ascii=True)
+        baseline = double_pass()
+        assert stdlib.encode(posts) == baseline, "single-pass output differs from jsonify()"
+        size = len(baseline)
+
+        print(f"json: 1,000 posts, {size / 1024:.0f} KiB response")
+        old = report("jsonify(loads(dumps())) (before)", double_pass, 5)
+        new = report("ResponseEncoder stdlib", lambda: stdlib.encode(posts), 5)
+        print(f"  -> {old / new:.1f}x faster, byte-identical")
+
+        if orjson is not None:
+            flask_app.json.ensure_ascii = False
+            try:
+                utf8_baseline = jsonify(json.loads(json.dumps(posts, default=json_serial))).get_data()
+            finally:
+                flask_app.json.ensure_ascii = True
+            fast = ResponseEncoder(backend='auto', ensure_ascii=False)
+            assert fast.encode(posts) == utf8_baseline, "orjson output differs from jsonify()"
+            report("ResponseEncoder orjson (UTF-8)", lambda: fast.encode(posts), 5)
+        else:
+            print("  (orjson not installed; skipping fast backend)")
+
+
+def bench_logging():
+    """Per-request logging cost of the after_request hooks"""
+    flask_app = blog_app.app
+    devnull = io.TextIOWrapper(open(os.devnull, 'wb', buffering=0), write_through=True)
+    headers = {
+        'Origin': 'https://orange-man.xyz',
+        'Accept': 'application/json',
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15',
+        'Authorization': 'Bearer ' + 'a' * 64,
+    }
+
+    def print_debugging(response):
+        # The old add_cors_headers(): the same headers plus unbuffered prints
+        request = blog_app.request
+        out = devnull
+        print("\n==== CORS DEBUG ====", file=out)
+        print(f"Request Method: {request.method}", file=out)
+        print(f"Request Path: {request.path}", file=out)
+        print(f"Request Headers: {dict(request.headers)}", file=out)
+        origin = request.headers.get('Origin')
+        print(f"Origin Header: {origin}", file=out)
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Vary'] = 'Origin'
+        print(f"Setting Access-Control-Allow-Origin to: {origin}", file=out)
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization, X-Requested-With'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+        response.headers['Access-Control-Max-Age'] = '3600'
+        print(f"Response Status: {response.status_code}", file=out)
+        print(f"Response Headers: {dict(response.headers)}", file=out)
+        print("==== END CORS DEBUG ====\n", file=out)
+        return response
+
+    def hooks(response):
+        # Access logging plus the CORS header block the middleware appends
+        blog_app.log_request(response)
+        blog_app.cors_policy.response_headers(blog_app.request.headers.get('Origin'))
+        return response
+
+    print("logging: after_request hooks for one GET /api/posts")
+    with flask_app.test_request_context('/api/posts', headers=headers):
+        blog_app.start_request_timer()
+        response = flask_app.response_class(b'[]', mimetype='application/json')
+
+        report("print() CORS debugging (before)", lambda: print_debugging(response), 2000)
+
+        configure_logging(level='INFO', stream=devnull)
+        for rate in (1.0, 0.01):
+            blog_app.sample_access_log.rate = rate
+            report(f"access log, sample rate {rate:g}", lambda: hooks(response), 2000)
+
+        configure_logging(level='WARNING', stream=devnull)
+        report("LOG_LEVEL=WARNING", lambda: hooks(response), 2000)
+        blog_app.sample_access_log.rate = 1.0
+
+
+def bench_cors():
+    """Latency of a CORS preflight for OPTIONS /api/posts/<id>"""
+    flask_app = blog_app.app
+    environ_base = {
+        'REQUEST_METHOD': 'OPTIONS',
+        'PATH_INFO': '/api/posts/welcome',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '5501', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'HTTP_ORIGIN': 'https://orange-man.xyz',
+        'HTTP_ACCESS_CONTROL_REQUEST_METHOD': 'PUT',
+        'HTTP_ACCESS_CONTROL_REQUEST_HEADERS': 'authorization, content-type',
+    }
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def call(wsgi_app):
+        return lambda: b''.join(wsgi_app(dict(environ_base), start_response))
+
+    configure_logging(level='WARNING', stream=io.StringIO())
+    middleware = flask_app.wsgi_app
+    print("cors: one preflight request through the WSGI stack")
+    report("Flask routing + automatic OPTIONS", call(middleware.app), 2000)
+    report("CorsMiddleware (cached headers)", call(middleware), 2000)
+
+
+# The slowest a query over the 100,000-post index may be
+SEARCH_QUERY_BUDGET = 0.030
+
+
+def bench_search():
+    """/api/search index lookups over 100,000 synthetic Korean posts"""
+    rng = random.Random(42)
+    common = ('마크다운', '블로그', '서버', '데이터베이스', '검색', '색인', '파이썬', '플라스크',
+              '배포', '성능', '캐시', '프로세스', '쿼리', '문서', '변환', '언어', '설정', '운영')
+    # A long Zipf tail of rarer words, like real prose
+    syllables = '가나다라마바사아자차카타파하고노도로모보소오조초리미비시지치키티피히'
+    rare = tuple(dict.fromkeys(''.join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(5000)))
+    words = common + rare
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+
+    def text(count):
+        return ' '.join(rng.choices(words, weights, k=count))
+
+    posts = [(f'post-{i}', text(6), text(150)) for i in range(100000)]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = SearchIndex()
+    start = timeit.default_timer()
+    for post_id, title, content in posts:
+        index.add(post_id, title, content)
+    build = timeit.default_timer() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    print(f"search: 100,000 posts of ~150 words, index built in {build:.1f}s, "
+          f"~{rss / 1024:.0f} MiB")
+    queries = ('마크다운', '서버 성능', '데이터베이스 캐시 운영', rare[100], f'{rare[40]} {rare[900]}',
+               f'{rare[10]} {rare[20]}', f'{rare[60]} {rare[70]}')
+    for query in queries:
+        index.search(query, limit=20)  # first query after a write sorts each term once
+        total, _ = index.search(query, limit=20)
+        best = report(f"{query!r} ({total:,} hits)", lambda: index.search(query, limit=20), 20)
+        assert best < SEARCH_QUERY_BUDGET, f"{query!r} took {best * 1000:.1f} ms"
+
+    # Early termination must not change the page: compare with scoring every match
+    pages = [index.search(query, limit=20, offset=20) for query in queries]
+    limit, search_index.EXHAUSTIVE_LIMIT = search_index.EXHAUSTIVE_LIMIT, len(posts)
+    try:
+        for query, page in zip(queries, pages):
+            assert index.search(query, limit=20, offset=20) == page, f"{query!r} ranked differently"
+    finally:
+        search_index.EXHAUSTIVE_LIMIT = limit
+    report("update one post", lambda: index.add('post-500', text(6), text(150)), 200)
+
+
+# Markdown the server must render like marked 9 in the browser, with what
+# marked returns for it (newlines dropped)
+MARKED_OUTPUT = {
+    '- a\n  - b\n- c': '<ul><li>a<ul><li>b</li></ul></li><li>c</li></ul>',
+    '문단\n- 항목': '<p>문단</p><ul><li>항목</li></ul>',
+    '~~취소~~': '<p><del>취소</del></p>',
+    '첫 줄\n둘째 줄': '<p>첫 줄<br>둘째 줄</p>',
+    'https://example.com 과 www.example.org': ('<p><a href="https://example.com">https://example.com</a> 과 '
+                                             '<a href="http://www.example.org">www.example.org</a></p>'),
+    'example.com': '<p>example.com</p>',
+}
+
+
+def bench_markdown():
+    """GET /api/posts/<id>?format=html rendering, uncached and cached"""
+    for text, html in MARKED_OUTPUT.items():
+        assert render_markdown(text).replace('\n', '') == html, f"{text!r} renders differently from marked"
+
+    table = '| 항목 | 설명 |\n|------|:----:|\n' + '| 캐시 | 렌더링된 HTML |\n' * 10
+    code = '```python\nfrom flask import Flask\napp = Flask(__name__)\n```\n'
+    content = ('## 마크다운 사용법\n\n마크다운은 **텍스트** 형식의 문서를 [HTML](https://example.com)로\n'
+               '변환해주는 가벼운 마크업 언어입니다.\n\n- 목록 하나\n- 목록 둘\n\n'
+               + table + '\n' + code + '\n') * 10
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = HtmlCache(cache_dir)
+        cache.warm(content)
+        disk = HtmlCache(cache_dir)
+        print(f"markdown: a {len(content):,}-character post with tables and code blocks")
+        report("render_markdown()", lambda: render_markdown(content), 50)
+        report("HtmlCache.get() from disk", lambda: (disk.clear_memory(), disk.get(content)), 200)
+        report("HtmlCache.get() from memory", lambda: cache.get(content), 2000)
+
+
+def bench_compression():
+    """Compressing GET /api/posts (100 posts with bodies) per request vs once per revision"""
+    encoder = ResponseEncoder(ensure_ascii=True)
+    body = encoder.encode(make_posts(100, paragraphs=10))
+    cache = PostCache(max_bytes=64 * 1024 * 1024)
+    entry = cache.put(('list', None), body, 'etag')
+
+    print(f"compression: {len(body):,}-byte post list")
+    encodings = ('gzip', 'br') if brotli is not None else ('gzip',)
+    for encoding in encodings:
+        size = len(compress(body, encoding))
+        static_size = len(compress(body, encoding, static=True))
+        print(f"  {encoding}: {size:,} bytes per request, {static_size:,} bytes once per revision")
+        report(f"{encoding} per request", lambda: compress(body, encoding), 20)
+        report(f"{encoding} once per revision", lambda: compress(body, encoding, static=True), 5)
+        cache.variant(('list', None), entry, encoding, compress)
+        report(f"{encoding} cached variant", lambda: cache.variant(('list', None), entry, encoding, compress), 20000)
+    if brotli is None:
+        print("  (pip install brotli to measure br)")
+
+
+def bench_metrics():
+    """Recording a request in the latency histogram, and a scrape of 8 workers"""
+    with tempfile.TemporaryDirectory() as directory:
+        registry = MetricsRegistry(directory)
+        requests = registry.histogram('bench_request_seconds', "Bench", ('method', 'route', 'status'))
+        queries = registry.histogram('bench_query_seconds', "Bench", ('operation',))
+        routes = ('/api/posts', '/api/posts/<post_id>', '/api/sitemap', '/api/search')
+        for i in range(10000):
+            requests.observe(random.random() / 10, 'GET', routes[i % 4], '200')
+            queries.observe(random.random() / 100, 'select')
+
+        print("metrics:")
+        report("observe()", lambda: requests.observe(0.004, 'GET', '/api/posts', '200'), 100000)
+        # Seven other workers' files with the same series
+        registry.flush()
+        own = os.path.join(directory, f'{os.getpid()}.json')
+        for pid in range(1, 8):
+            with open(own) as src, open(os.path.join(directory, f'{pid}.json'), 'w') as dst:
+                dst.write(src.read().replace(f'"pid":{os.getpid()}', f'"pid":{pid}', 1))
+        os.unlink(own)
+        report("exposition(), 8 workers", registry.exposition, 200)
+
+
+def bench_feed():
+    """Building the 20-post Atom and RSS feeds, and polling a cached feed"""
+    posts = make_posts(20)
+    site = FeedSite('Bench', 'https://example.com', 'Bench')
+    updated = feed_updated(posts)
+    self_url = 'https://example.com/api/feed.xml'
+    body = build_atom(site, posts, self_url, updated)
+
+    flask_app = blog_app.app
+    cache_key = ('list', 'feed', 'atom')
+    client = flask_app.test_client()
+
+    def poll(headers):
+        # Re-cached each time so the post cache TTL never sends it to the database
+        blog_app.post_cache.put(cache_key, body, 'bench', last_modified=updated)
+        return client.get('/api/feed.xml', headers=headers)
+
+    assert poll({'If-None-Match': '"bench"'}).status_code == 304
+    print(f"feed: {len(body):,}-byte Atom feed of {len(posts)} posts")
+    report("build_atom()", lambda: build_atom(site, posts, self_url, updated), 500)
+    report("build_rss()", lambda: build_rss(site, posts, self_url, updated), 500)
+    report("GET /api/feed.xml, cached", lambda: poll({}), 500)
+    report("GET /api/feed.xml, 304", lambda: poll({'If-None-Match': '"bench"'}), 500)
+    blog_app.post_cache.clear()
+
+
+CASES = {
+    'json': bench_json,
+    'logging': bench_logging,
+    'cors': bench_cors,
+    'search': bench_search,
+    'markdown': bench_markdown,
+    'compression': bench_compression,
+    'metrics': bench_metrics,
+    'feed': bench_feed,
+}
+
+
+if __name__ == '__main__':
+    selected = sys.argv[1:] or list(CASES)
+    for name in selected:
+        if name not in CASES:
+            print(f"Unknown case: {name} (choose from {', '.join(CASES)})")
+            sys.exit(1)
+        CASES[name]()
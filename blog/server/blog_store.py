@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+# Post and admin user storage: MariaDB (shared server) or SQLite (embedded file)
+
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import mysql.connector
+
+from post_listing import build_page_query, make_excerpt
+from schema_migrations import apply_migrations, schema_status
+from search_index import TITLE_WEIGHT, term_counts
+
+# Rows per UPDATE when view counts are flushed
+VIEW_BATCH_SIZE = 500
+
+# Rows fetched per round trip by scan_posts()
+SCAN_BATCH_SIZE = 500
+
+# Rows per statement, and per transaction, written by upsert_posts()
+UPSERT_BATCH_SIZE = 500
+UPSERT_COMMIT_EVERY = 10000
+
+# Columns holding DATETIME values
+DATETIME_COLUMNS = frozenset(('date', 'updated_at', 'created_at', 'last_login'))
+
+
+class BlogStore(ABC):
+    """Common interface for the ``posts`` and ``admin_users`` tables.
+
+    Rows are dicts keyed by column name. DATETIME values are naive
+    datetimes in the server's local time, to the second. Database errors
+    are raised as ``self.Error`` (the driver's base exception), so callers
+    catch ``store.Error`` whichever backend is configured.
+
+    ``fresh=True`` on a read asks for the primary when reads may otherwise
+    be served by a lagging replica.
+    """
+
+    Error = Exception
+
+    # Whether search() is available (a full-text index kept by the store)
+    full_text = False
+
+    @abstractmethod
+    def ensure_schema(self):
+        """Create or upgrade the tables; returns the schema versions applied"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def schema_status(self):
+        """``[(version, description, applied, applied_at or None)]`` for every schema step"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_post(self, post_id):
+        """The post with every column, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_posts(self, ids, columns=None, fresh=False):
+        """Posts among ``ids`` that exist, in no particular order"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_page(self, fields, limit, after=None):
+        """One keyset page newest first, ``limit + 1`` rows (see post_listing.build_page_query)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_all(self):
+        """Every post with every column, newest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def recent_posts(self, columns, limit):
+        """The newest ``limit`` posts"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def scan_posts(self, columns, since=None, newest_first=False, batch_size=SCAN_BATCH_SIZE, fresh=False):
+        """Lists of at most ``batch_size`` rows covering every post.
+
+        Ordered by id, newest first with ``newest_first``, or by
+        (updated_at, id) for posts updated at or after ``since``. The query
+        runs on the first ``next()``, and the connection is held until the
+        generator is exhausted or closed.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_post(self, post_id, title, content, date, updated_at, view_count=0):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_post(self, post_id, title, content, updated_at, view_count=None):
+        """Replace the text (and ``view_count``, if given); False if there is no such post"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_post(self, post_id):
+        """False if there is no such post"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_views(self, counts):
+        """Add ``{post_id: increment}`` to the stored view counts"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_posts(self, rows, batch_size=UPSERT_BATCH_SIZE, commit_every=UPSERT_COMMIT_EVERY):
+        """Insert or refresh posts; returns ``(inserted, updated)``.
+
+        ``rows`` is an iterable of ``(id, title, content, date, updated_at,
+        view_count)``, read as it is written, so it may be a generator over
+        a file of any size. Existing posts get the new title, content and
+        updated_at and keep their date and view_count. Rows are committed
+        every ``commit_every``; if the iterable or a write raises, the rows
+        since the last commit are rolled back.
+        """
+        raise NotImplementedError
+
+    def search(self, query, limit=20, offset=0):
+        """``(total, [(post_id, score), ...])`` for posts matching every term of ``query``.
+
+        Only stores with ``full_text`` implement it.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_admin_users(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_admin_user(self, user_id, username, password_hash, created_at):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_admin_user(self, username):
+        """``{'id', 'username', 'password_hash'}`` or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def record_login(self, user_id, when):
+        raise NotImplementedError
+
+
+# Existing posts keep their date and view_count; only the text is refreshed
+_UPSERT_POSTS_SQL = """
+    INSERT INTO posts (id, title, content, excerpt, date, updated_at, view_count)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        title = VALUES(title),
+        content = VALUES(content),
+        excerpt = VALUES(excerpt),
+        updated_at = VALUES(updated_at)
+"""
+
+
+def _scan_query(columns, since, newest_first, placeholder):
+    sql = f"SELECT {', '.join(columns)} FROM posts"
+    if since is not None:
+        return sql + f" WHERE updated_at >= {placeholder} ORDER BY updated_at, id", (since,)
+    if newest_first:
+        return sql + " ORDER BY date DESC, id DESC", ()
+    return sql + " ORDER BY id", ()
+
+
+class MariaDBStore(BlogStore):
+    """The schema of schema_migrations.py, through mysql.connector.
+
+    ``connection`` is a context manager factory yielding a pooled
+    connection (the app's ``db_connection``). Reads that may be a little
+    stale use ``read_connection`` (the app's replica-aware
+    ``read_connection``) when one is given.
+    """
+
+    Error = mysql.connector.Error
+
+    def __init__(self, connection, read_connection=None):
+        self._connection = connection
+        self._read_connection = read_connection or connection
+
+    def _reader(self, fresh):
+        return self._connection if fresh else self._read_connection
+
+    def _fetch(self, connection, sql, params=(), one=False):
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchone() if one else cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _write(self, sql, params):
+        """Run one statement and commit; returns the affected row count"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                conn.commit()
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    def ensure_schema(self):
+        with self._connection() as conn:
+            return apply_migrations(conn)
+
+    def schema_status(self):
+        with self._connection() as conn:
+            return [(version, description, applied_at is not None, applied_at)
+                    for version, description, applied_at in schema_status(conn)]
+
+    def get_post(self, post_id):
+        return self._fetch(self._read_connection, "SELECT * FROM posts WHERE id = %s", (post_id,), one=True)
+
+    def get_posts(self, ids, columns=None, fresh=False):
+        if not ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(ids))
+        selected = ', '.join(columns) if columns else '*'
+        return self._fetch(self._reader(fresh), f"SELECT {selected} FROM posts WHERE id IN ({placeholders})",
+                           list(ids))
+
+    def list_page(self, fields, limit, after=None):
+        sql, params = build_page_query(fields, limit, after)
+        return self._fetch(self._read_connection, sql, params)
+
+    def list_all(self):
+        return self._fetch(self._read_connection, "SELECT * FROM posts ORDER BY date DESC, id DESC")
+
+    def recent_posts(self, columns, limit):
+        return self._fetch(self._read_connection,
+                           f"SELECT {', '.join(columns)} FROM posts ORDER BY date DESC, id DESC LIMIT %s",
+                           (limit,))
+
+    def scan_posts(self, columns, since=None, newest_first=False, batch_size=SCAN_BATCH_SIZE, fresh=False):
+        sql, params = _scan_query(columns, since, newest_first, '%s')
+        with self._reader(fresh)() as conn:
+            # Unbuffered: rows are pulled from the server a batch at a time
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass  # rows left unread by a scan stopped early; the pool discards the connection
+
+    def insert_post(self, post_id, title, content, date, updated_at, view_count=0):
+        self._write(
+            "INSERT INTO posts (id, title, content, excerpt, date, updated_at, view_count) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (post_id, title, content, make_excerpt(content), date, updated_at, view_count)
+        )
+
+    def update_post(self, post_id, title, content, updated_at, view_count=None):
+        excerpt = make_excerpt(content)
+        if view_count is not None:
+            rowcount = self._write(
+                "UPDATE posts SET title = %s, content = %s, excerpt = %s, updated_at = %s, view_count = %s WHERE id = %s",
+                (title, content, excerpt, updated_at, view_count, post_id)
+            )
+        else:
+            rowcount = self._write(
+                "UPDATE posts SET title = %s, content = %s, excerpt = %s, updated_at = %s WHERE id = %s",
+                (title, content, excerpt, updated_at, post_id)
+            )
+        return rowcount > 0
+
+    def delete_post(self, post_id):
+        return self._write("DELETE FROM posts WHERE id = %s", (post_id,)) > 0
+
+    def add_views(self, counts):
+        # One UPDATE ... CASE per batch rather than one statement per post
+        items = list(counts.items())
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for start in range(0, len(items), VIEW_BATCH_SIZE):
+                    batch = items[start:start + VIEW_BATCH_SIZE]
+                    cases = ' '.join(['WHEN %s THEN %s'] * len(batch))
+                    placeholders = ', '.join(['%s'] * len(batch))
+                    params = [value for item in batch for value in item]
+                    params += [post_id for post_id, _ in batch]
+                    cursor.execute(
+                        f"UPDATE posts SET view_count = view_count + CASE id {cases} ELSE 0 END "
+                        f"WHERE id IN ({placeholders})",
+                        params
+                    )
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def upsert_posts(self, rows, batch_size=UPSERT_BATCH_SIZE, commit_every=UPSERT_COMMIT_EVERY):
+        inserted = updated = uncommitted = 0
+        rows = iter(rows)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                while True:
+                    batch = [(post_id, title, content, make_excerpt(content), date, updated_at, view_count)
+                             for post_id, title, content, date, updated_at, view_count
+                             in itertools.islice(rows, batch_size)]
+                    if not batch:
+                        break
+                    # executemany() sends the batch as one multi-row INSERT
+                    cursor.executemany(_UPSERT_POSTS_SQL, batch)
+                    # Affected rows: 1 per inserted post, 2 per updated one
+                    changed = max(cursor.rowcount - len(batch), 0)
+                    updated += changed
+                    inserted += len(batch) - changed
+                    uncommitted += len(batch)
+                    if uncommitted >= commit_every:
+                        conn.commit()
+                        uncommitted = 0
+                conn.commit()
+            except BaseException:
+                try:
+                    conn.rollback()
+                except mysql.connector.Error:
+                    pass  # the connection is gone, and its uncommitted rows with it
+                raise
+            finally:
+                cursor.close()
+        return inserted, updated
+
+    def count_admin_users(self):
+        return self._fetch(self._connection, "SELECT COUNT(*) AS users FROM admin_users", one=True)['users']
+
+    def create_admin_user(self, user_id, username, password_hash, created_at):
+        self._write(
+            "INSERT INTO admin_users (id, username, password_hash, created_at) VALUES (%s, %s, %s, %s)",
+            (user_id, username, password_hash, created_at)
+        )
+
+    def get_admin_user(self, username):
+        return self._fetch(self._connection,
+                           "SELECT id, username, password_hash FROM admin_users WHERE username = %s",
+                           (username,), one=True)
+
+    def record_login(self, user_id, when):
+        self._write("UPDATE admin_users SET last_login = %s WHERE id = %s", (when, user_id))
+
+
+# SQLite schema steps, recorded in PRAGMA user_version. posts_fts holds the
+# search_index.term_counts() terms of each post (Hangul as two-syllable
+# pieces), so FTS5 matches what /api/search matches in memory.
+SQLITE_MIGRATIONS = [
+    (1, "Create posts, admin_users and the posts_fts search table", (
+        '''CREATE TABLE posts (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            excerpt TEXT NOT NULL DEFAULT '',
+            date DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL,
+            view_count INTEGER NOT NULL DEFAULT 0
+        )''',
+        "CREATE INDEX idx_posts_date_id_updated ON posts (date, id, updated_at)",
+        "CREATE INDEX idx_posts_updated ON posts (updated_at)",
+        '''CREATE TABLE admin_users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            last_login DATETIME NULL,
+            created_at DATETIME NOT NULL
+        )''',
+        "CREATE VIRTUAL TABLE posts_fts USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 0')",
+    )),
+]
+
+# Compiled statements kept per connection; every statement below has fixed
+# text, so each is prepared once per connection and then reused
+STATEMENT_CACHE_SIZE = 256
+
+_SEARCH_MATCH_SQL = "SELECT COUNT(*) AS total FROM posts_fts WHERE posts_fts MATCH ?"
+_SEARCH_PAGE_SQL = (
+    f"SELECT posts.id, bm25(posts_fts, {TITLE_WEIGHT}.0, 1.0) AS rank FROM posts_fts "
+    "JOIN posts ON posts.rowid = posts_fts.rowid WHERE posts_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?"
+)
+
+
+def _sqlite_value(value):
+    # Stored the way mysql.connector writes DATETIME: whole seconds, and the
+    # wall-clock time of an aware value with its offset dropped
+    if isinstance(value, datetime.datetime):
+        return value.replace(microsecond=0, tzinfo=None).isoformat(' ')
+    return value
+
+
+def _dict_row(cursor, row):
+    post = {}
+    for column, value in zip(cursor.description, row):
+        name = column[0]
+        if value is not None and name in DATETIME_COLUMNS:
+            value = datetime.datetime.fromisoformat(value)
+        post[name] = value
+    return post
+
+
+def _fts_text(text):
+    return ' '.join(term_counts(text).elements())
+
+
+class SQLiteStore(BlogStore):
+    """The same tables in one SQLite file, for tests, benchmarks and small sites.
+
+    Each thread keeps its own connection. The database runs in WAL mode:
+    readers never wait for the writer, and writers (``BEGIN IMMEDIATE``)
+    queue for up to ``busy_timeout`` seconds. Statement text is fixed per
+    operation, with id lists passed as one JSON parameter, so sqlite3's
+    statement cache prepares each statement once per connection. ``search()``
+    uses the FTS5 table ``posts_fts``, kept in step by every post write.
+    """
+
+    Error = sqlite3.Error
+    full_text = True
+
+    def __init__(self, path, busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        local = self._local
+        # A connection is never used across fork(): each process opens its own
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            conn.row_factory = _dict_row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Durable at each checkpoint rather than each commit, as WAL intends
+            conn.execute('PRAGMA synchronous=NORMAL')
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _fetch(self, sql, params=(), one=False):
+        cursor = self._conn().execute(sql, tuple(map(_sqlite_value, params)))
+        try:
+            return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def ensure_schema(self):
+        if self._fetch("PRAGMA user_version", one=True)['user_version'] >= SQLITE_MIGRATIONS[-1][0]:
+            return []
+        done = []
+        with self._transaction() as conn:
+            # Read again under the write lock, in case another process got here first
+            current = conn.execute("PRAGMA user_version").fetchone()['user_version']
+            for version, _, statements in SQLITE_MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                done.append(version)
+        return done
+
+    def schema_status(self):
+        # PRAGMA user_version records how far the schema is, not when
+        current = self._fetch("PRAGMA user_version", one=True)['user_version']
+        return [(version, description, version <= current, None)
+                for version, description, _ in SQLITE_MIGRATIONS]
+
+    def get_post(self, post_id):
+        return self._fetch("SELECT * FROM posts WHERE id = ?", (post_id,), one=True)
+
+    def get_posts(self, ids, columns=None, fresh=False):
+        if not ids:
+            return []
+        selected = ', '.join(columns) if columns else '*'
+        return self._fetch(f"SELECT {selected} FROM posts WHERE id IN (SELECT value FROM json_each(?))",
+                           (json.dumps(list(ids)),))
+
+    def list_page(self, fields, limit, after=None):
+        sql, params = build_page_query(fields, limit, after, placeholder='?')
+        return self._fetch(sql, params)
+
+    def list_all(self):
+        return self._fetch("SELECT * FROM posts ORDER BY date DESC, id DESC")
+
+    def recent_posts(self, columns, limit):
+        return self._fetch(f"SELECT {', '.join(columns)} FROM posts ORDER BY date DESC, id DESC LIMIT ?", (limit,))
+
+    def scan_posts(self, columns, since=None, newest_first=False, batch_size=SCAN_BATCH_SIZE, fresh=False):
+        sql, params = _scan_query(columns, since, newest_first, '?')
+        cursor = self._conn().execute(sql, tuple(map(_sqlite_value, params)))
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def insert_post(self, post_id, title, content, date, updated_at, view_count=0):
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO posts (id, title, content, excerpt, date, updated_at, view_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (post_id, title, content, make_excerpt(content), _sqlite_value(date), _sqlite_value(updated_at),
+                 view_count)
+            )
+            conn.execute("INSERT INTO posts_fts (rowid, title, body) VALUES (?, ?, ?)",
+                         (cursor.lastrowid, _fts_text(title), _fts_text(content)))
+
+    def update_post(self, post_id, title, content, updated_at, view_count=None):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT rowid FROM posts WHERE id = ?", (post_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "UPDATE posts SET title = ?, content = ?, excerpt = ?, updated_at = ?, "
+                "view_count = COALESCE(?, view_count) WHERE rowid = ?",
+                (title, content, make_excerpt(content), _sqlite_value(updated_at), view_count, row['rowid'])
+            )
+            conn.execute("UPDATE posts_fts SET title = ?, body = ? WHERE rowid = ?",
+                         (_fts_text(title), _fts_text(content), row['rowid']))
+        return True
+
+    def delete_post(self, post_id):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT rowid FROM posts WHERE id = ?", (post_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM posts WHERE rowid = ?", (row['rowid'],))
+            conn.execute("DELETE FROM posts_fts WHERE rowid = ?", (row['rowid'],))
+        return True
+
+    def add_views(self, counts):
+        # One prepared UPDATE, executed per post inside a single transaction
+        with self._transaction() as conn:
+            conn.executemany("UPDATE posts SET view_count = view_count + ? WHERE id = ?",
+                             ((increment, post_id) for post_id, increment in counts.items()))
+
+    def upsert_posts(self, rows, batch_size=UPSERT_BATCH_SIZE, commit_every=UPSERT_COMMIT_EVERY):
+        # Prepared statements run per row, so batch_size does not apply;
+        # what costs is the commit, made every commit_every rows
+        inserted = updated = uncommitted = 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for post_id, title, content, date, updated_at, view_count in rows:
+                row = conn.execute("SELECT rowid FROM posts WHERE id = ?", (post_id,)).fetchone()
+                if row is None:
+                    cursor = conn.execute(
+                        "INSERT INTO posts (id, title, content, excerpt, date, updated_at, view_count) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (post_id, title, content, make_excerpt(content), _sqlite_value(date),
+                         _sqlite_value(updated_at), view_count)
+                    )
+                    conn.execute("INSERT INTO posts_fts (rowid, title, body) VALUES (?, ?, ?)",
+                                 (cursor.lastrowid, _fts_text(title), _fts_text(content)))
+                    inserted += 1
+                else:
+                    conn.execute("UPDATE posts SET title = ?, content = ?, excerpt = ?, updated_at = ? WHERE rowid = ?",
+                                 (title, content, make_excerpt(content), _sqlite_value(updated_at), row['rowid']))
+                    conn.execute("UPDATE posts_fts SET title = ?, body = ? WHERE rowid = ?",
+                                 (_fts_text(title), _fts_text(content), row['rowid']))
+                    updated += 1
+                uncommitted += 1
+                if uncommitted >= commit_every:
+                    conn.execute('COMMIT')
+                    conn.execute('BEGIN IMMEDIATE')
+                    uncommitted = 0
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return inserted, updated
+
+    def search(self, query, limit=20, offset=0):
+        terms = list(term_counts(query))
+        if not terms:
+            return 0, []
+        # Quoted, so no term is read as FTS5 syntax; terms are implicitly ANDed
+        match = ' '.join(f'"{term}"' for term in terms)
+        total = self._fetch(_SEARCH_MATCH_SQL, (match,), one=True)['total']
+        if not total:
+            return 0, []
+        rows = self._fetch(_SEARCH_PAGE_SQL, (match, limit, offset))
+        # bm25() is lower for better matches
+        return total, [(row['id'], -row['rank']) for row in rows]
+
+    def count_admin_users(self):
+        return self._fetch("SELECT COUNT(*) AS users FROM admin_users", one=True)['users']
+
+    def create_admin_user(self, user_id, username, password_hash, created_at):
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO admin_users (id, username, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                         (user_id, username, password_hash, _sqlite_value(created_at)))
+
+    def get_admin_user(self, username):
+        return self._fetch("SELECT id, username, password_hash FROM admin_users WHERE username = ?",
+                           (username,), one=True)
+
+    def record_login(self, user_id, when):
+        with self._transaction() as conn:
+            conn.execute("UPDATE admin_users SET last_login = ? WHERE id = ?", (_sqlite_value(when), user_id))
+
+
+def create_store(backend, connection=None, read_connection=None, sqlite_path=None):
+    """Store for DB_BACKEND: ``'mariadb'`` (pooled connections) or ``'sqlite'`` (a file)"""
+    if backend == 'mariadb':
+        return MariaDBStore(connection, read_connection=read_connection)
+    if backend == 'sqlite':
+        return SQLiteStore(sqlite_path)
+    raise ValueError(f"Unknown DB_BACKEND: {backend!r} (expected 'mariadb' or 'sqlite')")
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# Static, pre-rendered copy of the blog built from the posts table
+#
+# The output directory can be served by nginx or Synology Web Station on
+# its own, so the blog stays readable while the API or the database is
+# down. It holds one HTML page per post (posts/<id>.html), the paginated
+# list (index.html, page/2.html, ...), the same list as JSON shards
+# (api/posts-1.json, ...), sitemap.xml and the stylesheets. Builds are
+# incremental: build-manifest.json records the updated_at each post page
+# was rendered from, and only posts whose updated_at differs are rendered
+# again. List pages and shards are regenerated every time but only
+# rewritten when their bytes change.
+
+import datetime
+import hashlib
+import html
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; builds are then only serialized per process
+    fcntl = None
+
+from json_encoder import ResponseEncoder
+from markdown_render import RENDERER_VERSION, HtmlCache, render_markdown
+from sitemap_builder import SitemapCache
+
+log = logging.getLogger('blog.static')
+
+# Bump whenever the page templates below change, so every post is rendered again
+TEMPLATE_VERSION = 't1'
+
+MANIFEST = 'build-manifest.json'
+BUILD_LOCK = 'static.lock'
+
+DEFAULT_PAGE_SIZE = 20
+
+# Posts whose bodies are read with one query while rendering
+CONTENT_BATCH_SIZE = 200
+
+LIST_COLUMNS = ('id', 'title', 'date', 'updated_at', 'excerpt')
+
+# Columns in the JSON list shards. view_count is left out: a static copy
+# cannot count views, and it would rewrite every shard on each build.
+SHARD_FIELDS = ('id', 'title', 'date', 'updated_at', 'excerpt')
+
+BLOG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT_DIR = os.path.join(BLOG_DIR, 'server', 'static_site')
+SITE_TITLE = '신규리의 블로그'
+
+
+def post_file_name(post_id):
+    """File name of a post's page: the id, percent-encoded where a path needs it"""
+    name = quote(post_id, safe='-_~')
+    # quote() keeps dots; never let an id become '.' or '..' or a hidden file
+    if name.startswith('.'):
+        name = '%2E' + name[1:]
+    return f'{name}.html'
+
+
+def _href(name):
+    # Servers decode the URL before looking up the file, so an escaped name
+    # has to be escaped once more in links
+    return quote(name, safe='-_~.')
+
+
+def _korean_date(value):
+    # toLocaleDateString('ko-KR', {year: 'numeric', month: 'long', day: 'numeric'})
+    return f'{value.year}년 {value.month}월 {value.day}일'
+
+
+def _page_path(number):
+    return 'index.html' if number == 1 else f'page/{number}.html'
+
+
+def _layout(title, root, body):
+    """A complete page; ``root`` is the relative path back to the output directory"""
+    return f'''<!DOCTYPE html>
+<html lang="ko">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{html.escape(title)}</title>
+    <link rel="stylesheet" href="{root}css/blog.css">
+    <link rel="stylesheet" href="{root}css/index.css">
+</head>
+<body>
+    <header>
+        <h1>{SITE_TITLE}</h1>
+    </header>
+
+    <nav>
+        <a href="/resume.html">이력서</a>
+        <a href="{root}index.html" class="active">블로그</a>
+    </nav>
+
+    <div class="container" id="main-content">
+{body}
+    </div>
+
+    <footer>
+        <p>&copy; 2025 신규리</p>
+    </footer>
+</body>
+</html>
+'''
+
+
+def render_post_page(post, content_html):
+    body = f'''        <div style="max-width: 850px; margin: 0 auto;">
+            <a href="../index.html" class="back-button">← 목록으로</a>
+        </div>
+        <article class="blog-post">
+            <header class="post-header">
+                <h1 class="post-title">{html.escape(post['title'])}</h1>
+                <div class="post-meta">
+                    <span class="post-date">{_korean_date(post['date'])}</span>
+                </div>
+            </header>
+            <div class="post-content">
+{content_html}
+            </div>
+        </article>'''
+    return _layout(f"{post['title']} - {SITE_TITLE}", '../', body)
+
+
+def render_list_page(posts, number, has_next):
+    root = '' if number == 1 else '../'
+    cards = []
+    for post in posts:
+        cards.append(f'''            <div class="blog-card">
+                <div class="blog-card-content">
+                    <h2 class="blog-title">{html.escape(post['title'])}</h2>
+                    <div class="blog-card-meta">
+                        <span class="blog-date">{_korean_date(post['date'])}</span>
+                    </div>
+                    <div class="blog-excerpt">{html.escape(post['excerpt'])}</div>
+                    <a href="{root}posts/{_href(post_file_name(post['id']))}" class="read-more">더 읽기</a>
+                </div>
+            </div>''')
+    if not cards:
+        cards.append('            <p>아직 작성된 글이 없습니다.</p>')
+
+    links = []
+    if number > 1:
+        links.append(f'<a href="{root}{_page_path(number - 1)}" class="load-more">← 이전</a>')
+    if has_next:
+        links.append(f'<a href="{root}{_page_path(number + 1)}" class="load-more">다음 →</a>')
+    pager = f"\n        <div class=\"pager\">{' '.join(links)}</div>" if links else ''
+
+    body = '        <div class="blog-list">\n' + '\n'.join(cards) + '\n        </div>' + pager
+    title = SITE_TITLE if number == 1 else f'{SITE_TITLE} ({number})'
+    return _layout(title, root, body)
+
+
+class StaticSitemap(SitemapCache):
+    """Sitemap whose URLs point at the static pages instead of the app"""
+
+    def _open_urlset(self, number, with_pages):
+        shard = super()._open_urlset(number, with_pages=False)
+        if with_pages:
+            self._write_url(shard, f'{self.base_url}/index.html', None, 'weekly', '0.9')
+        return shard
+
+    def _write_post(self, shard, post):
+        post_url = f"{self.base_url}/posts/{_href(post_file_name(post['id']))}"
+        lastmod = (post.get('updated_at') or post['date']).strftime('%Y-%m-%d')
+        self._write_url(shard, post_url, lastmod, 'monthly', '0.8')
+
+
+class StaticSiteBuilder:
+    """Writes the static site for one output directory.
+
+    ``render(markdown)`` turns a post body into HTML; the app passes its
+    HtmlCache so bodies it has already rendered are not rendered again.
+    """
+
+    def __init__(self, output_dir, base_url, page_size=DEFAULT_PAGE_SIZE, render=render_markdown):
+        self.output_dir = output_dir
+        self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.render = render
+        self.encoder = ResponseEncoder(ensure_ascii=False)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def build(self, store, full=False):
+        """Bring the output directory up to date with the posts in ``store``
+        (a blog_store.BlogStore), read from the primary.
+
+        ``full`` renders every post again. Returns counts of what was done.
+        """
+        with self._lock, self._process_lock():
+            started = time.monotonic()
+            manifest = self._read_manifest()
+            version = f'{RENDERER_VERSION}/{TEMPLATE_VERSION}'
+            previous = manifest.get('posts', {})
+            # A new renderer or template makes every page out of date
+            current = {} if full or manifest.get('version') != version else previous
+
+            counts = {}
+            seen, changed, files = self._write_lists(store, current, counts)
+            fetched = self._write_posts(store, changed, seen)
+            removed = self._remove_posts(set(previous) - set(seen))
+            self._remove_stale(manifest.get('files', {}), files)
+            self._copy_styles(files)
+
+            if (fetched or removed or manifest.get('base_url') != self.base_url
+                    or not os.path.exists(self._path('sitemap.xml'))):
+                self._write_sitemap(store)
+
+            self._write_manifest({
+                'version': version,
+                'base_url': self.base_url,
+                'built_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'posts': seen,
+                'files': files,
+            })
+            stats = {
+                'posts': len(seen),
+                'rendered': fetched,
+                'removed': removed,
+                'pages_written': counts.get('written', 0),
+                'seconds': round(time.monotonic() - started, 3),
+            }
+            log.info("Static site built", extra=stats)
+            return stats
+
+    def _write_lists(self, store, previous, counts):
+        """Stream the list once: write the pages and shards and find changed posts.
+
+        Returns ``({id: updated_at}, [changed ids], {file: digest})``.
+        """
+        seen = {}
+        changed = []
+        files = {}
+        rows = itertools.chain.from_iterable(
+            store.scan_posts(LIST_COLUMNS, newest_first=True, batch_size=self.page_size, fresh=True))
+        pages = iter(lambda: list(itertools.islice(rows, self.page_size)), [])
+        # One batch is one page; the next one is read first to know whether to link to it
+        batch = next(pages, [])
+        number = 1
+        while True:
+            following = next(pages, []) if batch else []
+            for post in batch:
+                stamp = post['updated_at'].isoformat()
+                seen[post['id']] = stamp
+                if previous.get(post['id']) != stamp:
+                    changed.append(post['id'])
+            self._write_if_changed(_page_path(number), render_list_page(batch, number, bool(following)).encode(),
+                                   files, counts)
+            shard = {
+                'posts': [{field: post[field] for field in SHARD_FIELDS} for post in batch],
+                'next': f'posts-{number + 1}.json' if following else None,
+            }
+            self._write_if_changed(f'api/posts-{number}.json', self.encoder.encode(shard), files, counts)
+            if not following:
+                break
+            batch = following
+            number += 1
+        return seen, changed, files
+
+    def _write_posts(self, store, changed, seen):
+        """Render the pages of ``changed`` posts; returns how many were written"""
+        written = 0
+        for start in range(0, len(changed), CONTENT_BATCH_SIZE):
+            ids = changed[start:start + CONTENT_BATCH_SIZE]
+            rows = store.get_posts(ids, ('id', 'title', 'content', 'date', 'updated_at'), fresh=True)
+            for post in rows:
+                page = render_post_page(post, self.render(post['content']))
+                self._write(f"posts/{post_file_name(post['id'])}", page.encode())
+                # Edited since the list was read: the page shows the newer revision
+                seen[post['id']] = post['updated_at'].isoformat()
+                written += 1
+            # Deleted since the list was read: check again next build
+            for post_id in set(ids) - {post['id'] for post in rows}:
+                seen.pop(post_id, None)
+        return written
+
+    def _remove_posts(self, post_ids):
+        for post_id in post_ids:
+            try:
+                os.remove(self._path(f'posts/{post_file_name(post_id)}'))
+            except FileNotFoundError:
+                pass
+        return len(post_ids)
+
+    def _remove_stale(self, previous, current):
+        # List pages and shards past the new last page
+        for name in set(previous) - set(current):
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def _copy_styles(self, files):
+        """css/blog.css, and the <style> block of index.html as css/index.css"""
+        with open(os.path.join(BLOG_DIR, 'css', 'blog.css'), 'rb') as f:
+            self._write_if_changed('css/blog.css', f.read(), files)
+        with open(os.path.join(BLOG_DIR, 'index.html'), encoding='utf-8') as f:
+            match = re.search(r'<style>(.*?)</style>', f.read(), re.S)
+        if match:
+            self._write_if_changed('css/index.css', match.group(1).encode(), files)
+
+    def _write_sitemap(self, store):
+        rows = itertools.chain.from_iterable(
+            store.scan_posts(('id', 'date', 'updated_at'), newest_first=True, fresh=True))
+        StaticSitemap(self.output_dir, self.base_url).build(rows, index_url=self.base_url)
+
+    def _write_if_changed(self, name, data, files, counts=None):
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        files[name] = digest
+        try:
+            with open(self._path(name), 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest()[:32] == digest:
+                    return
+        except FileNotFoundError:
+            pass
+        self._write(name, data)
+        if counts is not None:
+            counts['written'] = counts.get('written', 0) + 1
+
+    def _write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write and rename so the web server never sends a partial file
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        self._write(MANIFEST, json.dumps(manifest, separators=(',', ':')).encode())
+
+    @contextmanager
+    def _process_lock(self):
+        # The CLI and every worker may build into the same directory
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(BUILD_LOCK), 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _path(self, name):
+        return os.path.join(self.output_dir, name)
+
+
+class BuildScheduler:
+    """Runs ``build()`` in a background thread shortly after post writes.
+
+    ``request()`` returns at once. Writes within ``delay`` seconds of each
+    other share one build, and a write during a build causes one more.
+    """
+
+    def __init__(self, build, delay=2.0):
+        self._build = build
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._pending = False
+        self._thread = None
+
+    def request(self):
+        with self._lock:
+            self._pending = True
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='static-build', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.delay)
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                self._pending = False
+            try:
+                self._build()
+            except Exception as e:
+                # The site keeps its previous content; the next write tries again
+                log.error("Static site build failed: %s", e)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from migrate import open_store
+
+    parser = argparse.ArgumentParser(description="Write a static copy of the blog from the posts table")
+    parser.add_argument('--output', default=os.getenv('STATIC_OUTPUT_DIR', DEFAULT_OUTPUT_DIR),
+                        help="directory to write the site to (default STATIC_OUTPUT_DIR or ./static_site)")
+    parser.add_argument('--base-url', default=os.getenv('STATIC_BASE_URL', 'https://orange-man.xyz/static'),
+                        help="public URL of the output directory, used in sitemap.xml")
+    parser.add_argument('--page-size', type=int, default=int(os.getenv('STATIC_PAGE_SIZE', str(DEFAULT_PAGE_SIZE))),
+                        help=f"posts per list page and JSON shard (default {DEFAULT_PAGE_SIZE})")
+    parser.add_argument('--full', action='store_true', help="render every post again, not only changed ones")
+    parser.add_argument('--clean', action='store_true', help="empty the output directory first")
+    args = parser.parse_args()
+    if args.page_size < 1:
+        parser.error("--page-size must be positive")
+
+    if args.clean and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+
+    # The server's rendered-HTML cache: bodies it has rendered are not rendered again
+    cache_dir = os.getenv('CACHE_DIR', os.path.join(BLOG_DIR, 'server', 'cache'))
+    html_cache = HtmlCache(os.getenv('HTML_CACHE_DIR', os.path.join(cache_dir, 'html')))
+    builder = StaticSiteBuilder(args.output, args.base_url, page_size=args.page_size,
+                                render=lambda text: html_cache.get(text)[1])
+    with open_store() as store:
+        try:
+            stats = builder.build(store, full=args.full)
+        except store.Error as err:
+            print(f"Database error: {err}")
+            sys.exit(1)
+
+    print(f"Built {args.output}: {stats['posts']} posts, {stats['rendered']} rendered, "
+          f"{stats['removed']} removed, {stats['pages_written']} list files written in {stats['seconds']}s")
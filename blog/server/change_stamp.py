@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# File-based change notification shared by worker processes
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: bumps are not serialized between processes
+    fcntl = None
+
+
+class ChangeStamp:
+    """A file that is replaced whenever posts change.
+
+    Each process keeps the ``version()`` it last acted on and compares it
+    with the current one; any difference means some process (maybe this
+    one) wrote since. A version is the file's (inode, mtime) pair, and
+    ``os.replace()`` gives every bump a new inode, so two bumps within one
+    mtime tick still differ. Checking costs one ``stat()``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def bump(self):
+        """Signal a change; returns ``(previous, new)``, the version this call
+        replaced and the one it wrote.
+
+        Bumps from all processes are serialized, so ``previous`` is exactly
+        the version before this write: a caller that had seen ``previous``
+        has missed no other process's change.
+        """
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{self.path}.lock", 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            previous = self.version()
+            with open(tmp, 'w') as f:
+                st = os.fstat(f.fileno())
+            os.replace(tmp, self.path)
+        # Closing the file released the lock. Our own version, even if
+        # another process has bumped again since.
+        return previous, (st.st_ino, st.st_mtime_ns)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Negotiated gzip/brotli response compression
+
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as they are; the headers and CPU cost
+# more than the few bytes saved
+DEFAULT_MIN_SIZE = 1024
+
+COMPRESSIBLE_TYPES = frozenset((
+    'application/json', 'application/xml', 'application/atom+xml', 'application/rss+xml',
+    'application/x-ndjson', 'text/html', 'text/plain', 'text/xml', 'text/css',
+    'application/javascript',
+))
+
+# Per-request compression favours speed; bodies compressed once per cached
+# revision get the smallest output instead
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+
+def compress(body, encoding, static=False):
+    """``body`` encoded with ``'gzip'`` or ``'br'``"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+class Compressor:
+    """Picks a content encoding for a request and compresses responses.
+
+    ``br`` is offered when the brotli package is installed, ``gzip`` always.
+    The client's ``Accept-Encoding`` q-values decide; on a tie brotli wins
+    because it is smaller. ``enabled=False`` turns every response into
+    identity, e.g. when a reverse proxy already compresses.
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, enabled=True):
+        self.min_size = min_size
+        self.enabled = enabled
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def choose(self, accept_encodings, size):
+        """Encoding for a body of ``size`` bytes, or None to send it uncompressed"""
+        if not self.enabled or size < self.min_size:
+            return None
+        return accept_encodings.best_match(self.encodings)
+
+    def variant(self, variants, body, encoding):
+        """``body`` in ``encoding``, compressed once and kept in ``variants``"""
+        data = variants.get(encoding)
+        if data is None:
+            data = variants[encoding] = compress(body, encoding, static=True)
+        return data
+
+    def apply(self, request, response):
+        """Compress an outgoing response in place when it is worth it.
+
+        Streamed and file responses, error statuses, bodies that are already
+        encoded and non-text types are left alone. Responses that could
+        have been compressed always get ``Vary: Accept-Encoding`` so shared
+        caches keep the encodings apart.
+        """
+        if (not self.enabled or response.status_code != 200
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = self.choose(request.accept_encodings, len(body))
+        if encoding is None:
+            return response
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # Each encoding is a different representation with its own validator
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# CORS handling as WSGI middleware with precomputed header blocks
+
+import logging
+
+log = logging.getLogger('blog.cors')
+
+DEFAULT_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'OPTIONS')
+DEFAULT_HEADERS = ('Content-Type', 'Accept', 'Authorization', 'X-Requested-With')
+
+
+class CorsPolicy:
+    """Origin allow-list with response header blocks built once per origin.
+
+    ``allowed_origins`` is a set of exact origins; the entry ``'*'`` allows
+    every origin (the origin is echoed back, since credentials are allowed).
+    Header lists are cached per origin so a request costs one dict lookup.
+    """
+
+    def __init__(self, allowed_origins, methods=DEFAULT_METHODS, headers=DEFAULT_HEADERS,
+                 max_age=3600, allow_credentials=True, cache_size=1024):
+        origins = set(allowed_origins)
+        self.allow_any = '*' in origins
+        self.allowed_origins = frozenset(origins - {'*'})
+        self.cache_size = cache_size
+
+        shared = []
+        if allow_credentials:
+            shared.append(('Access-Control-Allow-Credentials', 'true'))
+        self._shared = shared
+        self._preflight_extra = [
+            ('Access-Control-Allow-Methods', ', '.join(methods)),
+            ('Access-Control-Allow-Headers', ', '.join(headers)),
+            ('Access-Control-Max-Age', str(max_age)),
+        ]
+
+        # Responses that differ by Origin must say so even when none was sent,
+        # otherwise a shared cache can hand a header-less copy to a browser
+        self._vary = [('Vary', 'Origin')]
+        self._preflight_denied = self._vary + [('Content-Length', '0')]
+        self._response_cache = {}
+        self._preflight_cache = {}
+
+        # Pre-build the blocks for every explicitly allowed origin
+        for origin in self.allowed_origins:
+            self.response_headers(origin)
+            self.preflight_headers(origin)
+
+    def is_allowed(self, origin):
+        return origin in self.allowed_origins or (self.allow_any and bool(origin))
+
+    def response_headers(self, origin):
+        """Headers to append to an actual (non-preflight) response"""
+        headers = self._response_cache.get(origin)
+        if headers is None:
+            if not origin or not self.is_allowed(origin):
+                return self._vary
+            headers = [('Access-Control-Allow-Origin', origin)] + self._vary + self._shared
+            self._remember(self._response_cache, origin, headers)
+        return headers
+
+    def preflight_headers(self, origin):
+        """Complete header list for a 204 preflight answer"""
+        headers = self._preflight_cache.get(origin)
+        if headers is None:
+            if not origin or not self.is_allowed(origin):
+                return self._preflight_denied
+            headers = (self.response_headers(origin) + self._preflight_extra
+                       + [('Content-Length', '0')])
+            self._remember(self._preflight_cache, origin, headers)
+        return headers
+
+    def _remember(self, cache, origin, headers):
+        # With '*' any string can arrive as an Origin; do not let it grow unbounded
+        if len(cache) < self.cache_size or origin in self.allowed_origins:
+            cache[origin] = headers
+
+
+class CorsMiddleware:
+    """Answers CORS preflights before Flask routing and adds CORS headers to every other response"""
+
+    def __init__(self, app, policy):
+        self.app = app
+        self.policy = policy
+
+    def __call__(self, environ, start_response):
+        origin = environ.get('HTTP_ORIGIN')
+
+        if environ['REQUEST_METHOD'] == 'OPTIONS' and 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' in environ:
+            headers = self.policy.preflight_headers(origin)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("CORS preflight", extra={
+                    'path': environ.get('PATH_INFO'), 'origin': origin,
+                    'request_method': environ.get('HTTP_ACCESS_CONTROL_REQUEST_METHOD'),
+                    'request_headers': environ.get('HTTP_ACCESS_CONTROL_REQUEST_HEADERS'),
+                    'response_headers': dict(headers)
+                })
+            start_response('204 No Content', list(headers))
+            return []
+
+        cors_headers = self.policy.response_headers(origin)
+
+        def start_cors_response(status, headers, exc_info=None):
+            headers.extend(cors_headers)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("CORS headers set", extra={
+                    'method': environ['REQUEST_METHOD'], 'path': environ.get('PATH_INFO'),
+                    'origin': origin, 'status': status, 'response_headers': dict(headers)
+                })
+            return start_response(status, headers, exc_info)
+
+        return self.app(environ, start_cors_response)
+
+
+class AsgiCorsMiddleware:
+    """The same CORS handling as ``CorsMiddleware``, for the ASGI application"""
+
+    def __init__(self, app, policy):
+        self.app = app
+        self.policy = policy
+        self._encoded = {}
+
+    def _headers(self, origin, preflight):
+        """The policy's header block for ``origin`` as ASGI byte pairs, encoded once"""
+        key = (origin, preflight)
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            headers = (self.policy.preflight_headers(origin) if preflight
+                       else self.policy.response_headers(origin))
+            encoded = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in headers]
+            if len(self._encoded) < 2 * self.policy.cache_size or origin in self.policy.allowed_origins:
+                self._encoded[key] = encoded
+        return encoded
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        origin = None
+        preflight = False
+        for name, value in scope['headers']:
+            if name == b'origin':
+                origin = value.decode('latin-1')
+            elif name == b'access-control-request-method':
+                preflight = True
+
+        if scope['method'] == 'OPTIONS' and preflight:
+            headers = self._headers(origin, preflight=True)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("CORS preflight", extra={
+                    'path': scope['path'], 'origin': origin,
+                    'response_headers': {name.decode(): value.decode() for name, value in headers}
+                })
+            await send({'type': 'http.response.start', 'status': 204, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        cors_headers = self._headers(origin, preflight=False)
+
+        async def send_with_cors(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', ())) + cors_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
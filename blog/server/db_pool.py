@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Thread-safe connection pool for the blog backend
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the wait timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections with overflow, recycling and pre-ping.
+
+    ``size`` connections are kept idle between requests. Up to ``max_overflow``
+    extra connections may be opened under load; they are closed on return
+    instead of being kept. Once ``size + max_overflow`` connections are checked
+    out, callers wait up to ``timeout`` seconds and then get ``PoolTimeout``.
+    """
+
+    def __init__(self, connect, size=5, max_overflow=10, recycle=3600,
+                 timeout=10.0, pre_ping=True):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        # Idle connections are used LIFO so the warmest socket is reused first
+        self._pid = os.getpid()
+        self._idle = []
+        self._in_use = {}
+        self._created = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _check_pid(self):
+        # Connections inherited across fork() share a socket with the parent;
+        # forget them (without closing) so each worker opens its own
+        if self._pid != os.getpid():
+            self._reset()
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if needed"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            self._check_pid()
+            while not self._idle and len(self._in_use) >= self.size + self.max_overflow:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout:.1f}s "
+                        f"({len(self._in_use)} in use)"
+                    )
+                self._cond.wait(remaining)
+
+            entry = self._idle.pop() if self._idle else None
+            # Reserve the slot before doing any network I/O outside the lock
+            token = object()
+            self._in_use[token] = None
+
+            waited = time.monotonic() - start
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            conn, created_at = self._prepare(entry)
+        except Exception:
+            with self._cond:
+                del self._in_use[token]
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            del self._in_use[token]
+            self._in_use[id(conn)] = created_at
+        return conn
+
+    def _prepare(self, entry):
+        if entry is not None:
+            conn, created_at = entry
+            if self.recycle and time.time() - created_at > self.recycle:
+                self._close(conn)
+                with self._cond:
+                    self._recycled += 1
+            elif self.pre_ping and not self._ping(conn):
+                self._close(conn)
+                with self._cond:
+                    self._ping_failures += 1
+            else:
+                return conn, created_at
+
+        conn = self._connect()
+        with self._cond:
+            self._created += 1
+        return conn, time.time()
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, closing it if it is unusable or surplus"""
+        if not discard:
+            # End any transaction the caller left open so the next checkout
+            # does not inherit its snapshot or locks
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            stale = self._pid != os.getpid()
+            keep = not discard and not stale and created_at is not None \
+                and len(self._idle) < self.size
+            if keep:
+                self._idle.append((conn, created_at))
+            self._cond.notify()
+
+        if not keep:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close on return)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Snapshot of pool usage for sizing and monitoring"""
+        with self._cond:
+            self._check_pid()
+            checkouts = self._checkouts
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'overflow': max(0, len(self._in_use) + len(self._idle) - self.size),
+                'connections_created': self._created,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
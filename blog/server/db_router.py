@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Routing of lag-tolerant reads to MariaDB replicas, with health and lag checks
+
+import threading
+import time
+
+
+class Replica:
+    """One replica: its connection pool and the result of its last check"""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None             # Seconds_Behind_Master at the last check
+        self.error = 'not checked yet'
+        self.checked_at = 0.0       # time.monotonic()
+        self.check_lock = threading.Lock()
+
+    def stats(self):
+        return {'name': self.name, 'lag': self.lag, 'error': self.error, **self.pool.stats()}
+
+
+class ReplicaRouter:
+    """Chooses where a read that may be slightly stale runs.
+
+    ``choose()`` returns a replica, or None for the primary. A replica is
+    used while its last check found replication running no more than
+    ``max_lag`` seconds behind. Checks run at most every ``check_interval``
+    seconds, on the request that finds the result out of date; other
+    requests keep using the previous result meanwhile. Replicas that are
+    usable take turns.
+
+    Reads stay on the primary for ``max_lag`` seconds after any post write,
+    which every process sees through ``stamp`` (the posts ChangeStamp).
+    Caches refilled right after a write then never keep a replica's older
+    copy.
+    """
+
+    def __init__(self, replicas, max_lag=5.0, check_interval=5.0, stamp=None):
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.stamp = stamp
+        self._lock = threading.Lock()
+        self._next = 0
+        self._reads = {'replica': 0, 'sticky': 0, 'recent_write': 0, 'unavailable': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def choose(self, sticky=False):
+        """The replica to read from, or None to use the primary"""
+        if not self.replicas:
+            return None
+        if sticky:
+            return self._route('sticky')
+        if self._recently_written():
+            return self._route('recent_write')
+
+        usable = [replica for replica in self.replicas if self._usable(replica)]
+        if not usable:
+            return self._route('unavailable')
+        with self._lock:
+            replica = usable[self._next % len(usable)]
+            self._next += 1
+            self._reads['replica'] += 1
+        return replica
+
+    def mark_failed(self, replica, error):
+        """Stop using ``replica`` until its next check (e.g. it refused a connection)"""
+        replica.error = str(error)
+        replica.checked_at = time.monotonic()
+
+    def check(self, replica):
+        """Measure the replication lag of ``replica``"""
+        try:
+            with replica.pool.connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute("SHOW SLAVE STATUS")
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            # Refused connection, pool timeout, missing privilege, ...
+            self.mark_failed(replica, e)
+            return
+
+        if not rows:
+            replica.lag, error = None, 'not a replica (SHOW SLAVE STATUS is empty)'
+        else:
+            # NULL while the replication threads are stopped
+            replica.lag = rows[0]['Seconds_Behind_Master']
+            error = 'replication stopped' if replica.lag is None else None
+        replica.error = error
+        replica.checked_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            reads = dict(self._reads)
+        return {'max_lag': self.max_lag, 'reads': reads,
+                'replicas': [replica.stats() for replica in self.replicas]}
+
+    def _route(self, reason):
+        with self._lock:
+            self._reads[reason] += 1
+        return None
+
+    def _usable(self, replica):
+        if time.monotonic() - replica.checked_at >= self.check_interval:
+            # One request checks; the others go on with the last result
+            if replica.check_lock.acquire(blocking=False):
+                try:
+                    self.check(replica)
+                finally:
+                    replica.check_lock.release()
+        return replica.error is None and replica.lag is not None and replica.lag <= self.max_lag
+
+    def _recently_written(self):
+        if self.stamp is None:
+            return False
+        version = self.stamp.version()
+        return version is not None and time.time() - version[1] / 1e9 < self.max_lag
@@ -11,16 +11,18 @@ FLUSH PRIVILEGES;
 -- Use the database
 USE blog_db;
 
--- Create posts table
+-- Tables are created by the server's schema migrations on first start
+-- (or: python migrate.py --upgrade). The posts table is created here as
+-- migration 1 creates it, so the sample post below has somewhere to go;
+-- the migrations then add the remaining columns and fill in its excerpt.
 CREATE TABLE IF NOT EXISTS posts (
     id VARCHAR(50) PRIMARY KEY,
     title VARCHAR(255) NOT NULL,
     content TEXT NOT NULL,
     date DATETIME NOT NULL,
-    updated_at DATETIME NOT NULL,
-    view_count INT NOT NULL DEFAULT 0
+    updated_at DATETIME NOT NULL
 );
 
 -- Optional: Insert a sample post
-INSERT INTO posts (id, title, content, date, updated_at) VALUES
+INSERT IGNORE INTO posts (id, title, content, date, updated_at) VALUES
 ('sample1', '마크다운 블로그 시작하기', '# 마크다운 블로그 시작하기\n\n안녕하세요! 이 블로그는 마크다운으로 작성된 첫 번째 포스트입니다.\n\n## 마크다운 사용법\n\n마크다운은 텍스트 형식의 문서를 HTML로 변환해주는 가벼운 마크업 언어입니다.', NOW(), NOW());
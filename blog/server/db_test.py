@@ -62,7 +62,7 @@ try:
     print("\nReading test data...")
     cursor.execute("SELECT * FROM test_connection ORDER BY id DESC LIMIT 5")
     rows = cursor.fetchall()
-    for row in cursor.fetchall():
+    for row in rows:
         print(f"  {row}")
     
     print("\nDatabase connection and operations successful!")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Atom and RSS feeds of the newest posts, written through XmlWriter
+
+import datetime
+from email.utils import format_datetime
+
+from xml_stream import XmlWriter
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+ATOM_CONTENT_TYPE = 'application/atom+xml'
+RSS_CONTENT_TYPE = 'application/rss+xml'
+
+DEFAULT_FEED_SIZE = 20
+
+
+def local_time(value):
+    """An aware datetime; naive database values are in the server's local time"""
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.replace(microsecond=0)
+
+
+class FeedSite:
+    """What a feed says about the blog itself"""
+
+    def __init__(self, title, base_url, author):
+        self.title = title
+        self.base_url = base_url.rstrip('/')
+        self.author = author
+
+    @property
+    def home_url(self):
+        return f'{self.base_url}/blog/index.html'
+
+    def post_url(self, post_id):
+        # Same URLs as the sitemap
+        return f'{self.base_url}/blog/index.html#/post/{post_id}'
+
+
+def build_atom(site, posts, self_url, updated):
+    """Atom 1.0 document for ``posts`` (dicts with id, title, excerpt, date, updated_at)"""
+    parts = []
+    xml = XmlWriter(parts.append)
+    xml.declaration()
+    xml.start('feed', {'xmlns': ATOM_NS})
+    xml.element('id', self_url)
+    xml.element('title', site.title)
+    xml.element('updated', local_time(updated).isoformat())
+    xml.element('link', attrs={'rel': 'self', 'type': ATOM_CONTENT_TYPE, 'href': self_url})
+    xml.element('link', attrs={'rel': 'alternate', 'type': 'text/html', 'href': site.home_url})
+    xml.start('author')
+    xml.element('name', site.author)
+    xml.end()
+    for post in posts:
+        url = site.post_url(post['id'])
+        xml.start('entry')
+        xml.element('id', url)
+        xml.element('title', post['title'])
+        xml.element('link', attrs={'rel': 'alternate', 'type': 'text/html', 'href': url})
+        xml.element('published', local_time(post['date']).isoformat())
+        xml.element('updated', local_time(post['updated_at']).isoformat())
+        xml.element('summary', post['excerpt'])
+        xml.end()
+    xml.end()
+    return ''.join(parts).encode('utf-8')
+
+
+def build_rss(site, posts, self_url, updated):
+    """RSS 2.0 document for the same rows as build_atom()"""
+    parts = []
+    xml = XmlWriter(parts.append)
+    xml.declaration()
+    xml.start('rss', {'version': '2.0', 'xmlns:atom': ATOM_NS})
+    xml.start('channel')
+    xml.element('title', site.title)
+    xml.element('link', site.home_url)
+    xml.element('description', site.title)
+    xml.element('lastBuildDate', format_datetime(local_time(updated)))
+    xml.element('atom:link', attrs={'rel': 'self', 'type': RSS_CONTENT_TYPE, 'href': self_url})
+    for post in posts:
+        url = site.post_url(post['id'])
+        xml.start('item')
+        xml.element('title', post['title'])
+        xml.element('link', url)
+        xml.element('guid', url, attrs={'isPermaLink': 'true'})
+        xml.element('pubDate', format_datetime(local_time(post['date'])))
+        xml.element('description', post['excerpt'])
+        xml.end()
+    xml.end()
+    xml.end()
+    return ''.join(parts).encode('utf-8')
+
+
+FEED_FORMATS = {
+    'atom': (build_atom, ATOM_CONTENT_TYPE),
+    'rss': (build_rss, RSS_CONTENT_TYPE),
+}
+
+
+def feed_updated(posts, last_write=None):
+    """Time the feed last changed: its newest edit or, if later, the last post write.
+
+    A deleted post drops out of the feed without leaving a newer
+    ``updated_at`` behind, so the time of the last write counts too.
+    """
+    times = [local_time(post['updated_at']) for post in posts]
+    if last_write is not None:
+        times.append(local_time(last_write))
+    if not times:
+        return local_time(datetime.datetime.now())
+    return max(times)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# Gunicorn settings for running the blog API in production
+#
+# Usage: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Graceful reload (new config, restarted workers, same code): kill -HUP <master pid>
+# Zero-downtime code upgrade: kill -USR2 <master pid>, then kill -QUIT <old master pid>
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5501')
+
+# Each worker is a separate process with its own connection pool and caches;
+# threads share them. Admin sessions live in the database (SESSION_BACKEND),
+# so any worker can serve any request.
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Restart a worker after this many requests (0 = never) to cap slow leaks;
+# the jitter keeps workers from restarting at the same moment
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# Import the app once in the master: init_db() runs a single time and the
+# workers share the loaded code copy-on-write
+preload_app = True
+
+pidfile = os.getenv('GUNICORN_PIDFILE') or None
+
+# The app logs every request itself (blog.access); keep gunicorn's own
+# error log on stderr and leave its access log off
+accesslog = None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    import app as blog_app
+    # Counters start from zero with a new master
+    blog_app.metrics.reset_directory()
+    blog_app.init_db()
+    if os.getenv('SEARCH_INDEX_PRELOAD', '1') == '1':
+        # Workers inherit the built index instead of each building their own
+        blog_app.warm_search_index()
+    # Do not hand the master's database connections to the workers
+    blog_app.db_pool.dispose()
+
+
+def post_fork(server, worker):
+    import app as blog_app
+    blog_app.init_worker()
+
+
+def worker_exit(server, worker):
+    import app as blog_app
+    # Write this worker's buffered view counts and final metrics before it goes away
+    blog_app.view_counter.stop()
+    blog_app.metrics.stop()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Single-pass JSON encoding for API responses
+
+import datetime
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Helper to convert datetime objects to string for JSON serialization
+def json_serial(obj):
+    if isinstance(obj, datetime.datetime) or isinstance(obj, datetime.date):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+class ResponseEncoder:
+    """Encodes payloads to the exact bytes Flask's jsonify() would produce.
+
+    Rows are serialized once, with datetimes converted by ``json_serial``.
+    With ``backend='auto'`` the orjson package is used when it is installed
+    and its output is byte-identical, which is when ``ensure_ascii`` is off
+    (orjson always emits UTF-8 instead of \\uXXXX escapes).
+    """
+
+    def __init__(self, backend='auto', ensure_ascii=True, sort_keys=True):
+        if backend not in ('auto', 'stdlib'):
+            raise ValueError(f"Unknown JSON backend: {backend}")
+        self.ensure_ascii = ensure_ascii
+        self.sort_keys = sort_keys
+        self.use_orjson = (backend == 'auto' and orjson is not None
+                           and not ensure_ascii and sort_keys)
+
+    @property
+    def backend(self):
+        return 'orjson' if self.use_orjson else 'stdlib'
+
+    def encode(self, obj, compact=True):
+        """Serialize ``obj`` to UTF-8 bytes with jsonify's trailing newline"""
+        if self.use_orjson:
+            option = orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE
+            if not compact:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=json_serial, option=option)
+
+        if compact:
+            text = json.dumps(obj, default=json_serial, ensure_ascii=self.ensure_ascii,
+                              sort_keys=self.sort_keys, separators=(',', ':'))
+        else:
+            text = json.dumps(obj, default=json_serial, ensure_ascii=self.ensure_ascii,
+                              sort_keys=self.sort_keys, indent=2)
+        return (text + '\n').encode('utf-8')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Incremental reader for large JSON array / NDJSON exports
+
+import json
+
+_WHITESPACE = ' \t\r\n'
+
+# Longest record accepted, in characters; larger than any post MariaDB's
+# default max_allowed_packet lets through
+MAX_RECORD_SIZE = 16 << 20
+
+
+def iter_json_records(f, chunk_size=1 << 20, max_record_size=MAX_RECORD_SIZE):
+    """Yield the top-level records of a JSON array or NDJSON stream one at a time.
+
+    ``f`` is a text file. A file starting with ``[`` is read as one JSON
+    array; anything else as whitespace-separated JSON values (NDJSON).
+    Only ``chunk_size`` characters plus the record being parsed are held in
+    memory. Raises ``json.JSONDecodeError`` on malformed input, and
+    ``ValueError`` with the record's byte offset when a record is still
+    incomplete after ``max_record_size`` characters, which is how malformed
+    input before the end of the file shows up.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    offset = 0  # bytes of the file before buf
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, offset, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        # Drop what has been consumed so the buffer stays one chunk long
+        offset += len(buf[:pos].encode('utf-8', 'surrogatepass'))
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def fill_record():
+        # The record starting at pos needs more input
+        if len(buf) - pos > max_record_size:
+            start = offset + len(buf[:pos].encode('utf-8', 'surrogatepass'))
+            raise ValueError(f"Record at byte {start} is malformed or longer than "
+                             f"{max_record_size} characters")
+        fill()
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    fill()
+    if buf.startswith('\ufeff'):
+        pos = 1
+    skip(_WHITESPACE)
+    in_array = buf.startswith('[', pos)
+    if in_array:
+        pos += 1
+
+    while True:
+        skip(_WHITESPACE + ',' if in_array else _WHITESPACE)
+        if pos >= len(buf):
+            if in_array:
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            return
+        if in_array and buf[pos] == ']':
+            pos += 1
+            skip(_WHITESPACE)
+            if pos < len(buf):
+                raise json.JSONDecodeError("Extra data after array", buf, pos)
+            return
+
+        while True:
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill_record()
+                continue
+            # A value that ends exactly at the buffer edge may continue in the next chunk
+            if end == len(buf) and not eof:
+                fill_record()
+                continue
+            break
+        pos = end
+        yield record
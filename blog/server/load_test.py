@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# Load test for the blog API: seed posts, drive endpoints at fixed concurrency, report latency
+#
+# Offline, against a throwaway SQLite stand-in (starts gunicorn itself):
+#   python load_test.py --sqlite /tmp/blog-load.db --seed 5000 --size 4000
+#
+# Against a running server on a local MariaDB (DB_* settings from .env for seeding):
+#   python load_test.py --url http://localhost:5501 --seed 5000 --username admin --password ...
+#
+# Results can be saved with --json and compared with a later run:
+#   python load_test.py ... --json before.json
+#   python load_test.py ... --baseline before.json     (exit status 2 on a regression)
+
+import argparse
+import contextlib
+import datetime
+import hashlib
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import mysql.connector
+from dotenv import load_dotenv
+
+from blog_store import MariaDBStore
+from change_stamp import ChangeStamp
+
+SCENARIOS = ('list', 'post', 'post-html', 'sitemap', 'write', 'list-all')
+DEFAULT_SCENARIOS = ('list', 'post', 'sitemap', 'write')
+
+SEED_BATCH = 500
+
+# Admin password of a --sqlite database, set when the database is created
+STANDIN_PASSWORD = 'load-test'
+
+_WORDS = ('마크다운', '블로그', '서버', '데이터베이스', '검색', '캐시', '파이썬', '플라스크', '배포',
+          '성능', 'MariaDB', 'Flask', 'gunicorn', 'index', 'query', 'latency', '운영', '설정')
+
+
+def make_body(rng, size):
+    """Markdown of about ``size`` characters: headings, paragraphs, a list and a table"""
+    parts = []
+    length = 0
+    while length < size:
+        paragraph = ' '.join(rng.choices(_WORDS, k=rng.randint(20, 60))) + '.'
+        block = rng.choice((
+            f"## {' '.join(rng.choices(_WORDS, k=3))}\n\n{paragraph}",
+            paragraph,
+            paragraph + '\n\n- ' + '\n- '.join(rng.choices(_WORDS, k=4)),
+            '| 항목 | 값 |\n|---|---|\n' + '\n'.join(f'| {w} | {rng.randint(1, 999)} |' for w in rng.choices(_WORDS, k=3)),
+        ))
+        parts.append(block)
+        length += len(block) + 2
+    return '\n\n'.join(parts)[:size]
+
+
+def seed_posts(connect, count, size, rng_seed=1):
+    """Upsert ``count`` posts ``load-0 ... load-N`` of about ``size`` characters"""
+    rng = random.Random(rng_seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    start = time.perf_counter()
+    rows = ((f'load-{i}', f"{' '.join(rng.choices(_WORDS, k=4))} {i}", make_body(rng, size),
+             now - datetime.timedelta(minutes=i), now, 0) for i in range(count))
+    conn = connect()
+    try:
+        MariaDBStore(lambda: contextlib.nullcontext(conn)).upsert_posts(rows, batch_size=SEED_BATCH,
+                                                                         commit_every=count)
+    finally:
+        conn.close()
+    print(f"Seeded {count:,} posts of ~{size:,} characters in {time.perf_counter() - start:.1f}s")
+
+
+class Client:
+    """One keep-alive HTTP connection"""
+
+    def __init__(self, base_url, accept_encoding):
+        url = urllib.parse.urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.https = url.scheme == 'https'
+        self.headers = {'Accept': 'application/json'}
+        if accept_encoding:
+            self.headers['Accept-Encoding'] = accept_encoding
+        self._conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """``(status, body bytes as received)``; reconnects once if the server closed the connection"""
+        all_headers = dict(self.headers, **(headers or {}))
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            all_headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self._conn is None:
+                connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                self._conn = connection_class(self.host, self.port, timeout=60)
+            try:
+                self._conn.request(method, path, body=data, headers=all_headers)
+                response = self._conn.getresponse()
+                return response.status, response.read()
+            except (ConnectionError, http.client.HTTPException):
+                self._conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise
+
+    def json(self, method, path, body=None, headers=None):
+        status, raw = self.request(method, path, body, dict(headers or {}, **{'Accept-Encoding': 'identity'}))
+        return status, json.loads(raw) if raw else None
+
+
+class Workload:
+    """What each scenario requests, prepared once from the server's own post list"""
+
+    def __init__(self, base_url, token=None, size=4000):
+        self.base_url = base_url
+        self.token = token
+        self.size = size
+        client = Client(base_url, None)
+        # Post ids to read (up to 1,000) and cursors of the first list pages
+        self.post_ids = []
+        self.page_paths = ['/api/posts?limit=20']
+        cursor = None
+        while len(self.post_ids) < 1000:
+            status, page = client.json('GET', '/api/posts?limit=100&fields=id' + (f'&cursor={cursor}' if cursor else ''))
+            if status != 200:
+                raise SystemExit(f"GET /api/posts failed with {status}: {page}")
+            self.post_ids += [post['id'] for post in page['posts']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        cursor = None
+        for _ in range(4):
+            _, page = client.json('GET', '/api/posts?limit=20' + (f'&cursor={cursor}' if cursor else ''))
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+            self.page_paths.append(f'/api/posts?limit=20&cursor={cursor}')
+        if not self.post_ids:
+            raise SystemExit("The database has no posts; run with --seed N")
+
+    def next_request(self, scenario, rng):
+        """``(method, path, body, headers)`` of the next request for ``scenario``"""
+        if scenario == 'list':
+            # Most readers stay on the first page
+            path = self.page_paths[0] if rng.random() < 0.7 else rng.choice(self.page_paths)
+            return 'GET', path, None, None
+        if scenario == 'list-all':
+            return 'GET', '/api/posts', None, None
+        if scenario == 'post':
+            return 'GET', f'/api/posts/{rng.choice(self.post_ids)}', None, None
+        if scenario == 'post-html':
+            return 'GET', f'/api/posts/{rng.choice(self.post_ids)}?format=html', None, None
+        if scenario == 'sitemap':
+            return 'GET', '/api/sitemap', None, None
+        if scenario == 'write':
+            post_id = rng.choice(self.post_ids)
+            body = {'title': f'Load test {rng.randint(0, 1 << 30)}', 'content': make_body(rng, self.size)}
+            return 'PUT', f'/api/posts/{post_id}', body, {'Authorization': f'Bearer {self.token}'}
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(workload, scenario, concurrency, duration, warmup, accept_encoding):
+    """Hit one scenario from ``concurrency`` threads for ``duration`` seconds"""
+    results = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+    stop = threading.Event()
+    measuring = threading.Event()
+
+    def worker(number):
+        rng = random.Random(number)
+        client = Client(workload.base_url, accept_encoding)
+        latencies = []
+        received = errors = 0
+        statuses = {}
+        start_barrier.wait()
+        while not stop.is_set():
+            method, path, body, headers = workload.next_request(scenario, rng)
+            started = time.perf_counter()
+            try:
+                status, raw = client.request(method, path, body, headers)
+            except OSError:
+                status, raw = 0, b''
+            elapsed = time.perf_counter() - started
+            if not measuring.is_set():
+                continue
+            latencies.append(elapsed)
+            received += len(raw)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status >= 400 or status == 0:
+                errors += 1
+        with lock:
+            results.append((latencies, received, errors, statuses))
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    time.sleep(warmup)
+    measuring.set()
+    measure_start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    measured = time.perf_counter() - measure_start
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(value for result in results for value in result[0])
+    statuses = {}
+    for result in results:
+        for status, count in result[3].items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    return {
+        'requests': len(latencies),
+        'errors': sum(result[2] for result in results),
+        'statuses': statuses,
+        'throughput': len(latencies) / measured,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'bytes': sum(result[1] for result in results),
+        'bytes_per_request': sum(result[1] for result in results) / len(latencies) if latencies else 0,
+    }
+
+
+def print_report(results):
+    print(f"\n{'scenario':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'KiB/req':>8} {'MiB':>8}")
+    for scenario, r in results.items():
+        print(f"{scenario:<10} {r['requests']:>9,} {r['errors']:>7,} {r['throughput']:>9,.1f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['bytes_per_request'] / 1024:>8.1f} "
+              f"{r['bytes'] / 1024 / 1024:>8.1f}")
+        unexpected = {status: count for status, count in r['statuses'].items() if status not in ('200', '304')}
+        if unexpected:
+            print(f"{'':<10} status codes: {unexpected}")
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Regression messages for scenarios slower or less productive than the baseline"""
+    regressions = []
+    for scenario, current in results.items():
+        before = baseline.get('results', {}).get(scenario)
+        if before is None:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {before['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {before['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+        if current['errors'] > before['errors']:
+            regressions.append(f"{scenario}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+
+def serve_standin(database, port):
+    """Run the app under gunicorn (gunicorn.conf.py) on the SQLite stand-in; never returns"""
+    import sqlite_standin
+    sqlite_standin.install(database)
+    from gunicorn.app.wsgiapp import run
+    os.environ['GUNICORN_BIND'] = f'127.0.0.1:{port}'
+    sys.argv = ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    run()
+
+
+def start_standin_server(database, port, password, cache_dir):
+    env = dict(os.environ, ADMIN_PASSWORD_HASH=hashlib.sha256(password.encode()).hexdigest(),
+               CACHE_DIR=cache_dir, LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'))
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve-standin', database, str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    client = Client(base_url, None)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"Server exited with status {server.returncode}")
+        try:
+            if client.request('GET', '/api/stats/pool')[0] == 200:
+                return server, base_url
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("Server did not start within 30s")
+
+
+def login(base_url, username, password):
+    status, payload = Client(base_url, None).json('POST', '/api/auth/login',
+                                                  {'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f"Login failed with {status}: {payload}")
+    return payload['token']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed posts and load-test the blog API")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="Base URL of a running server (seeding uses the DB_* settings)")
+    target.add_argument('--sqlite', metavar='FILE', help="Start the app on a SQLite stand-in database")
+    target.add_argument('--serve-standin', nargs=2, metavar=('FILE', 'PORT'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=5599, help="Port for the --sqlite server")
+    parser.add_argument('--seed', type=int, default=0, metavar='N', help="Upsert N posts before the run")
+    parser.add_argument('--size', type=int, default=4000, help="Characters per seeded post body")
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS),
+                        help=f"Comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=10, help="Measured seconds per scenario")
+    parser.add_argument('--warmup', type=float, default=2, help="Unmeasured seconds before each scenario")
+    parser.add_argument('--encoding', default='gzip', help="Accept-Encoding to send ('' for none)")
+    parser.add_argument('--username', default='admin', help="Admin user for the write scenario")
+    parser.add_argument('--password', help=f"Admin password (default for --sqlite: {STANDIN_PASSWORD})")
+    parser.add_argument('--json', metavar='FILE', help="Write the results here")
+    parser.add_argument('--baseline', metavar='FILE', help="Compare with the results of an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed p95/throughput change before --baseline reports a regression")
+    args = parser.parse_args()
+
+    if args.serve_standin:
+        serve_standin(args.serve_standin[0], int(args.serve_standin[1]))
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario: {name}")
+
+    load_dotenv()
+    server = None
+    cache_dir = None
+    try:
+        if args.sqlite:
+            import sqlite_standin
+            password = args.password or STANDIN_PASSWORD
+            cache_dir = tempfile.mkdtemp(prefix='blog-load-cache-')
+            server, base_url = start_standin_server(args.sqlite, args.port, password, cache_dir)
+            if args.seed:
+                seed_posts(lambda: sqlite_standin.StandinConnection(args.sqlite), args.seed, args.size)
+                # The server is already running; make its workers drop what they loaded
+                ChangeStamp(os.path.join(cache_dir, 'posts.stamp')).bump()
+        else:
+            base_url = args.url.rstrip('/')
+            password = args.password
+            if args.seed:
+                seed_posts(lambda: mysql.connector.connect(
+                    host=os.getenv('DB_HOST', 'localhost'), user=os.getenv('DB_USER', 'blog_user'),
+                    password=os.getenv('DB_PASSWORD', ''), database=os.getenv('DB_NAME', 'blog_db')
+                ), args.seed, args.size)
+                print("Restart the server (or wait POST_CACHE_TTL) so it serves the seeded posts")
+
+        token = None
+        if 'write' in scenarios:
+            if password is None:
+                print("No --password given; skipping the write scenario")
+                scenarios.remove('write')
+            else:
+                token = login(base_url, args.username, password)
+
+        workload = Workload(base_url, token, args.size)
+        print(f"Target {base_url}: {len(workload.post_ids):,} post ids, concurrency {args.concurrency}, "
+              f"{args.duration:g}s per scenario, Accept-Encoding: {args.encoding or '(none)'}")
+        results = {}
+        for scenario in scenarios:
+            print(f"  running {scenario}...", flush=True)
+            results[scenario] = run_scenario(workload, scenario, args.concurrency, args.duration,
+                                             args.warmup, args.encoding)
+        print_report(results)
+
+        report = {
+            'target': 'sqlite' if args.sqlite else base_url,
+            'concurrency': args.concurrency, 'duration': args.duration, 'encoding': args.encoding,
+            'posts': len(workload.post_ids), 'size': args.size,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'results': results,
+        }
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\nResults written to {args.json}")
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+            if regressions:
+                print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+                for line in regressions:
+                    print(f"  {line}")
+                sys.exit(2)
+            print(f"\nNo regressions against {args.baseline}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# Structured, queue-backed logging for the blog backend
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with extra= fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extras = ' '.join(f"{key}={value}" for key, value in record.__dict__.items()
+                          if key not in _RECORD_ATTRS and not key.startswith('_'))
+        return f"{line} {extras}" if extras else line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats every record on the calling (request) thread
+    before queueing it; in-process queues do not need that, so the request
+    thread only pays for creating the record and a queue put.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class LogSampler:
+    """Cheap per-request decision whether to emit a sampled log line"""
+
+    def __init__(self, logger, rate):
+        self.logger = logger
+        self.rate = rate
+
+    def __call__(self, level=logging.INFO):
+        if self.rate <= 0 or not self.logger.isEnabledFor(level):
+            return False
+        return self.rate >= 1 or random.random() < self.rate
+
+
+_listener = None
+_handler = None
+
+
+def configure_logging(level=None, fmt=None, cors_debug=None, stream=None):
+    """Route all logging through a queue to a single formatting thread.
+
+    Settings default to the LOG_LEVEL, LOG_FORMAT and LOG_CORS_DEBUG
+    environment variables. Safe to call more than once.
+    """
+    global _listener, _handler
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json')
+    if cors_debug is None:
+        cors_debug = os.getenv('LOG_CORS_DEBUG', '0') == '1'
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(StructuredFormatter() if fmt == 'json' else TextFormatter())
+
+    if _listener is not None:
+        _listener.stop()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _handler = DeferredQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    # Per-request CORS tracing is only useful while debugging a browser issue
+    logging.getLogger('blog.cors').setLevel(logging.DEBUG if cors_debug else logging.WARNING)
+
+    _listener.start()
+    return _listener
+
+
+def _restart_after_fork():
+    # The listener thread does not survive fork(); give the child its own
+    global _listener
+    if _listener is not None and _handler is not None:
+        log_queue = queue.SimpleQueue()
+        _handler.queue = log_queue
+        _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers,
+                                                   respect_handler_level=False)
+        _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
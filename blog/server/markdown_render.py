@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# Server-side Markdown rendering with a content-addressed HTML cache
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from markdown_it import MarkdownIt
+
+# Part of every cache key: bump it whenever the rendering below changes, so
+# files written by the old renderer are no longer used
+RENDERER_VERSION = 'md2'
+
+
+def _make_renderer():
+    # Matches marked 9 with the options in index.html (gfm: true, breaks:
+    # true): CommonMark lists (two-space nesting, a list right after a
+    # paragraph), GFM tables, fenced code, ~~strikethrough~~ as <del>, bare
+    # http(s)://, www. and e-mail links, raw HTML kept, single newlines as
+    # <br>. marked 9 no longer adds ids to headings, so neither does this.
+    md = MarkdownIt('gfm-like', {'breaks': True, 'html': True, 'xhtmlOut': False})
+    md.renderer.rules['s_open'] = lambda tokens, idx, options, env: '<del>'
+    md.renderer.rules['s_close'] = lambda tokens, idx, options, env: '</del>'
+
+    # GFM links bare www. hosts but not other bare domains (example.com)
+    linkify = md.linkify
+    linkify.set({'fuzzy_link': False})
+    host = re.compile(linkify.re['src_host_port_strict'] + linkify.re['src_path'], re.IGNORECASE)
+
+    def validate(self, text, pos):
+        match = host.match(text, pos)
+        return match.end() - pos if match else 0
+
+    def normalize(self, match):
+        match.url = 'http://' + match.url
+
+    linkify.add('www.', {'validate': validate, 'normalize': normalize})
+    return md
+
+
+_renderer = _make_renderer()
+
+
+def render_markdown(text):
+    """HTML for a post body, as the blog's renderMarkdown() would produce it"""
+    # Rendering keeps no state on the instance, so threads share it
+    return _renderer.render(text)
+
+
+def content_key(text):
+    """Cache key of ``text``: the SHA-256 of the renderer version and the Markdown"""
+    digest = hashlib.sha256(RENDERER_VERSION.encode())
+    digest.update(b'\0')
+    digest.update(text.encode())
+    return digest.hexdigest()
+
+
+class HtmlCache:
+    """Rendered HTML keyed by the hash of the Markdown it came from.
+
+    Every revision is rendered once: a byte-bounded LRU keeps recent results
+    in memory, and files under ``cache_dir`` (``ab/abcd....html``) share
+    them between worker processes and restarts. An edit that leaves the body
+    unchanged, or two posts with the same body, reuse the same entry, and
+    entries never need invalidating because a new body has a new key.
+    """
+
+    def __init__(self, cache_dir, max_bytes=16 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._renders = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, text):
+        """``(key, html)`` for a Markdown body, rendering it if no process has yet"""
+        key = content_key(text)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return key, html
+
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                html = f.read()
+            with self._lock:
+                self._disk_hits += 1
+        except FileNotFoundError:
+            html = render_markdown(text)
+            self._write(path, html)
+            with self._lock:
+                self._renders += 1
+
+        self._remember(key, html)
+        return key, html
+
+    def warm(self, text):
+        """Render ``text`` ahead of the first read (called on create/update)"""
+        self.get(text)
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'renders': self._renders,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.html')
+
+    def _write(self, path, html):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write and rename so other processes never read a partial file
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(tmp, path)
+
+    def _remember(self, key, html):
+        size = len(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = html
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
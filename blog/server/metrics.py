@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# Prometheus metrics (text exposition format) summed over worker processes
+
+import atexit
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+log = logging.getLogger('blog.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds; an implicit +Inf bucket follows the last one
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Histogram:
+    """Observation counts per bucket, plus their sum, per label combination.
+
+    Buckets are stored non-cumulatively (one increment per observation) and
+    made cumulative only when exported.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), list(series)] for labels, series in self._values.items()]
+
+
+class Collected:
+    """Counter or gauge read from existing statistics at export time.
+
+    ``collect()`` returns ``{label_tuple: value}``. Nothing is recorded on
+    the request path, so wrapping e.g. the post cache's hit counters costs
+    nothing until a scrape.
+    """
+
+    def __init__(self, kind, name, help, labelnames, collect):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+
+    def _reset(self):
+        pass
+
+    def samples(self):
+        return [[list(labels), value] for labels, value in self._collect().items()]
+
+
+class MetricsRegistry:
+    """The metrics of one process, shared with its sibling workers through files.
+
+    Each process writes its own values to ``<directory>/<pid>.json`` every
+    ``flush_interval`` seconds once ``start()`` has been called, and a final
+    time on ``stop()``. ``exposition()`` adds the live values of the calling
+    process to the files of all others, so any worker can answer a scrape for
+    the whole server. Counters and histograms of workers that have exited
+    stay in the sum, so totals never go backwards when a worker is replaced;
+    gauges only count while their process is alive.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._stopped = False
+        self._after_fork()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked worker counts from zero; the parent's values are in its own file
+        self._pid = os.getpid()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        for metric in self._metrics:
+            metric._reset()
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=REQUEST_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, kind, name, help, labelnames, collect):
+        """Register a counter or gauge whose values come from ``collect()``"""
+        return self._register(Collected(kind, name, help, labelnames, collect))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """Current values of this process, in the format of the per-process files"""
+        families = {}
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                log.warning("Error collecting %s: %s", metric.name, e)
+                continue
+            family = {'type': metric.kind, 'help': metric.help,
+                      'labelnames': list(metric.labelnames), 'samples': samples}
+            if metric.kind == 'histogram':
+                family['buckets'] = list(metric.buckets)
+            families[metric.name] = family
+        return {'pid': self._pid, 'metrics': families}
+
+    def flush(self):
+        """Write this process's snapshot to its file (atomically)"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'{self._pid}.json')
+        tmp = f'{path}.tmp'
+        try:
+            with self._flush_lock:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self.snapshot(), f, separators=(',', ':'))
+                os.replace(tmp, path)
+        except OSError as e:
+            log.warning("Error writing metrics to %s: %s", path, e)
+
+    def start(self):
+        """Start writing this process's file in the background (call once per worker)"""
+        if not self.directory or self._stopped or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write the final values of this process and stop the flusher"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+    def reset_directory(self):
+        """Delete the files of earlier runs (called by the gunicorn master at startup)"""
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def _run(self):
+        wake = self._wake
+        while not self._stopped:
+            wake.wait(self.flush_interval)
+            if self._stopped:
+                break
+            self.flush()
+
+    def exposition(self):
+        """All processes' metrics in the Prometheus text format"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue  # replaced or half-written; picked up on the next scrape
+                if snapshot.get('pid') != self._pid:
+                    snapshots.append(snapshot)
+        return render(merge(snapshots, self._pid))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge(snapshots, own_pid):
+    """Sum per-process snapshots into one ``{name: family}``"""
+    merged = {}
+    for snapshot in snapshots:
+        pid = snapshot.get('pid')
+        live = pid == own_pid or _alive(pid)
+        for name, family in snapshot['metrics'].items():
+            if family['type'] == 'gauge' and not live:
+                continue
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = {**family, 'samples': {}}
+            elif target['type'] != family['type'] or target.get('buckets') != family.get('buckets'):
+                continue  # written by an older version of the code with another layout
+            values = target['samples']
+            for labels, value in family['samples']:
+                key = tuple(labels)
+                current = values.get(key)
+                if current is None:
+                    values[key] = value
+                elif isinstance(value, list):
+                    values[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    values[key] = current + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def render(families):
+    """``{name: family}`` as text exposition format 0.0.4"""
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        labelnames = family['labelnames']
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in sorted(family['samples'].items()):
+            if family['type'] != 'histogram':
+                lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(family['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                bucket_labels = _labels(labelnames, labels, f'le="{le}"')
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def statement_operation(sql):
+    """Label for a SQL statement: its verb for the common ones, else 'other'"""
+    verb = sql.lstrip()[:6].lower()
+    return verb if verb in ('select', 'insert', 'update', 'delete') else 'other'
+
+
+class TimedCursor:
+    """DB-API cursor that times each statement, from execute() to its last fetch.
+
+    The time is observed when the next statement starts, when the cursor is
+    closed, or by ``TimedConnection.finish()`` when the connection goes back
+    to the pool.
+    """
+
+    def __init__(self, cursor, histogram):
+        self._cursor = cursor
+        self._histogram = histogram
+        self._operation = None
+        self._elapsed = 0.0
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def execute(self, sql, params=None):
+        self.finish()
+        self._operation = statement_operation(sql)
+        if params is None:
+            return self._timed(self._cursor.execute, sql)
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_params):
+        self.finish()
+        self._operation = statement_operation(sql)
+        return self._timed(self._cursor.executemany, sql, seq_params)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._timed(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def finish(self):
+        if self._operation is not None:
+            self._histogram.observe(self._elapsed, self._operation)
+            self._operation = None
+            self._elapsed = 0.0
+
+    def close(self):
+        self.finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        # rowcount, lastrowid, description, ...
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection wrapper whose cursors are TimedCursors"""
+
+    def __init__(self, conn, histogram):
+        self._conn = conn
+        self._histogram = histogram
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = TimedCursor(self._conn.cursor(*args, **kwargs), self._histogram)
+        self._cursors.append(cursor)
+        return cursor
+
+    def finish(self):
+        """Observe the statements whose cursors were never closed"""
+        for cursor in self._cursors:
+            cursor.finish()
+        self._cursors.clear()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
-# Migration script to import posts from localStorage JSON to MariaDB
+# Migration script to import posts from localStorage JSON into the blog database
 
 import mysql.connector
-import json
 import sys
 import datetime
+import time
+from contextlib import contextmanager, nullcontext
+
+from blog_store import UPSERT_BATCH_SIZE, UPSERT_COMMIT_EVERY, create_store
+from json_records import iter_json_records
+from schema_migrations import MigrationError
 
 # Load environment variables
 import os
@@ -21,6 +26,13 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'blog_db')
 }
 
+# Storage backend, as for the server (see app.py)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mariadb')
+DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'blog.db'))
+
+# Seconds between progress lines during an import
+PROGRESS_INTERVAL = 5
+
 def connect_to_db():
     try:
         conn = mysql.connector.connect(**DB_CONFIG)
@@ -30,112 +42,141 @@ def connect_to_db():
         print(f"Database connection error: {err}")
         sys.exit(1)
 
-def import_posts(json_file):
+@contextmanager
+def open_store():
+    """The DB_BACKEND store, on one connection for the length of a command"""
+    if DB_BACKEND == 'sqlite':
+        yield create_store('sqlite', sqlite_path=DB_SQLITE_PATH)
+        return
+    conn = connect_to_db()
     try:
-        # Read JSON file
-        with open(json_file, 'r', encoding='utf-8') as f:
-            posts = json.load(f)
-
-        if not posts:
-            print("No posts found in the JSON file")
-            return
-
-        print(f"Found {len(posts)} posts to import")
-
-        # Connect to database
-        conn = connect_to_db()
-        cursor = conn.cursor()
-
-        # Import each post
-        imported_count = 0
-        for post in posts:
-            # Validate required fields
-            if not all(key in post for key in ['id', 'title', 'content', 'date']):
-                print(f"Skipping post with missing fields: {post.get('id', 'unknown')}")
-                continue
-
-            # Try to parse date
-            try:
-                date_obj = datetime.datetime.fromisoformat(post['date'].replace('Z', '+00:00'))
-            except ValueError:
-                print(f"Error parsing date for post {post['id']}, using current date")
-                date_obj = datetime.datetime.now()
-
-            now = datetime.datetime.now()
-
-            # Check if post already exists
-            cursor.execute("SELECT id FROM posts WHERE id = %s", (post['id'],))
-            existing = cursor.fetchone()
-
-            if existing:
-                # Update existing post
-                cursor.execute(
-                    "UPDATE posts SET title = %s, content = %s, updated_at = %s WHERE id = %s",
-                    (post['title'], post['content'], now, post['id'])
-                )
-                print(f"Updated existing post: {post['id']}")
-            else:
-                # Insert new post with view_count if available
-                view_count = post.get('view_count', 0)
-                cursor.execute(
-                    "INSERT INTO posts (id, title, content, date, updated_at, view_count) VALUES (%s, %s, %s, %s, %s, %s)",
-                    (post['id'], post['title'], post['content'], date_obj, now, view_count)
-                )
-                imported_count += 1
-
-        # Commit changes
-        conn.commit()
-        print(f"Successfully imported {imported_count} posts, updated {len(posts) - imported_count} existing posts")
-
-        # Close connection
-        cursor.close()
+        yield create_store(DB_BACKEND, lambda: nullcontext(conn))
+    finally:
         conn.close()
 
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Error reading JSON file: {e}")
-        sys.exit(1)
-    except mysql.connector.Error as err:
-        print(f"Database error: {err}")
-        sys.exit(1)
+def post_row(post, now):
+    """Validate one exported post and turn it into a store.upsert_posts() row"""
+    # Validate required fields
+    if not isinstance(post, dict) or not all(key in post for key in ['id', 'title', 'content', 'date']):
+        post_id = post.get('id', 'unknown') if isinstance(post, dict) else 'unknown'
+        print(f"Skipping post with missing fields: {post_id}")
+        return None
 
-def add_view_count_column():
-    print("Starting migration: adding view_count column to posts table...")
-    
+    # Try to parse date
     try:
-        # Connect to database
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        
-        # Check if view_count column already exists
-        cursor.execute("SHOW COLUMNS FROM posts LIKE 'view_count'")
-        column_exists = cursor.fetchone()
-        
-        if column_exists:
-            print("Column 'view_count' already exists in posts table.")
-        else:
-            # Add the view_count column with default value of 0
-            cursor.execute("""
-                ALTER TABLE posts 
-                ADD COLUMN view_count INT NOT NULL DEFAULT 0
-            """)
-            conn.commit()
-            print("Successfully added 'view_count' column to posts table.")
-        
-        # Close connection
-        cursor.close()
-        conn.close()
-        
-    except mysql.connector.Error as err:
-        print(f"Error: {err}")
-        sys.exit(1)
+        date_obj = datetime.datetime.fromisoformat(post['date'].replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        print(f"Error parsing date for post {post['id']}, using current date")
+        date_obj = now
+
+    return (post['id'], post['title'], post['content'], date_obj, now, post.get('view_count', 0))
+
+def import_posts(json_file, batch_size=UPSERT_BATCH_SIZE, commit_every=UPSERT_COMMIT_EVERY):
+    """Stream posts from a JSON array or NDJSON file into store.upsert_posts().
+
+    On MariaDB rows are sent ``batch_size`` at a time as one multi-row
+    INSERT ... ON DUPLICATE KEY UPDATE; both backends commit every
+    ``commit_every`` rows. Memory stays bounded by one batch however large
+    the file is, and an interrupted import can simply be run again.
+    """
+    inserted_count = updated_count = skipped_count = 0
+    processed = 0
+    started = time.monotonic()
+    last_report = started
+
+    def rows(f):
+        nonlocal processed, skipped_count, last_report
+        for post in iter_json_records(f):
+            row = post_row(post, datetime.datetime.now())
+            if row is None:
+                skipped_count += 1
+                continue
+            processed += 1
+            yield row
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                report()
+
+    def report(final=False):
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        label = "Done" if final else "Progress"
+        done = f" ({f.buffer.tell() * 100 // size}%)" if size and not final else ""
+        print(f"{label}: {processed} posts{done}, {rate:,.0f} posts/s, {elapsed:.1f}s elapsed", flush=True)
+
+    with open_store() as store:
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                size = os.fstat(f.fileno()).st_size
+                inserted_count, updated_count = store.upsert_posts(rows(f), batch_size=batch_size,
+                                                                   commit_every=commit_every)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Error reading JSON file: {e}")
+            if processed:
+                print("Posts up to the last commit were imported; re-running the import is safe")
+            sys.exit(1)
+        except store.Error as err:
+            print(f"Database error: {err}")
+            sys.exit(1)
+
+    if processed == 0 and skipped_count == 0:
+        print("No posts found in the JSON file")
+        return
+
+    report(final=True)
+    print(f"Successfully imported {inserted_count} posts, updated {updated_count} existing posts"
+          + (f", skipped {skipped_count}" if skipped_count else ""))
+
+def upgrade_schema():
+    """Apply the schema migrations this database has not had yet"""
+    with open_store() as store:
+        try:
+            applied = store.ensure_schema()
+        except (store.Error, MigrationError) as err:
+            print(f"Error: {err}")
+            sys.exit(1)
+
+    if applied:
+        print(f"Applied schema migrations: {', '.join(map(str, applied))}")
+    else:
+        print("Schema is up to date.")
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python migrate.py <json_file> OR python migrate.py --add-view-count")
-        sys.exit(1)
+def print_schema_status():
+    with open_store() as store:
+        try:
+            steps = store.schema_status()
+        except store.Error as err:
+            print(f"Error: {err}")
+            sys.exit(1)
+
+    for version, description, applied, applied_at in steps:
+        state = ("applied" + (f" {applied_at}" if applied_at else "")) if applied else "pending"
+        print(f"{version:>4}  {description:<80} {state}")
 
-    if sys.argv[1] == "--add-view-count":
-        add_view_count_column()
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import posts or migrate the database schema")
+    parser.add_argument('json_file', nargs='?', help="JSON array or NDJSON file of posts to import")
+    parser.add_argument('--batch-size', type=int, default=UPSERT_BATCH_SIZE,
+                        help=f"posts per INSERT statement on MariaDB (default {UPSERT_BATCH_SIZE})")
+    parser.add_argument('--commit-every', type=int, default=UPSERT_COMMIT_EVERY,
+                        help=f"posts per transaction (default {UPSERT_COMMIT_EVERY})")
+    parser.add_argument('--upgrade', action='store_true', help="apply pending schema migrations")
+    parser.add_argument('--status', action='store_true', help="list schema migrations and whether they are applied")
+    # Older one-off migrations, now steps of --upgrade
+    parser.add_argument('--add-view-count', '--add-excerpt', dest='upgrade', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.upgrade:
+        upgrade_schema()
+    elif args.status:
+        print_schema_status()
+    elif args.json_file:
+        if args.batch_size < 1 or args.commit_every < 1:
+            parser.error("--batch-size and --commit-every must be positive")
+        import_posts(args.json_file, batch_size=args.batch_size, commit_every=args.commit_every)
     else:
-        json_file = sys.argv[1]
-        import_posts(json_file)
+        parser.print_usage()
+        sys.exit(1)
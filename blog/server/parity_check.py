@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# Compares the WSGI (Flask/gunicorn) and ASGI (uvicorn) servers response by response
+#
+# Usage: python parity_check.py http://localhost:5501 http://localhost:8000 [--username admin --password ...]
+#
+# Both servers must use the same database and the same CACHE_DIR. Every
+# request is sent to both and the status, the significant headers and the
+# decoded body must match. view_count is left out of the comparison: each
+# process adds its own views that have not been flushed yet.
+# With --username/--password a post is also created, updated and deleted.
+
+import argparse
+import gzip
+import json
+import sys
+import urllib.error
+import urllib.request
+import uuid
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPARED_HEADERS = ('Content-Type', 'Content-Encoding', 'ETag', 'Cache-Control', 'Vary',
+                    'Retry-After', 'Access-Control-Allow-Origin', 'Access-Control-Allow-Credentials',
+                    'Access-Control-Allow-Methods', 'Access-Control-Allow-Headers', 'Access-Control-Max-Age')
+
+ORIGIN = 'https://orange-man.xyz'
+
+
+class Server:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Origin', ORIGIN)
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            req.add_header(name, value)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+
+def decode_body(headers, raw):
+    encoding = headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        raw = gzip.decompress(raw)
+    elif encoding == 'br':
+        raw = brotli.decompress(raw)
+    if 'json' not in (headers.get('Content-Type') or ''):
+        return raw
+    return strip_view_counts(json.loads(raw)) if raw else None
+
+
+def strip_view_counts(value):
+    if isinstance(value, dict):
+        return {key: strip_view_counts(item) for key, item in value.items() if key != 'view_count'}
+    if isinstance(value, list):
+        return [strip_view_counts(item) for item in value]
+    return value
+
+
+def header_values(headers, name):
+    # Repeated headers (Vary) may be split or joined differently; compare the set of values
+    return sorted(part.strip() for value in headers.get_all(name) or () for part in value.split(','))
+
+
+class ParityCheck:
+    def __init__(self, wsgi, asgi):
+        self.servers = (Server(wsgi), Server(asgi))
+        self.passed = 0
+        self.failed = 0
+
+    def compare(self, label, method, path, body=None, headers=None):
+        """Send one request to both servers; returns the decoded WSGI body"""
+        (status_a, headers_a, raw_a), (status_b, headers_b, raw_b) = (
+            server.request(method, path, body, headers) for server in self.servers
+        )
+        problems = []
+        if status_a != status_b:
+            problems.append(f"status {status_a} != {status_b}")
+        for name in COMPARED_HEADERS:
+            if header_values(headers_a, name) != header_values(headers_b, name):
+                problems.append(f"{name}: {headers_a.get_all(name)} != {headers_b.get_all(name)}")
+        decoded_a = decode_body(headers_a, raw_a)
+        if decoded_a != decode_body(headers_b, raw_b):
+            problems.append("bodies differ")
+
+        if problems:
+            self.failed += 1
+            print(f"FAIL {label}: {method} {path}")
+            for problem in problems:
+                print(f"     {problem}")
+        else:
+            self.passed += 1
+            print(f"ok   {label}")
+        return status_a, headers_a, decoded_a
+
+    def run_reads(self):
+        print("\nRead endpoints")
+        _, _, posts = self.compare("post list", 'GET', '/api/posts')
+        for encoding in ('gzip', 'br', 'br;q=0, gzip', 'identity'):
+            if encoding.startswith('br') and brotli is None:
+                continue
+            self.compare(f"post list, Accept-Encoding: {encoding}", 'GET', '/api/posts',
+                         headers={'Accept-Encoding': encoding})
+
+        cursor = None
+        for page in range(3):
+            path = '/api/posts?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            _, _, payload = self.compare(f"page {page + 1}", 'GET', path)
+            cursor = (payload or {}).get('next_cursor')
+            if not cursor:
+                break
+        self.compare("projection", 'GET', '/api/posts?limit=5&fields=id,title,date')
+        for query in ('limit=0', 'limit=abc', 'cursor=bm90LWpzb24', 'fields=password', 'limit=5&limit=2'):
+            self.compare(f"list ?{query}", 'GET', f'/api/posts?{query}')
+
+        for post in (posts or [])[:5]:
+            path = f"/api/posts/{post['id']}"
+            status, headers, _ = self.compare(f"post {post['id']}", 'GET', path)
+            if status == 200:
+                self.compare(f"post {post['id']} revalidated", 'GET', path,
+                             headers={'If-None-Match': headers['ETag']})
+            self.compare(f"post {post['id']} as HTML", 'GET', path + '?format=html',
+                         headers={'Accept-Encoding': 'gzip'})
+        self.compare("missing post", 'GET', '/api/posts/no-such-post')
+        self.compare("unknown format", 'GET', '/api/posts/no-such-post?format=pdf')
+        self.compare("empty format", 'GET', '/api/posts/no-such-post?format=')
+
+        print("\nRoutes served by Flask in both modes")
+        self.compare("search", 'GET', '/api/search?q=blog&limit=5')
+        self.compare("sitemap", 'GET', '/api/sitemap')
+        self.compare("verify without token", 'POST', '/api/auth/verify')
+        self.compare("CORS preflight", 'OPTIONS', '/api/posts/x',
+                     headers={'Access-Control-Request-Method': 'PUT'})
+
+    def run_writes(self, username, password):
+        print("\nWrites")
+        wsgi, asgi = self.servers
+        status, _, raw = wsgi.request('POST', '/api/auth/login', {'username': username, 'password': password})
+        if status != 200:
+            self.failed += 1
+            print(f"FAIL login: {status} {raw[:200]!r}")
+            return
+        auth = {'Authorization': 'Bearer ' + json.loads(raw)['token']}
+        post_id = f'parity-{uuid.uuid4().hex[:8]}'
+        post = {'id': post_id, 'title': 'Parity check', 'content': '# 제목\n\n본문 **굵게**',
+                'date': '2024-01-01T00:00:00Z'}
+
+        try:
+            wsgi.request('POST', '/api/posts', post, auth)
+            self.compare("created post", 'GET', f'/api/posts/{post_id}')
+            self.compare("created post as HTML", 'GET', f'/api/posts/{post_id}?format=html')
+            self.compare("list after create", 'GET', '/api/posts?limit=3')
+            # Written through the other server; both must drop their cached copies
+            asgi.request('PUT', f'/api/posts/{post_id}', {'title': 'Parity check 2', 'content': 'changed'}, auth)
+            self.compare("updated post", 'GET', f'/api/posts/{post_id}')
+            self.compare("list after update", 'GET', '/api/posts?limit=3')
+        finally:
+            asgi.request('DELETE', f'/api/posts/{post_id}', headers=auth)
+        self.compare("deleted post", 'GET', f'/api/posts/{post_id}')
+        wsgi.request('POST', '/api/auth/logout', headers=auth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the WSGI and ASGI servers response by response")
+    parser.add_argument('wsgi_url', help="Base URL of the gunicorn/Flask server")
+    parser.add_argument('asgi_url', help="Base URL of the uvicorn/ASGI server")
+    parser.add_argument('--username', help="Admin user for the write checks")
+    parser.add_argument('--password', help="Admin password for the write checks")
+    args = parser.parse_args()
+
+    check = ParityCheck(args.wsgi_url, args.asgi_url)
+    check.run_reads()
+    if args.username:
+        check.run_writes(args.username, args.password or '')
+
+    print(f"\n{check.passed} identical, {check.failed} different")
+    sys.exit(1 if check.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# Byte-bounded LRU cache for serialized post payloads
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    """A serialized response body, its compressed variants and its validators"""
+    __slots__ = ('body', 'etag', 'last_modified', 'views', 'created_at', 'variants')
+
+    def __init__(self, body, etag, last_modified=None, views=None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified  # aware datetime, for If-Modified-Since
+        self.views = views           # view count to add to the body when serving it
+        self.created_at = time.monotonic()
+        self.variants = {}           # content encoding -> compressed body
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(data) for data in self.variants.values())
+
+
+class PostCache:
+    """LRU cache of response bodies, bounded by the total size of the bodies.
+
+    Keys are tuples whose first item is the namespace: ``('post', post_id,
+    ...)`` for the representations of a single post and ``('list', ...)`` for
+    list pages, so a write can drop exactly the post it touched plus every
+    list page. Entries older than
+    ``ttl`` seconds are refetched so views counted by other processes do not
+    go stale forever; ``ttl=0`` keeps entries until they are invalidated or evicted.
+
+    With several worker processes each has its own cache. If ``stamp`` (a
+    ``ChangeStamp``) is given, ``invalidate_post()`` also bumps it, and every
+    process empties its cache on the next ``get()`` after seeing it change.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=60, stamp=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stamp = stamp
+        self._stamp_seen = stamp.version() if stamp is not None else None
+        self._entries = OrderedDict()
+        self._list_keys = set()
+        self._post_keys = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        if self.stamp is not None:
+            stamp = self.stamp.version()
+            if stamp != self._stamp_seen:
+                # Another process wrote a post since we last looked
+                self.clear()
+                self._stamp_seen = stamp
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry.created_at > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put(self, key, body, etag, last_modified=None, views=None):
+        entry = CacheEntry(body, etag, last_modified, views)
+        if entry.size > self.max_bytes:
+            # Too large to ever fit; serve it uncached
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            if key[0] == 'list':
+                self._list_keys.add(key)
+            elif key[0] == 'post':
+                self._post_keys.setdefault(key[1], set()).add(key)
+            self._evict()
+        return entry
+
+    def variant(self, key, entry, encoding, compress):
+        """``entry.body`` compressed with ``encoding``, made once per cached revision.
+
+        ``compress(body, encoding, static)`` runs on the first request for
+        that encoding with ``static=True`` (smallest output); the result is
+        kept on the entry and counts towards ``max_bytes`` like the body
+        itself. Entries too large to cache are compressed per request with
+        ``static=False``.
+        """
+        data = entry.variants.get(encoding)
+        if data is None:
+            with self._lock:
+                cached = self._entries.get(key) is entry
+            if not cached:
+                return compress(entry.body, encoding, static=False)
+            data = compress(entry.body, encoding, static=True)
+            with self._lock:
+                if encoding not in entry.variants:
+                    entry.variants[encoding] = data
+                    if self._entries.get(key) is entry:
+                        self._bytes += len(data)
+                        self._evict()
+        return data
+
+    def invalidate_post(self, post_id):
+        """Drop one post (in every format) and every list page (which may include it).
+
+        Returns the stamp versions from before and after this write (see
+        ``ChangeStamp.bump()``), or None without a stamp.
+        """
+        with self._lock:
+            for key in list(self._post_keys.get(post_id, ())):
+                self._remove(key)
+            for key in list(self._list_keys):
+                self._remove(key)
+        if self.stamp is None:
+            return None
+        previous, version = self.stamp.bump()
+        if previous != self._stamp_seen:
+            # Another process wrote a post since we last looked
+            self.clear()
+        self._stamp_seen = version
+        return previous, version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._list_keys.clear()
+            self._post_keys.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            if key[0] == 'list':
+                self._list_keys.discard(key)
+            else:
+                keys = self._post_keys.get(key[1])
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._post_keys[key[1]]
+
+
+def row_revision(row):
+    """The parts of a posts row that a write can change, for ``make_etag()``.
+
+    ``updated_at`` has one-second resolution, so two writes within the same
+    second share it; the written values themselves still differ. The view
+    count is left out: counting a view does not make a new revision.
+    """
+    return [part for key in sorted(row) if key != 'view_count' for part in (key, row[key])]
+
+
+def make_etag(*parts):
+    """Strong ETag value from revision markers such as ``row_revision()`` parts"""
+    digest = hashlib.sha1()
+    for part in parts:
+        if hasattr(part, 'isoformat'):
+            part = part.isoformat()
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Helpers for the paginated post listing (excerpts, field projection, cursors)
+
+import base64
+import datetime
+import json
+
+# Matches the 150-character excerpt the blog list view used to cut client-side
+EXCERPT_LENGTH = 150
+
+# Columns a client may request through ?fields=
+LIST_FIELDS = ('id', 'title', 'date', 'updated_at', 'view_count', 'excerpt', 'content')
+
+# Columns returned by the paginated list when ?fields= is omitted (no full bodies)
+DEFAULT_LIST_FIELDS = ('id', 'title', 'date', 'updated_at', 'view_count', 'excerpt')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidListQuery(ValueError):
+    """Raised for malformed limit, cursor or fields parameters"""
+
+
+def make_excerpt(content):
+    """Plain prefix of the post body shown on the list view"""
+    if len(content) > EXCERPT_LENGTH:
+        return content[:EXCERPT_LENGTH] + '...'
+    return content
+
+
+def parse_fields(value):
+    """Validate a comma-separated ?fields= value against LIST_FIELDS"""
+    if not value:
+        return DEFAULT_LIST_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in LIST_FIELDS]
+    if unknown or not fields:
+        raise InvalidListQuery(f"Unknown field(s): {', '.join(unknown) or value}")
+    return fields
+
+
+def parse_limit(value):
+    if value is None or value == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidListQuery("limit must be an integer")
+    if limit < 1:
+        raise InvalidListQuery("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(post):
+    """Opaque cursor pointing just past ``post`` in (date DESC, id DESC) order"""
+    raw = json.dumps([post['date'].isoformat(), post['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (date, id) pair encoded by encode_cursor()"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_str, post_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(date_str), str(post_id)
+    except (ValueError, TypeError):
+        raise InvalidListQuery("Invalid cursor")
+
+
+def build_page_query(fields, limit, cursor=None, placeholder='%s'):
+    """SQL and parameters for one keyset page; fetches limit + 1 rows to detect a next page.
+
+    ``placeholder`` is the driver's parameter marker (``?`` for sqlite3).
+    """
+    # id and date build the next cursor and updated_at the page's ETag,
+    # so they are always selected even when not part of the projection
+    columns = ', '.join(dict.fromkeys(('id', 'date', 'updated_at') + tuple(fields)))
+    sql = f"SELECT {columns} FROM posts"
+    params = []
+    if cursor is not None:
+        cursor_date, cursor_id = cursor
+        sql += f" WHERE (date < {placeholder} OR (date = {placeholder} AND id < {placeholder}))"
+        params += [cursor_date, cursor_date, cursor_id]
+    sql += f" ORDER BY date DESC, id DESC LIMIT {placeholder}"
+    params.append(limit + 1)
+    return sql, tuple(params)
+
+
+def paginate(rows, fields, limit):
+    """Trim the extra look-ahead row and project rows down to the requested fields"""
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    posts = [{f: row[f] for f in fields} for row in rows[:limit]]
+    return {'posts': posts, 'next_cursor': next_cursor}
@@ -41,14 +41,25 @@ else
   echo "requirements.txt not found; skipping dependency installation"
 fi
 
+# =========== Gunicorn 설정 (gunicorn.conf.py 참고) ===========
+export GUNICORN_BIND="${GUNICORN_BIND:-0.0.0.0:5501}"
+export GUNICORN_WORKERS="${GUNICORN_WORKERS:-2}"
+export GUNICORN_THREADS="${GUNICORN_THREADS:-4}"
+export GUNICORN_PIDFILE="${GUNICORN_PIDFILE:-$SCRIPT_DIR/gunicorn.pid}"
+
 echo "================================================"
-echo "Starting Flask server on port 5501..."
+echo "Starting gunicorn on $GUNICORN_BIND ($GUNICORN_WORKERS workers x $GUNICORN_THREADS threads)..."
 echo "PWD: $(pwd)"
 echo "Python: $($PY --version 2>&1)"
+# preload_app: HUP restarts the workers on the code already loaded in the
+# master, so new code needs a new master
+echo "Deploy new code: kill -USR2 \$(cat $GUNICORN_PIDFILE), wait for $GUNICORN_PIDFILE.2,"
+echo "  then kill -QUIT the old master (the pid still in $GUNICORN_PIDFILE)"
+echo "  (or stop and rerun this script)"
 echo "================================================"
 
 # =========== 앱 실행 ===========
-exec "$PY" -u app.py
+exec "$PY" -m gunicorn -c gunicorn.conf.py wsgi:app
 EOF
 
 chmod +x /volume1/web/blog/server/run_synology.sh
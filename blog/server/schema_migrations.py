@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Versioned schema migrations for the blog database
+#
+# Each schema change is one numbered step below. apply_migrations() runs the
+# steps a database has not had yet, in order, and records each one in the
+# schema_version table. MariaDB commits DDL as it goes, so a step can stop
+# half way; every step checks before it changes anything and can simply run
+# again. Databases created before this table existed have most steps
+# recorded without changes. A step that has shipped is never edited; the
+# next change is a new step.
+
+import datetime
+import logging
+
+from post_listing import EXCERPT_LENGTH
+
+log = logging.getLogger('blog.schema')
+
+# Held while migrating, so workers starting together do not run the same
+# ALTER TABLE twice
+LOCK_NAME = 'blog_schema_migrations'
+
+MIGRATIONS = []
+
+
+class MigrationError(Exception):
+    """Raised when the migrations cannot run (e.g. the lock is held too long)"""
+
+
+def migration(version, description):
+    """Register the decorated ``up(cursor)`` as schema step ``version``"""
+    def register(up):
+        MIGRATIONS.append((version, description, up))
+        return up
+    return register
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    return bool(cursor.fetchall())
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index,))
+    return bool(cursor.fetchall())
+
+
+@migration(1, "Create posts table")
+def create_posts(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS posts (
+            id VARCHAR(50) PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            content TEXT NOT NULL,
+            date DATETIME NOT NULL,
+            updated_at DATETIME NOT NULL
+        )
+    ''')
+
+
+@migration(2, "Add posts.view_count")
+def add_view_count(cursor):
+    if not column_exists(cursor, 'posts', 'view_count'):
+        cursor.execute("ALTER TABLE posts ADD COLUMN view_count INT NOT NULL DEFAULT 0")
+
+
+@migration(3, "Add posts.excerpt and fill it for existing posts")
+def add_excerpt(cursor):
+    if not column_exists(cursor, 'posts', 'excerpt'):
+        cursor.execute("ALTER TABLE posts ADD COLUMN excerpt VARCHAR(255) NOT NULL DEFAULT ''")
+    cursor.execute("""
+        UPDATE posts
+        SET excerpt = IF(CHAR_LENGTH(content) > %s, CONCAT(SUBSTRING(content, 1, %s), '...'), content)
+        WHERE excerpt = ''
+    """, (EXCERPT_LENGTH, EXCERPT_LENGTH))
+
+
+@migration(4, "Index posts (date, id, updated_at) for the newest-first list and the sitemap")
+def add_date_index(cursor):
+    # Covers the sitemap query (id, date, updated_at ORDER BY date DESC, id
+    # DESC) without touching the rows, and every keyset page seek. It
+    # replaces the (date, id) index older versions created, which is a prefix
+    # of it.
+    if not index_exists(cursor, 'posts', 'idx_posts_date_id_updated'):
+        cursor.execute("CREATE INDEX idx_posts_date_id_updated ON posts (date, id, updated_at)")
+    if index_exists(cursor, 'posts', 'idx_posts_date_id'):
+        cursor.execute("DROP INDEX idx_posts_date_id ON posts")
+
+
+@migration(5, "Create admin_users table")
+def create_admin_users(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admin_users (
+            id VARCHAR(36) PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            last_login DATETIME NULL,
+            created_at DATETIME NOT NULL
+        )
+    ''')
+
+
+@migration(6, "Create admin_sessions table")
+def create_admin_sessions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS admin_sessions (
+            token_hash CHAR(64) PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL,
+            username VARCHAR(50) NOT NULL,
+            created_at DATETIME NOT NULL,
+            expires_at DATETIME NOT NULL,
+            INDEX idx_admin_sessions_expires (expires_at)
+        )
+    ''')
+
+
+@migration(7, "Index posts (updated_at) for incremental exports")
+def add_updated_index(cursor):
+    if not index_exists(cursor, 'posts', 'idx_posts_updated'):
+        cursor.execute("CREATE INDEX idx_posts_updated ON posts (updated_at)")
+
+
+def applied_versions(cursor):
+    """``{version: applied_at}`` of the steps this database has had"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    ''')
+    cursor.execute("SELECT version, applied_at FROM schema_version")
+    return dict(cursor.fetchall())
+
+
+def schema_status(conn):
+    """``[(version, description, applied_at or None)]`` for every known step"""
+    cursor = conn.cursor()
+    try:
+        applied = applied_versions(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+    return [(version, description, applied.get(version)) for version, description, _ in MIGRATIONS]
+
+
+def apply_migrations(conn, lock_timeout=60):
+    """Run every step the database has not had yet; returns their versions.
+
+    An up-to-date database costs one read of schema_version. Otherwise the
+    steps run under a named lock, one commit each, and the list is read
+    again once the lock is held, in case another process got there first.
+    """
+    cursor = conn.cursor()
+    try:
+        applied = applied_versions(cursor)
+        conn.commit()
+        if all(version in applied for version, _, _ in MIGRATIONS):
+            return []
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, lock_timeout))
+        if cursor.fetchall()[0][0] != 1:
+            raise MigrationError(f"Schema lock not acquired within {lock_timeout}s")
+        try:
+            applied = applied_versions(cursor)
+            done = []
+            for version, description, up in MIGRATIONS:
+                if version in applied:
+                    continue
+                log.info("Applying schema migration", extra={'version': version, 'description': description})
+                up(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                    (version, description, datetime.datetime.now())
+                )
+                conn.commit()
+                done.append(version)
+            return done
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+    finally:
+        cursor.close()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# In-process inverted index with BM25 ranking for /api/search
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Hangul syllables plus kana/CJK ideographs, and Latin/digit words
+_CJK = '\uac00-\ud7a3\u3040-\u30ff\u4e00-\u9fff'
+_CJK_SINGLE_RE = re.compile(f'(?<![{_CJK}])[{_CJK}](?![{_CJK}])')
+# Every overlapping pair of neighbouring characters inside a run
+_CJK_PAIR_RE = re.compile(f'(?=([{_CJK}]{{2}}))')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+# Title terms count this many times towards a post's term frequencies
+TITLE_WEIGHT = 3
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Tombstoned postings are compacted away once they make up this share
+COMPACT_RATIO = 0.25
+
+# Result sets up to this size are scored in full. Terms with more postings
+# than this are also kept as bitmaps, which are intersected and counted
+# without visiting each posting.
+EXHAUSTIVE_LIMIT = 2000
+
+_TF_MAX = 0xFFFF
+
+_NONZERO_RE = re.compile(rb'[^\x00]+')
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+def term_counts(text):
+    """Index terms of ``text`` with their counts: lowercase words, and bigrams for Korean/CJK.
+
+    Korean has no reliable word boundaries for a simple tokenizer (particles
+    attach to nouns: 블로그를, 블로그는), so runs of Hangul are indexed as
+    overlapping two-syllable pieces. "마크다운" becomes 마크, 크다, 다운 and
+    matches any post containing those three in sequence. A lone syllable is
+    kept as it is. Every step runs in C (regex and Counter); posts are
+    tokenized in bulk when the index is built.
+    """
+    text = unicodedata.normalize('NFKC', text).lower()
+    counts = Counter(_WORD_RE.findall(text))
+    counts.update(_CJK_SINGLE_RE.findall(text))
+    counts.update(_CJK_PAIR_RE.findall(text))
+    return counts
+
+
+class SearchIndex:
+    """Inverted index over post titles and bodies.
+
+    Postings are two parallel arrays per term (document ordinals and term
+    frequencies), appended in ordinal order so they stay sorted. Removing or
+    replacing a post only marks its ordinal dead; the arrays are rebuilt
+    without dead entries once those make up ``COMPACT_RATIO`` of the index.
+    A query starts from the postings of its rarest term. If that term is
+    common, the matches are counted on bitmaps and only the best-scoring
+    candidates are visited, so a query never scores every match.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._postings = {}          # term -> (array('I') ordinals, array('H') tfs)
+        self._ids = []               # ordinal -> post id (None once dead)
+        self._lengths = array('I')   # ordinal -> weighted term count
+        self._ords = {}              # post id -> ordinal
+        self._versions = {}          # post id -> updated_at when indexed
+        self._total_length = 0
+        self._dead = 0
+        self._dead_ords = set()
+        self._dead_mask = 0
+        # term -> (postings covered, bitmap of their ordinals), for common terms
+        self._bitmaps = {}
+        # Bumped by every change; per-term impact orderings are only valid
+        # for the generation they were computed in
+        self._generation = 0
+        self._impact_cache = {}
+
+    def __len__(self):
+        return len(self._ords)
+
+    def versions(self):
+        """``{post_id: updated_at}`` of every indexed post"""
+        with self._lock:
+            return dict(self._versions)
+
+    def add(self, post_id, title, content, updated_at=None):
+        """Index a post, replacing any earlier version of it"""
+        counts = term_counts(content or '')
+        for term, count in term_counts(title or '').items():
+            counts[term] += count * TITLE_WEIGHT
+        length = sum(counts.values())
+
+        with self._lock:
+            self._remove(post_id)
+            ordinal = len(self._ids)
+            self._ids.append(post_id)
+            self._lengths.append(min(length, 0xFFFFFFFF))
+            self._ords[post_id] = ordinal
+            self._versions[post_id] = updated_at
+            self._total_length += length
+            self._generation += 1
+            postings = self._postings
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array('I'), array('H'))
+                entry[0].append(ordinal)
+                entry[1].append(tf if tf <= _TF_MAX else _TF_MAX)
+            self._maybe_compact()
+
+    def remove(self, post_id):
+        with self._lock:
+            self._remove(post_id)
+            self._maybe_compact()
+
+    def _remove(self, post_id):
+        ordinal = self._ords.pop(post_id, None)
+        if ordinal is None:
+            return
+        del self._versions[post_id]
+        self._ids[ordinal] = None
+        self._total_length -= self._lengths[ordinal]
+        self._dead += 1
+        self._dead_ords.add(ordinal)
+        self._dead_mask |= 1 << ordinal
+        self._generation += 1
+
+    def _maybe_compact(self):
+        if self._dead < 1000 or self._dead < COMPACT_RATIO * len(self._ids):
+            return
+        # Renumber the live posts densely; order is kept, so postings stay sorted
+        remap = {}
+        ids = []
+        lengths = array('I')
+        for ordinal, post_id in enumerate(self._ids):
+            if post_id is not None:
+                remap[ordinal] = len(ids)
+                self._ords[post_id] = len(ids)
+                ids.append(post_id)
+                lengths.append(self._lengths[ordinal])
+        postings = {}
+        for term, (ords, tfs) in self._postings.items():
+            new_ords = array('I')
+            new_tfs = array('H')
+            for ordinal, tf in zip(ords, tfs):
+                mapped = remap.get(ordinal)
+                if mapped is not None:
+                    new_ords.append(mapped)
+                    new_tfs.append(tf)
+            if new_ords:
+                postings[term] = (new_ords, new_tfs)
+        self._postings = postings
+        self._ids = ids
+        self._lengths = lengths
+        self._dead = 0
+        self._dead_ords = set()
+        self._dead_mask = 0
+        self._bitmaps = {}
+        self._impact_cache = {}
+
+    def search(self, query, limit=20, offset=0):
+        """Posts containing every term of ``query``, best BM25 score first.
+
+        Returns ``(total, [(post_id, score), ...])`` for the requested page.
+        When the rarest term has at most ``EXHAUSTIVE_LIMIT`` postings, its
+        posts are filtered by the other terms and all scored. Otherwise the
+        matches are counted by intersecting bitmaps; up to
+        ``EXHAUSTIVE_LIMIT`` of them are all scored, and beyond that the
+        rarest term's postings are walked from the highest term impact down.
+        The walk stops once no remaining post can reach the page, and a
+        post is dropped as soon as the terms still to score cannot lift it
+        onto the page.
+        """
+        terms = list(term_counts(query))
+        if not terms:
+            return 0, []
+
+        with self._lock:
+            live = len(self._ords)
+            if not live:
+                return 0, []
+            entries = []
+            for term in terms:
+                entry = self._postings.get(term)
+                if entry is None:
+                    return 0, []
+                entries.append((term, entry))
+            entries.sort(key=lambda item: len(item[1][0]))
+
+            # Document frequencies include dead postings until the next compaction;
+            # capping them at the live count keeps every idf positive
+            dfs = [min(len(ords), live) for _, (ords, _) in entries]
+            idfs = [math.log(1 + (live - df + 0.5) / (df + 0.5)) for df in dfs]
+            norm = (K1 * (1 - B), K1 * B * live / self._total_length)
+            wanted = offset + limit
+
+            if len(entries[0][1][0]) <= EXHAUSTIVE_LIMIT:
+                matched = set(entries[0][1][0])
+                matched -= self._dead_ords
+                for term, (ords, _) in entries[1:]:
+                    if not matched:
+                        break
+                    if len(ords) <= EXHAUSTIVE_LIMIT:
+                        matched.intersection_update(ords)
+                    else:
+                        bits = self._bitmap_bytes(self._bitmap(term))
+                        matched = {ordinal for ordinal in matched if bits[ordinal >> 3] >> (ordinal & 7) & 1}
+                total = len(matched)
+            else:
+                mask = self._bitmap(entries[0][0])
+                for term, _ in entries[1:]:
+                    mask &= self._bitmap(term)
+                mask &= ~self._dead_mask
+                total = _popcount(mask)
+                matched = self._bitmap_ordinals(mask) if total <= EXHAUSTIVE_LIMIT else None
+            if not total:
+                return 0, []
+
+            if matched is not None:
+                scored = [(self._score(ordinal, entries, idfs, norm), ordinal) for ordinal in matched]
+                top = heapq.nlargest(wanted, scored)
+            else:
+                top = self._top_by_impact(self._bitmap_bytes(mask), entries, idfs, norm, wanted)
+            ids = self._ids
+            return total, [(ids[ordinal], score) for score, ordinal in top[offset:]]
+
+    def _score(self, ordinal, entries, idfs, norm):
+        doc_norm = norm[0] + norm[1] * self._lengths[ordinal]
+        score = 0.0
+        for i, (_, (ords, tfs)) in enumerate(entries):
+            tf = tfs[bisect_left(ords, ordinal)]
+            score += idfs[i] * tf * (K1 + 1) / (tf + doc_norm)
+        return score
+
+    def _top_by_impact(self, matched, entries, idfs, norm, wanted):
+        # Every term's postings are walked from its highest factor down, one
+        # rank of each per round, and each matching post is scored in full
+        # when first seen. A post not seen yet scores at most the sum of the
+        # factors at the current rank, so the walk stops once that sum
+        # cannot beat the page's lowest score.
+        orders = [self._impact_order(term, norm) for term, _ in entries]
+        # The most each term can add to any post, and to a post once the
+        # terms before it are scored
+        maxima = [idf * impacts[0] for (_, impacts), idf in zip(orders, idfs)]
+        rest_bounds = [sum(maxima[i:]) for i in range(len(maxima))]
+        terms = [(ords, tfs, idf, rest_bounds[i]) for i, ((_, (ords, tfs)), idf) in enumerate(zip(entries, idfs))]
+        lengths = self._lengths
+        seen = set()
+        heap = []
+        floor = -1.0
+        for rank in range(min(len(order) for order, _ in orders)):
+            bounds = [idf * impacts[rank] for (_, impacts), idf in zip(orders, idfs)]
+            if sum(bounds) <= floor:
+                break
+            for order, _ in orders:
+                ordinal = order[rank]
+                if ordinal in seen or not matched[ordinal >> 3] >> (ordinal & 7) & 1:
+                    continue
+                seen.add(ordinal)
+                doc_norm = norm[0] + norm[1] * lengths[ordinal]
+                score = 0.0
+                for ords, tfs, idf, rest_bound in terms:
+                    if score + rest_bound < floor:
+                        break
+                    tf = tfs[bisect_left(ords, ordinal)]
+                    score += idf * tf * (K1 + 1) / (tf + doc_norm)
+                else:
+                    item = (score, ordinal)
+                    if len(heap) < wanted:
+                        heapq.heappush(heap, item)
+                        if len(heap) == wanted:
+                            floor = heap[0][0]
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+                        floor = heap[0][0]
+        return sorted(heap, reverse=True)
+
+    def _bitmap(self, term):
+        """Ordinals in the postings of ``term`` as the bits of an int, extended as it grows"""
+        ords = self._postings[term][0]
+        covered, mask = self._bitmaps.get(term, (0, 0))
+        if covered < len(ords):
+            # Postings are only appended between compactions
+            bits = bytearray((len(self._ids) + 7) >> 3)
+            for ordinal in ords[covered:]:
+                bits[ordinal >> 3] |= 1 << (ordinal & 7)
+            mask |= int.from_bytes(bits, 'little')
+            self._bitmaps[term] = (len(ords), mask)
+        return mask
+
+    def _bitmap_bytes(self, mask):
+        return mask.to_bytes((len(self._ids) + 7) >> 3, 'little')
+
+    def _bitmap_ordinals(self, mask):
+        ordinals = []
+        data = self._bitmap_bytes(mask)
+        for run in _NONZERO_RE.finditer(data):
+            for byte in range(run.start(), run.end()):
+                value = data[byte]
+                for bit in range(8):
+                    if value >> bit & 1:
+                        ordinals.append(byte << 3 | bit)
+        return ordinals
+
+    def _impact_order(self, term, norm):
+        """Live postings of ``term`` sorted by BM25 term factor, highest first"""
+        cached = self._impact_cache.get(term)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1], cached[2]
+        ords, tfs = self._postings[term]
+        lengths = self._lengths
+        dead = self._dead_ords
+        factors = sorted(
+            ((tf * (K1 + 1) / (tf + norm[0] + norm[1] * lengths[ordinal]), ordinal)
+             for ordinal, tf in zip(ords, tfs) if ordinal not in dead),
+            reverse=True
+        )
+        order = array('I', [ordinal for _, ordinal in factors])
+        impacts = array('d', [impact for impact, _ in factors])
+        self._impact_cache[term] = (self._generation, order, impacts)
+        return order, impacts
+
+    def rebuild(self, rows):
+        """Replace the whole index from (id, title, content, updated_at) rows"""
+        with self._lock:
+            self._reset()
+            for post_id, title, content, updated_at in rows:
+                self.add(post_id, title, content, updated_at)
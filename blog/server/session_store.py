@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# Admin session stores: in-process (expiry heap) and shared (database table)
+
+import datetime
+import hashlib
+import heapq
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+log = logging.getLogger('blog.sessions')
+
+# Matches the 30-minute lifetime sessions always had
+DEFAULT_SESSION_TTL = 1800
+
+
+class Session:
+    """One logged-in admin"""
+    __slots__ = ('user_id', 'username', 'created_at', 'expires_at')
+
+    def __init__(self, user_id, username, created_at, expires_at):
+        self.user_id = user_id
+        self.username = username
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+
+class SessionStore(ABC):
+    """Common interface: subclasses implement ``create``, ``get``, ``delete`` and ``sweep``.
+
+    Expired sessions are never returned by ``get``. A background thread
+    calls ``sweep()`` every ``sweep_interval`` seconds so abandoned sessions
+    do not pile up; it starts with the first login in each process.
+    """
+
+    def __init__(self, ttl=DEFAULT_SESSION_TTL, sweep_interval=60.0):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+
+    @abstractmethod
+    def create(self, token, user_id, username):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, token, stale_ok=False):
+        """The session for ``token``; ``stale_ok`` allows a lagging replica to answer"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, token):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sweep(self):
+        """Remove expired sessions; returns how many were removed"""
+        raise NotImplementedError
+
+    def _ensure_sweeper(self):
+        # Threads do not survive fork(), so each worker starts its own
+        if self._sweeper_pid == os.getpid() and self._sweeper.is_alive():
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid() and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='session-sweep', daemon=True)
+            self._sweeper_pid = os.getpid()
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    log.debug("Expired sessions removed", extra={'removed': removed})
+            except Exception as e:
+                log.warning("Session sweep failed: %s", e)
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in a dict, with a heap ordered by expiry for sweeping.
+
+    Lookups are one dict access. ``sweep()`` pops only the expired heap
+    entries, O(log n) each. Heap entries of sessions that were logged out are
+    skipped when they come up. Sessions are private to the process, so this
+    backend only suits a single worker.
+    """
+
+    def __init__(self, ttl=DEFAULT_SESSION_TTL, sweep_interval=60.0):
+        super().__init__(ttl, sweep_interval)
+        self._sessions = {}
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def create(self, token, user_id, username):
+        now = time.time()
+        session = Session(user_id, username, now, now + self.ttl)
+        with self._lock:
+            self._sessions[token] = session
+            heapq.heappush(self._expiry, (session.expires_at, token))
+        self._ensure_sweeper()
+        return session
+
+    def get(self, token, stale_ok=False):
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session.expires_at <= time.time():
+            self.delete(token)
+            return None
+        return session
+
+    def delete(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def sweep(self):
+        now = time.time()
+        removed = 0
+        with self._lock:
+            expiry = self._expiry
+            while expiry and expiry[0][0] <= now:
+                expires_at, token = heapq.heappop(expiry)
+                session = self._sessions.get(token)
+                if session is not None and session.expires_at == expires_at:
+                    del self._sessions[token]
+                    removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class DatabaseSessionStore(SessionStore):
+    """Sessions in the ``admin_sessions`` table, shared by every worker.
+
+    ``connection`` is a context manager factory yielding a DB-API
+    connection (the app's pooled ``db_connection``). Tokens are stored as
+    SHA-256 hashes, so the table alone cannot be used to log in. Lookups go
+    through the primary key; sweeping uses the index on ``expires_at``.
+
+    ``read_connection``, if given, serves ``get(token, stale_ok=True)``
+    (e.g. from a replica). A token it does not know is looked up again on
+    ``connection``, since a session created moments ago may not have
+    replicated yet; a logout may take as long to be seen there.
+    """
+
+    def __init__(self, connection, ttl=DEFAULT_SESSION_TTL, sweep_interval=60.0, sweep_batch=1000,
+                 read_connection=None):
+        super().__init__(ttl, sweep_interval)
+        self._connection = connection
+        self._read_connection = read_connection
+        self.sweep_batch = sweep_batch
+
+    @staticmethod
+    def _hash(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def create(self, token, user_id, username):
+        now = datetime.datetime.now().replace(microsecond=0)
+        expires_at = now + datetime.timedelta(seconds=self.ttl)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "INSERT INTO admin_sessions (token_hash, user_id, username, created_at, expires_at) "
+                    "VALUES (%s, %s, %s, %s, %s)",
+                    (self._hash(token), user_id, username, now, expires_at)
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+        self._ensure_sweeper()
+        return Session(user_id, username, now.timestamp(), expires_at.timestamp())
+
+    def get(self, token, stale_ok=False):
+        if stale_ok and self._read_connection is not None:
+            session = self._lookup(self._read_connection, token)
+            if session is not None:
+                return session
+        return self._lookup(self._connection, token)
+
+    def _lookup(self, connection, token):
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT user_id, username, created_at, expires_at FROM admin_sessions "
+                    "WHERE token_hash = %s AND expires_at > %s",
+                    (self._hash(token), datetime.datetime.now())
+                )
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        if row is None:
+            return None
+        user_id, username, created_at, expires_at = row
+        return Session(user_id, username, created_at.timestamp(), expires_at.timestamp())
+
+    def delete(self, token):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("DELETE FROM admin_sessions WHERE token_hash = %s", (self._hash(token),))
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def sweep(self):
+        removed = 0
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Small batches keep row locks short while other workers log in
+                while True:
+                    cursor.execute(
+                        "DELETE FROM admin_sessions WHERE expires_at <= %s LIMIT %s",
+                        (datetime.datetime.now(), self.sweep_batch)
+                    )
+                    conn.commit()
+                    removed += cursor.rowcount
+                    if cursor.rowcount < self.sweep_batch:
+                        break
+            finally:
+                cursor.close()
+        return removed
+
+
+def create_session_store(backend, connection, ttl=DEFAULT_SESSION_TTL, sweep_interval=60.0,
+                         read_connection=None):
+    """Store for SESSION_BACKEND: ``'database'`` (shared) or ``'memory'``"""
+    if backend == 'database':
+        return DatabaseSessionStore(connection, ttl=ttl, sweep_interval=sweep_interval,
+                                    read_connection=read_connection)
+    if backend == 'memory':
+        return MemorySessionStore(ttl=ttl, sweep_interval=sweep_interval)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected 'database' or 'memory')")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Request coalescing: concurrent cache misses for the same key share one fetch
+
+import asyncio
+import threading
+
+
+class FlightTimeout(Exception):
+    """Raised when another request's fetch of the same key takes longer than the wait allows"""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'traceback')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.traceback = None
+
+
+class _FlightStats:
+    """Counts of fetches run, callers that shared one, and waits that timed out"""
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._counts = {'fetches': 0, 'shared': 0, 'timeouts': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {'in_flight': len(self._calls), **self._counts}
+
+
+class SingleFlight(_FlightStats):
+    """Runs at most one ``fn()`` per key at a time within a process.
+
+    The first caller for a key runs ``fn()``; callers that arrive while it
+    runs wait for it and get the same result, or the same exception. A
+    waiter gives up after ``timeout`` seconds with ``FlightTimeout``; the
+    fetch itself carries on for the callers still waiting. Nothing is kept
+    once the fetch returns, so results are cached (or not) by ``fn()``.
+    """
+
+    def __init__(self, timeout=10.0):
+        super().__init__()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """``(fn() result, shared)``; ``shared`` is True for callers that did not run it"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            self._count('fetches')
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                call.traceback = e.__traceback__
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result, False
+
+        self._count('shared')
+        wait = self.timeout if timeout is None else timeout
+        if not call.done.wait(wait):
+            self._count('timeouts')
+            raise FlightTimeout(f"Fetch of {key!r} still running after {wait}s")
+        if call.error is not None:
+            # From the fetch's own traceback, so waiters do not pile frames onto it
+            raise call.error.with_traceback(call.traceback)
+        return call.result, True
+
+
+class AsyncSingleFlight(_FlightStats):
+    """SingleFlight for coroutines on one event loop"""
+
+    def __init__(self, timeout=10.0):
+        super().__init__()
+        self.timeout = timeout
+        self._calls = {}
+
+    async def do(self, key, fn, timeout=None):
+        """``(await fn() result, shared)``, as ``SingleFlight.do()``"""
+        future = self._calls.get(key)
+        if future is None:
+            future = self._calls[key] = asyncio.get_running_loop().create_future()
+            self._count('fetches')
+            try:
+                result = await fn()
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # retrieved, even if nobody was waiting
+                raise
+            except BaseException:
+                # Cancelled: the waiters cannot have its result
+                future.set_exception(FlightTimeout(f"Fetch of {key!r} was cancelled"))
+                future.exception()
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                del self._calls[key]
+
+        self._count('shared')
+        wait = self.timeout if timeout is None else timeout
+        try:
+            # shield(): a waiter that gives up must not cancel the fetch
+            return await asyncio.wait_for(asyncio.shield(future), wait), True
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            raise FlightTimeout(f"Fetch of {key!r} still running after {wait}s") from None
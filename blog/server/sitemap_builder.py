@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# Streamed, sharded sitemap generation with memory and disk caching
+
+import datetime
+import gzip
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; builds are then only serialized per process
+    fcntl = None
+
+from xml_stream import XmlWriter
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+# The protocol allows 50,000 URLs per file; shard a little before that
+DEFAULT_SHARD_SIZE = 45000
+
+MANIFEST = 'manifest.json'
+INVALIDATED = 'invalidated'
+BUILD_LOCK = 'build.lock'
+
+
+def utc_time(value):
+    """An aware UTC datetime; naive database values are in the server's local time"""
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+class SitemapFile:
+    """One cached sitemap document with its compressed variants and validators"""
+    __slots__ = ('body', 'variants', 'last_modified', 'etag')
+
+    def __init__(self, body, gzip_body, last_modified, etag):
+        self.body = body
+        # Content encoding -> body; gzip is written to disk with the sitemap
+        self.variants = {'gzip': gzip_body}
+        self.last_modified = last_modified
+        self.etag = etag
+
+
+class _ShardWriter:
+    """Writes one sitemap file and its .gz twin side by side"""
+
+    def __init__(self, path):
+        self.path = path
+        self._plain = open(path + '.tmp', 'w', encoding='utf-8')
+        self._gz_raw = open(path + '.gz.tmp', 'wb')
+        # mtime=0 keeps the compressed bytes stable for identical content
+        self._gz = io.TextIOWrapper(
+            gzip.GzipFile(fileobj=self._gz_raw, mode='wb', compresslevel=9, mtime=0),
+            encoding='utf-8')
+        self.xml = XmlWriter(self._write)
+        self.urls = 0
+
+    def _write(self, text):
+        self._plain.write(text)
+        self._gz.write(text)
+
+    def close(self):
+        self._plain.close()
+        self._gz.close()
+        self._gz_raw.close()
+        os.replace(self.path + '.tmp', self.path)
+        os.replace(self.path + '.gz.tmp', self.path + '.gz')
+
+
+class SitemapCache:
+    """Builds sitemaps from a stream of post rows and serves them from cache.
+
+    Files live in ``cache_dir`` next to a manifest, so every worker process
+    can reuse a build. ``invalidate()`` touches a stamp file; a manifest
+    older than the stamp is ignored and the next request rebuilds. Up to
+    ``shard_size`` URLs go into ``sitemap.xml``; beyond that the posts are
+    split into ``sitemap-1.xml``, ``sitemap-2.xml``, ... and ``sitemap.xml``
+    becomes a sitemap index pointing at them.
+    """
+
+    def __init__(self, cache_dir, base_url, shard_size=DEFAULT_SHARD_SIZE):
+        self.cache_dir = cache_dir
+        self.base_url = base_url.rstrip('/')
+        self.shard_size = shard_size
+        self._files = {}
+        self._loaded_from = None
+        self._manifest_cache = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def invalidate(self):
+        """Mark every cached sitemap stale (called after any post write)"""
+        # The time is stored in the file rather than taken from its mtime,
+        # which some filesystems only keep to the second
+        tmp = self._path(f'{INVALIDATED}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'w') as f:
+            f.write(repr(time.time()))
+        os.replace(tmp, self._path(INVALIDATED))
+        self.clear_memory()
+
+    def clear_memory(self):
+        """Forget the in-memory copies; the files on disk stay valid"""
+        with self._lock:
+            self._files = {}
+            self._loaded_from = None
+            self._manifest_cache = None
+
+    def get(self, name):
+        """Cached file by name, or None if the cache is stale or the file does not exist"""
+        manifest = self._current_manifest()
+        if manifest is None:
+            return None
+        with self._lock:
+            if self._loaded_from != manifest['built_at']:
+                self._files = {}
+                self._loaded_from = manifest['built_at']
+            cached = self._files.get(name)
+        if cached is not None:
+            return cached
+        if name not in manifest['files']:
+            return None
+        return self._load(name, manifest)
+
+    def is_fresh(self):
+        return self._current_manifest() is not None
+
+    def build(self, rows, index_url, if_stale=False):
+        """Write all sitemap files from ``rows`` (dicts with ``id``, ``date`` and
+        optionally ``updated_at``, newest first).
+
+        ``index_url`` is the public URL prefix the child sitemaps are served
+        under, used only when the output is sharded. With ``if_stale`` the
+        build is skipped if another thread or process finished a fresh one
+        while this call waited for the lock; ``rows`` is then not read.
+        """
+        with self._build_lock, self._process_lock():
+            if if_stale and self._current_manifest() is not None:
+                return
+            started_at = time.time()
+            shards = []
+            last_modified = None
+
+            shard = None
+            for post in rows:
+                if shard is None or shard.urls >= self.shard_size:
+                    if shard is not None:
+                        self._close_urlset(shard)
+                    shard = self._open_urlset(len(shards) + 1, with_pages=not shards)
+                    shards.append(shard)
+                changed = post.get('updated_at') or post['date']
+                if last_modified is None or changed > last_modified:
+                    last_modified = changed
+                self._write_post(shard, post)
+
+            if shard is None:
+                shard = self._open_urlset(1, with_pages=True)
+                shards.append(shard)
+            self._close_urlset(shard)
+
+            if last_modified is None:
+                last_modified = datetime.datetime.now()
+            last_modified = utc_time(last_modified)
+
+            if len(shards) == 1:
+                os.replace(shards[0].path, self._path('sitemap.xml'))
+                os.replace(shards[0].path + '.gz', self._path('sitemap.xml.gz'))
+                files = ['sitemap.xml']
+            else:
+                files = [os.path.basename(s.path) for s in shards]
+                self._write_index(files, index_url, last_modified)
+                files.append('sitemap.xml')
+
+            self._remove_stale_shards(files)
+            manifest = {
+                'built_at': started_at,
+                'last_modified': last_modified.isoformat(),
+                'files': files,
+            }
+            tmp = self._path(MANIFEST + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp, self._path(MANIFEST))
+
+    @contextmanager
+    def _process_lock(self):
+        # Workers share the output files; only one of them may write at a time
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(BUILD_LOCK), 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _open_urlset(self, number, with_pages):
+        shard = _ShardWriter(self._path(f'sitemap-{number}.xml'))
+        shard.xml.declaration()
+        shard.xml.start('urlset', {'xmlns': SITEMAP_NS})
+        if with_pages:
+            # Add homepage
+            self._write_url(shard, f'{self.base_url}/resume.html', None, 'monthly', '1.0')
+            # Add blog homepage
+            self._write_url(shard, f'{self.base_url}/blog/index.html', None, 'weekly', '0.9')
+        return shard
+
+    def _close_urlset(self, shard):
+        shard.xml.end()
+        shard.close()
+
+    def _write_post(self, shard, post):
+        post_url = f"{self.base_url}/blog/index.html#/post/{post['id']}"
+        self._write_url(shard, post_url, post['date'].strftime('%Y-%m-%d'), 'monthly', '0.8')
+
+    @staticmethod
+    def _write_url(shard, loc, lastmod, changefreq, priority):
+        xml = shard.xml
+        xml.start('url')
+        xml.element('loc', loc)
+        if lastmod:
+            xml.element('lastmod', lastmod)
+        xml.element('changefreq', changefreq)
+        xml.element('priority', priority)
+        xml.end()
+        shard.urls += 1
+
+    def _write_index(self, files, index_url, last_modified):
+        index = _ShardWriter(self._path('sitemap.xml'))
+        index.xml.declaration()
+        index.xml.start('sitemapindex', {'xmlns': SITEMAP_NS})
+        for name in files:
+            index.xml.start('sitemap')
+            index.xml.element('loc', f"{index_url.rstrip('/')}/{name}")
+            # Local dates, like the <lastmod> of the posts themselves
+            index.xml.element('lastmod', last_modified.astimezone().strftime('%Y-%m-%d'))
+            index.xml.end()
+        index.xml.end()
+        index.close()
+
+    def _remove_stale_shards(self, keep):
+        for name in os.listdir(self.cache_dir):
+            base = name[:-3] if name.endswith('.gz') else name
+            if base.startswith('sitemap-') and base.endswith('.xml') and base not in keep:
+                os.remove(self._path(name))
+
+    def _current_manifest(self):
+        try:
+            st = os.stat(self._path(MANIFEST))
+        except FileNotFoundError:
+            return None
+        try:
+            with open(self._path(INVALIDATED)) as f:
+                invalidated = float(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            invalidated = 0.0
+
+        # os.replace() gives each new manifest a new inode
+        version = (st.st_ino, st.st_mtime_ns)
+        cached = self._manifest_cache
+        if cached is not None and cached[0] == version:
+            manifest = cached[1]
+        else:
+            try:
+                with open(self._path(MANIFEST), encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (FileNotFoundError, ValueError):
+                return None
+            self._manifest_cache = (version, manifest)
+
+        # A build that started before the last post write is stale
+        if manifest['built_at'] < invalidated:
+            return None
+        return manifest
+
+    def _load(self, name, manifest):
+        with open(self._path(name), 'rb') as f:
+            body = f.read()
+        with open(self._path(name + '.gz'), 'rb') as f:
+            gzip_body = f.read()
+        last_modified = utc_time(datetime.datetime.fromisoformat(manifest['last_modified']))
+        etag = f"{manifest['built_at']:.6f}-{name}"
+        entry = SitemapFile(body, gzip_body, last_modified, etag)
+        with self._lock:
+            if self._loaded_from == manifest['built_at']:
+                self._files[name] = entry
+        return entry
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# SQLite stand-in for mysql.connector, so the API can run without MariaDB
+#
+# Used by load_test.py --sqlite to benchmark offline. install() replaces
+# mysql.connector.connect(); the app code is unchanged. Only the MariaDB SQL
+# this code base actually issues is translated.
+
+import datetime
+import functools
+import re
+import sqlite3
+
+import mysql.connector
+
+# DATETIME columns come back as datetime objects, without microseconds like
+# MariaDB's; mysql.connector sends aware values without their offset
+sqlite3.register_converter('DATETIME', lambda value: datetime.datetime.fromisoformat(value.decode()))
+sqlite3.register_adapter(datetime.datetime, lambda value: value.replace(microsecond=0, tzinfo=None).isoformat(' '))
+
+_INLINE_INDEX_RE = re.compile(r',\s*INDEX\s+(\w+)\s*\(([^)]*)\)', re.I)
+_CREATE_TABLE_RE = re.compile(r'CREATE TABLE IF NOT EXISTS (\w+)', re.I)
+_UPSERT_RE = re.compile(r'ON\s+DUPLICATE\s+KEY\s+UPDATE\s+(.*)$', re.I | re.S)
+_DELETE_LIMIT_RE = re.compile(r'DELETE FROM (\w+) WHERE (.*) LIMIT (\S+)\s*$', re.I | re.S)
+# Table and first column (the key, in this code base's upserts) of an INSERT
+_INSERT_KEY_RE = re.compile(r'\s*INSERT INTO (\w+) \((\w+)', re.I)
+
+
+@functools.lru_cache(maxsize=256)
+def translate(sql):
+    """MariaDB statement -> list of equivalent SQLite statements"""
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\bINT AUTO_INCREMENT PRIMARY KEY\b', 'INTEGER PRIMARY KEY AUTOINCREMENT', sql, flags=re.I)
+    sql = re.sub(r'\bINSERT IGNORE\b', 'INSERT OR IGNORE', sql, flags=re.I)
+    if re.match(r'\s*SHOW SLAVE STATUS\s*$', sql, re.I):
+        # A stand-in file acts as a replica once a test gives it this table
+        return ["SELECT Seconds_Behind_Master FROM replica_status"]
+    if re.match(r'\s*SHOW TABLES\s*$', sql, re.I):
+        return ["SELECT name FROM sqlite_master WHERE type = 'table'"]
+    show = re.match(r'\s*SHOW COLUMNS FROM (\w+) LIKE \?\s*$', sql, re.I)
+    if show:
+        return [f"SELECT name FROM pragma_table_info('{show.group(1)}') WHERE name = ?"]
+    show = re.match(r'\s*SHOW INDEX FROM (\w+) WHERE Key_name = \?\s*$', sql, re.I)
+    if show:
+        return [f"SELECT name FROM pragma_index_list('{show.group(1)}') WHERE name = ?"]
+    sql = re.sub(r'\bDROP INDEX (\w+) ON \w+', r'DROP INDEX \1', sql, flags=re.I)
+
+    upsert = _UPSERT_RE.search(sql)
+    if upsert:
+        assignments = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', upsert.group(1))
+        sql = sql[:upsert.start()] + 'ON CONFLICT DO UPDATE SET ' + assignments
+
+    delete = _DELETE_LIMIT_RE.match(sql.strip())
+    if delete:
+        table, condition, limit = delete.groups()
+        sql = f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT {limit})'
+
+    # Inline INDEX clauses become separate CREATE INDEX statements
+    table = _CREATE_TABLE_RE.search(sql)
+    indexes = _INLINE_INDEX_RE.findall(sql) if table else []
+    statements = [_INLINE_INDEX_RE.sub('', sql)]
+    for name, columns in indexes:
+        statements.append(f'CREATE INDEX IF NOT EXISTS {name} ON {table.group(1)} ({columns})')
+    return statements
+
+# MariaDB functions used by the schema migrations. Under gunicorn only the
+# master migrates, before forking, so the named lock is a no-op here.
+_FUNCTIONS = (
+    ('IF', 3, lambda condition, then, otherwise: then if condition else otherwise),
+    ('CONCAT', -1, lambda *parts: None if None in parts else ''.join(map(str, parts))),
+    ('CHAR_LENGTH', 1, lambda value: None if value is None else len(value)),
+    ('GET_LOCK', 2, lambda name, timeout: 1),
+    ('RELEASE_LOCK', 1, lambda name: 1),
+)
+
+
+def _database_error(err):
+    if isinstance(err, sqlite3.IntegrityError):
+        return mysql.connector.IntegrityError(msg=str(err))
+    if isinstance(err, sqlite3.OperationalError):
+        return mysql.connector.OperationalError(msg=str(err))
+    return mysql.connector.DatabaseError(msg=str(err))
+
+
+class StandinCursor:
+    """The part of the mysql.connector cursor API the app uses"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        try:
+            for statement in translate(sql):
+                self._cursor.execute(statement, tuple(params or ()) if '?' in statement else ())
+        except sqlite3.Error as err:
+            raise _database_error(err) from err
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def executemany(self, sql, seq_params):
+        seq_params = [tuple(params) for params in seq_params]
+        try:
+            statement, = translate(sql)
+            existing = self._existing_keys(sql, seq_params)
+            self._cursor.executemany(statement, seq_params)
+        except sqlite3.Error as err:
+            raise _database_error(err) from err
+        # MariaDB counts a row an upsert updated as two affected rows
+        self.rowcount = self._cursor.rowcount + existing
+
+    def _existing_keys(self, sql, seq_params):
+        if not _UPSERT_RE.search(sql):
+            return 0
+        table, key = _INSERT_KEY_RE.match(sql).groups()
+        found = set()
+        for params in seq_params:
+            if self._cursor.execute(f"SELECT 1 FROM {table} WHERE {key} = ?", params[:1]).fetchone():
+                found.add(params[0])
+        return len(found)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandinConnection:
+    """One SQLite connection behaving like a mysql.connector connection.
+
+    WAL mode lets readers in other worker processes run alongside a writer;
+    writers wait up to ``busy_timeout`` seconds for the lock.
+    """
+
+    def __init__(self, path, busy_timeout=30):
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        for name, args, func in _FUNCTIONS:
+            self._conn.create_function(name, args, func, deterministic=name != 'GET_LOCK')
+        self._open = True
+
+    def cursor(self, dictionary=False, **options):
+        return StandinCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self._open:
+            raise mysql.connector.InterfaceError(msg="Connection is closed")
+
+    def get_server_info(self):
+        return f'SQLite {sqlite3.sqlite_version} (stand-in)'
+
+    def close(self):
+        self._open = False
+        self._conn.close()
+
+
+def install(path, hosts=None):
+    """Make every mysql.connector.connect() call open ``path`` instead.
+
+    ``hosts`` maps DB_HOST / DB_REPLICAS host names to files of their own,
+    e.g. ``{'replica1': '/tmp/replica1.db'}`` for a primary and a replica.
+    """
+    hosts = hosts or {}
+    mysql.connector.connect = lambda **config: StandinConnection(hosts.get(config.get('host'), path))
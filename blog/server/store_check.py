@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# Conformance checks and throughput benchmark for the blog_store backends
+#
+# Every backend must give the same answers to the same calls. Run against an
+# empty scratch database; the posts written are deleted again at the end.
+#
+#   python store_check.py --sqlite /tmp/store-check.db
+#   python store_check.py --mariadb                        (DB_* settings, e.g. DB_NAME=blog_check)
+#   python store_check.py --standin /tmp/standin.db        (MariaDB backend on sqlite_standin)
+#
+# --bench seeds posts and measures read and write throughput instead:
+#   python store_check.py --sqlite /tmp/store-bench.db --bench --posts 5000 --threads 4
+
+import argparse
+import datetime
+import random
+import sys
+import threading
+import time
+import uuid
+
+from blog_store import MariaDBStore, SQLiteStore
+from load_test import make_body, percentile
+from post_listing import DEFAULT_LIST_FIELDS, make_excerpt
+
+# Posts written by the checks sort after anything a real blog would hold
+CHECK_PREFIX = 'store-check-'
+BASE_DATE = datetime.datetime(2999, 1, 1, 12, 0, 0)
+
+
+class StoreCheck:
+    def __init__(self, store):
+        self.store = store
+        self.passed = 0
+        self.failed = 0
+        self.ids = []
+
+    def expect(self, label, actual, expected):
+        if actual == expected:
+            self.passed += 1
+            print(f"ok   {label}")
+        else:
+            self.failed += 1
+            print(f"FAIL {label}")
+            print(f"     expected {expected!r}")
+            print(f"     got      {actual!r}")
+
+    def expect_error(self, label, fn):
+        try:
+            fn()
+        except self.store.Error:
+            self.passed += 1
+            print(f"ok   {label}")
+        else:
+            self.failed += 1
+            print(f"FAIL {label}: no {self.store.Error.__name__} raised")
+
+    def post_id(self, n):
+        return f'{CHECK_PREFIX}{n:02d}'
+
+    def insert(self, n, title, content, date, updated_at=None, view_count=0):
+        self.store.insert_post(self.post_id(n), title, content, date, updated_at or date, view_count=view_count)
+        self.ids.append(self.post_id(n))
+
+    def run(self):
+        store = self.store
+        print("\nSchema")
+        store.ensure_schema()
+        self.expect("ensure_schema() again applies nothing", store.ensure_schema(), [])
+        self.expect("schema_status() shows every step applied",
+                    [applied for _, _, applied, _ in store.schema_status()], [True] * len(store.schema_status()))
+        if next(store.scan_posts(('id',)), None):
+            print("The posts table is not empty; run the checks against a scratch database")
+            sys.exit(2)
+
+        print("\nPosts")
+        long_text = '본문 ' * 100
+        self.insert(1, '첫 글', long_text, BASE_DATE.replace(microsecond=123456), view_count=3)
+        post = store.get_post(self.post_id(1))
+        self.expect("get_post() returns every column", sorted(post or {}),
+                    sorted(('id', 'title', 'content', 'excerpt', 'date', 'updated_at', 'view_count')))
+        self.expect("DATETIME drops microseconds", post and post['date'], BASE_DATE)
+        self.expect("excerpt is made on insert", post and post['excerpt'], make_excerpt(long_text))
+        self.expect("view_count is stored", post and post['view_count'], 3)
+        self.expect("unknown id gives None", store.get_post(self.post_id(99)), None)
+        self.expect_error("duplicate id raises store.Error",
+                          lambda: store.insert_post(self.post_id(1), 'x', 'y', BASE_DATE, BASE_DATE))
+
+        aware = datetime.datetime(2999, 1, 2, 9, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=9)))
+        self.insert(2, 'aware', 'b', aware)
+        self.expect("aware datetime keeps its wall-clock time", store.get_post(self.post_id(2))['date'],
+                    datetime.datetime(2999, 1, 2, 9, 30))
+        # Two posts on the same date: id breaks the tie
+        for n in (3, 4):
+            self.insert(n, f'same date {n}', 'c', BASE_DATE + datetime.timedelta(days=5))
+        self.insert(5, 'oldest', 'd', BASE_DATE - datetime.timedelta(days=1))
+        newest_first = [self.post_id(n) for n in (4, 3, 2, 1, 5)]
+
+        self.expect("list_all() is newest first, id descending on ties",
+                    [row['id'] for row in store.list_all()], newest_first)
+        rows = store.get_posts([self.post_id(1), self.post_id(99), self.post_id(3)], ('id', 'title'))
+        self.expect("get_posts() returns the existing posts, with the requested columns",
+                    sorted((row['id'], sorted(row)) for row in rows),
+                    [(self.post_id(1), ['id', 'title']), (self.post_id(3), ['id', 'title'])])
+        self.expect("get_posts([]) is empty", store.get_posts([]), [])
+        self.expect("recent_posts() honours the limit",
+                    [row['id'] for row in store.recent_posts(('id',), 2)], newest_first[:2])
+
+        seen, after = [], None
+        while True:
+            page = store.list_page(DEFAULT_LIST_FIELDS, 2, after)
+            seen += [row['id'] for row in page[:2]]
+            if len(page) <= 2:
+                break
+            after = (page[1]['date'], page[1]['id'])
+        self.expect("list_page() keyset pages cover every post once", seen, newest_first)
+
+        batches = list(store.scan_posts(('id', 'date'), batch_size=2))
+        self.expect("scan_posts() batches rows", [len(batch) for batch in batches], [2, 2, 1])
+        self.expect("scan_posts() orders by id", [row['id'] for batch in batches for row in batch],
+                    sorted(newest_first))
+        self.expect("scan_posts(newest_first=True)",
+                    [row['id'] for batch in store.scan_posts(('id',), newest_first=True) for row in batch],
+                    newest_first)
+
+        print("\nWrites")
+        edited = BASE_DATE + datetime.timedelta(days=30)
+        self.expect("update_post() finds the post",
+                    store.update_post(self.post_id(5), '수정됨', 'new body', edited), True)
+        post = store.get_post(self.post_id(5))
+        self.expect("update_post() replaces the text and updated_at",
+                    (post['title'], post['content'], post['excerpt'], post['updated_at']),
+                    ('수정됨', 'new body', 'new body', edited))
+        self.expect("update_post() keeps view_count by default", post['view_count'], 0)
+        store.update_post(self.post_id(5), '수정됨', 'new body', edited, view_count=42)
+        self.expect("update_post(view_count=...) sets it", store.get_post(self.post_id(5))['view_count'], 42)
+        self.expect("update_post() of an unknown id is False",
+                    store.update_post(self.post_id(99), 'x', 'y', edited), False)
+        self.expect("scan_posts(since=...) gives posts updated since, oldest change first",
+                    [row['id'] for batch in store.scan_posts(('id',), since=edited) for row in batch],
+                    [self.post_id(5)])
+
+        store.add_views({self.post_id(1): 2, self.post_id(3): 5, self.post_id(99): 1})
+        self.expect("add_views() adds to the stored counts",
+                    [store.get_post(self.post_id(n))['view_count'] for n in (1, 3)], [5, 5])
+
+        self.ids += [self.post_id(6), self.post_id(7)]
+        rows = [(self.post_id(1), '덮어씀', 'upserted body', BASE_DATE + datetime.timedelta(days=99), edited, 77),
+                (self.post_id(6), '새 글', 'fresh', BASE_DATE - datetime.timedelta(days=2), edited, 7)]
+        self.expect("upsert_posts() counts inserted and updated posts",
+                    store.upsert_posts(iter(rows), batch_size=2, commit_every=1), (1, 1))
+        post = store.get_post(self.post_id(1))
+        self.expect("upsert_posts() replaces the text and keeps date and view_count",
+                    (post['title'], post['excerpt'], post['date'], post['updated_at'], post['view_count']),
+                    ('덮어씀', 'upserted body', BASE_DATE, edited, 5))
+        self.expect("upsert_posts() inserts new posts with their view_count",
+                    store.get_post(self.post_id(6))['view_count'], 7)
+
+        def failing_rows():
+            yield self.post_id(7), 'x', 'y', BASE_DATE, BASE_DATE, 0
+            raise ValueError("malformed record")
+        try:
+            store.upsert_posts(failing_rows())
+            raised = False
+        except ValueError:
+            raised = True
+        self.expect("upsert_posts() rolls back uncommitted rows when the input fails",
+                    (raised, store.get_post(self.post_id(7))), (True, None))
+        store.delete_post(self.post_id(6))
+
+        self.expect("delete_post() finds the post", store.delete_post(self.post_id(4)), True)
+        self.expect("delete_post() again is False", store.delete_post(self.post_id(4)), False)
+        self.expect("deleted post is gone", store.get_post(self.post_id(4)), None)
+
+        if store.full_text:
+            print("\nFull-text search")
+            store.update_post(self.post_id(3), 'Rust 입문', '마크다운으로 쓴 블로그를 옮겼다', edited)
+            self.expect("Hangul matches inside longer words",
+                        [post_id for post_id, _ in store.search('블로그')[1]], [self.post_id(3)])
+            self.expect("every term must match", store.search('rust 블로그')[0], 1)
+            self.expect("a missing term matches nothing", store.search('rust 없음'), (0, []))
+            self.expect("an edit replaces the indexed text", store.search('same date')[0], 0)
+            store.delete_post(self.post_id(3))
+            self.expect("a deleted post is not found", store.search('rust'), (0, []))
+            self.expect("punctuation only matches nothing", store.search('!!'), (0, []))
+
+        print("\nAdmin users")
+        username = f'check-{uuid.uuid4().hex[:8]}'
+        users = store.count_admin_users()
+        user_id = str(uuid.uuid4())
+        store.create_admin_user(user_id, username, 'hash', BASE_DATE)
+        self.expect("count_admin_users() counts the new user", store.count_admin_users(), users + 1)
+        self.expect("get_admin_user()", store.get_admin_user(username),
+                    {'id': user_id, 'username': username, 'password_hash': 'hash'})
+        self.expect("unknown user gives None", store.get_admin_user(username + 'x'), None)
+        self.expect_error("duplicate username raises store.Error",
+                          lambda: store.create_admin_user(str(uuid.uuid4()), username, 'h', BASE_DATE))
+        store.record_login(user_id, BASE_DATE)
+        self.passed += 1
+        print("ok   record_login()")
+
+    def cleanup(self):
+        for post_id in self.ids:
+            self.store.delete_post(post_id)
+
+
+def timed_loop(threads, seconds, operation):
+    """Run ``operation(rng)`` from ``threads`` threads for ``seconds``; returns (ops/s, p50 ms, p99 ms)"""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(number):
+        rng = random.Random(number)
+        mine = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            operation(rng)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+
+
+def bench(store, posts, size, threads, seconds):
+    store.ensure_schema()
+    rng = random.Random(1)
+    ids = [f'bench-{n:06d}' for n in range(posts)]
+    now = datetime.datetime.now().replace(microsecond=0)
+
+    started = time.perf_counter()
+    for n, post_id in enumerate(ids):
+        store.insert_post(post_id, f'Post {n}', make_body(rng, size), now - datetime.timedelta(minutes=n), now)
+    inserted = posts / (time.perf_counter() - started)
+
+    def edit(rng):
+        store.update_post(rng.choice(ids), 'Edited', make_body(rng, size), datetime.datetime.now())
+
+    results = {
+        'get_post': timed_loop(threads, seconds, lambda rng: store.get_post(rng.choice(ids))),
+        'list_page': timed_loop(threads, seconds, lambda rng: store.list_page(DEFAULT_LIST_FIELDS, 20)),
+        'get_posts': timed_loop(threads, seconds, lambda rng: store.get_posts(rng.sample(ids, 20))),
+        'update_post': timed_loop(threads, seconds, edit),
+        'add_views': timed_loop(threads, seconds,
+                                lambda rng: store.add_views({post_id: 1 for post_id in rng.sample(ids, 100)})),
+    }
+    if store.full_text:
+        results['search'] = timed_loop(threads, seconds, lambda rng: store.search('마크다운 블로그', limit=20))
+
+    print(f"\n{posts:,} posts of {size:,} characters, {threads} threads")
+    print(f"{'operation':<12} {'ops/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'insert_post':<12} {inserted:>10,.0f} {'':>8} {'':>8}   (one thread)")
+    for name, (throughput, p50, p99) in results.items():
+        print(f"{name:<12} {throughput:>10,.0f} {p50:>8.2f} {p99:>8.2f}")
+
+    for post_id in ids:
+        store.delete_post(post_id)
+
+
+def mariadb_store(threads):
+    import mysql.connector
+    from db_pool import ConnectionPool
+    from migrate import DB_CONFIG
+
+    pool = ConnectionPool(lambda: mysql.connector.connect(**DB_CONFIG), size=threads, max_overflow=0)
+    return MariaDBStore(pool.connection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a storage backend against the blog_store contract")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--sqlite', metavar='FILE', help="SQLiteStore on FILE")
+    target.add_argument('--mariadb', action='store_true', help="MariaDBStore on the DB_* database")
+    target.add_argument('--standin', metavar='FILE', help="MariaDBStore on sqlite_standin (no server needed)")
+    parser.add_argument('--bench', action='store_true', help="Measure throughput instead of checking")
+    parser.add_argument('--posts', type=int, default=2000, help="Posts seeded for --bench (default 2000)")
+    parser.add_argument('--size', type=int, default=3000, help="Characters per seeded post (default 3000)")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per --bench operation (default 4)")
+    parser.add_argument('--seconds', type=float, default=3, help="Seconds per --bench operation (default 3)")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        store = SQLiteStore(args.sqlite)
+    else:
+        if args.standin:
+            import sqlite_standin
+            sqlite_standin.install(args.standin)
+        store = mariadb_store(args.threads)
+    print(f"Backend: {type(store).__name__}")
+
+    if args.bench:
+        bench(store, args.posts, args.size, args.threads, args.seconds)
+        return
+
+    check = StoreCheck(store)
+    try:
+        check.run()
+    finally:
+        check.cleanup()
+    print(f"\n{check.passed} passed, {check.failed} failed")
+    sys.exit(1 if check.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
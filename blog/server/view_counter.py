@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Write-behind buffer for post view counts
+
+import atexit
+import logging
+import os
+import threading
+
+log = logging.getLogger('blog.views')
+
+
+class ViewCounter:
+    """Aggregates view increments per post and writes them in batches.
+
+    ``flush_fn`` receives a ``{post_id: increment}`` dict and must persist it
+    (additively) in one go. It is called from a background thread every
+    ``interval`` seconds, as soon as ``threshold`` views are buffered, and once
+    more at interpreter exit. Because only deltas are written, several worker
+    processes can each run their own buffer against the same table.
+    """
+
+    def __init__(self, flush_fn, interval=5.0, threshold=1000):
+        self._flush_fn = flush_fn
+        self.interval = interval
+        self.threshold = threshold
+
+        self._stopped = False
+        self._after_fork()
+
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked worker starts with an empty buffer (its parent still owns
+        # and flushes those views), fresh locks and no flusher thread
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = os.getpid()
+        self._pending = {}
+        self._writing = {}           # the batch flush() is writing right now
+        self._flushed = {}           # post_id -> views this process has written
+        self._buffered = 0
+        self._thread = None
+
+    def increment(self, post_id, count=1):
+        """Buffer ``count`` views of ``post_id``; returns views still unflushed for it"""
+        with self._lock:
+            pending = self._pending.get(post_id, 0) + count
+            self._pending[post_id] = pending
+            self._buffered += count
+            over_threshold = self._buffered >= self.threshold
+            self._ensure_thread()
+
+        if over_threshold:
+            self._wake.set()
+        return pending
+
+    def pending(self, post_id):
+        """Views of ``post_id`` buffered in this process and not yet written"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def counted(self, post_id):
+        """Views of ``post_id`` counted by this process so far, written or not"""
+        with self._lock:
+            return (self._flushed.get(post_id, 0) + self._writing.get(post_id, 0)
+                    + self._pending.get(post_id, 0))
+
+    def flushed(self, post_id):
+        """Views of ``post_id`` this process has already added to the stored count"""
+        with self._lock:
+            return self._flushed.get(post_id, 0)
+
+    def flush(self):
+        """Write all buffered increments now; they are re-queued if the write fails"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+                self._buffered = 0
+
+            try:
+                self._flush_fn(batch)
+            except Exception as e:
+                log.warning("Error flushing view counts, will retry: %s", e)
+                with self._lock:
+                    self._writing = {}
+                    for post_id, count in batch.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + count
+                        self._buffered += count
+                return 0
+            with self._lock:
+                self._writing = {}
+                for post_id, count in batch.items():
+                    self._flushed[post_id] = self._flushed.get(post_id, 0) + count
+            return sum(batch.values())
+
+    def stop(self):
+        """Stop the background flusher and write whatever is left"""
+        self._stopped = True
+        self._wake.set()
+        if self._pid == os.getpid():
+            self.flush()
+
+    def _ensure_thread(self):
+        # Called with self._lock held; the flusher starts lazily so it is
+        # created inside each worker process rather than in a parent
+        if self._stopped or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        wake = self._wake
+        while not self._stopped:
+            wake.wait(self.interval)
+            wake.clear()
+            if self._stopped:
+                break
+            self.flush()
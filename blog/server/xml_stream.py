@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# Minimal streaming XML writer (no document tree is kept in memory)
+
+from xml.sax.saxutils import escape, quoteattr
+
+
+class XmlWriter:
+    """Writes indented XML through a ``write(str)`` callable, one element at a time"""
+
+    def __init__(self, write, indent='  '):
+        self._write = write
+        self._indent = indent
+        self._open = []
+
+    def declaration(self):
+        self._write('<?xml version="1.0" encoding="UTF-8"?>\n')
+
+    def start(self, tag, attrs=None):
+        self._write(f"{self._indent * len(self._open)}<{tag}{self._attrs(attrs)}>\n")
+        self._open.append(tag)
+
+    def element(self, tag, text=None, attrs=None):
+        prefix = self._indent * len(self._open)
+        if text is None:
+            self._write(f"{prefix}<{tag}{self._attrs(attrs)}/>\n")
+        else:
+            self._write(f"{prefix}<{tag}{self._attrs(attrs)}>{escape(str(text))}</{tag}>\n")
+
+    def end(self):
+        tag = self._open.pop()
+        # The root element is closed without a trailing newline
+        newline = '\n' if self._open else ''
+        self._write(f"{self._indent * len(self._open)}</{tag}>{newline}")
+
+    @staticmethod
+    def _attrs(attrs):
+        if not attrs:
+            return ''
+        return ''.join(f" {name}={quoteattr(str(value))}" for name, value in attrs.items())